@@ -3,19 +3,175 @@ os.environ['FLASK_SKIP_DOTENV'] = '1'  # Disable automatic dotenv loading
 os.environ['DOTENV_FILE'] = ''  # Disable dotenv file loading
 
 from flask import Flask, render_template, request, jsonify
+from werkzeug.http import is_resource_modified
+from werkzeug.middleware.proxy_fix import ProxyFix
+import atexit
+import base64
+import bisect
 import hashlib
+import heapq
+import hmac
+import json
+import logging
+import logging.handlers
+import math
+import queue
 import random
+import secrets
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
 import mysql.connector
 from mysql.connector import Error
 
+# Logging - leveled records handed to a background thread through a bounded queue
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# 'json' writes one JSON object per line; defaults to json in production
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json' if os.environ.get('FLASK_ENV') == 'production' else 'text').lower()
+# Per-logger levels, e.g. "robotech.cart=DEBUG,robotech.db=WARNING"
+LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+# Fraction of DEBUG/INFO records kept per logger, e.g. "robotech.catalog=0.1"
+LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', '')
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+# Attributes every LogRecord has; anything else came in through extra=
+_LOG_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+def _log_record_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _LOG_RECORD_ATTRS}
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, the extra= fields and exc"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        entry.update(_log_record_fields(record))
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class TextLogFormatter(logging.Formatter):
+    """Human-readable line with the extra= fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _log_record_fields(record)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+class LogSamplingFilter(logging.Filter):
+    """Keeps a configured fraction of DEBUG/INFO records per logger; warnings always pass"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        name = record.name
+        while name:
+            if name in self.rates:
+                return random.random() < self.rates[name]
+            name = name.rpartition('.')[0]
+        return True
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking the request"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def _parse_log_settings(setting):
+    """'name=value,name=value' -> {name: value}"""
+    pairs = (item.split('=', 1) for item in setting.split(',') if '=' in item)
+    return {name.strip(): value.strip() for name, value in pairs}
+
+def configure_logging():
+    """Send every 'robotech.*' logger through a bounded queue to one writer thread on stdout"""
+    root = logging.getLogger('robotech')
+    if any(isinstance(handler, DroppingQueueHandler) for handler in root.handlers):
+        return
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+    for name, level in _parse_log_settings(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonLogFormatter() if LOG_FORMAT == 'json' else TextLogFormatter())
+    handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(LogSamplingFilter({name: float(rate) for name, rate in
+                                         _parse_log_settings(LOG_SAMPLE_RATES).items()}))
+    root.addHandler(handler)
+
+    def start_listener():
+        handler.listener = logging.handlers.QueueListener(handler.queue, stream)
+        handler.listener.start()
+
+    def restart_listener_in_child():
+        # The writer thread doesn't survive a fork (gunicorn --preload); give the child its own
+        handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+        start_listener()
+
+    start_listener()
+    # Flushes what is still queued on a clean shutdown
+    atexit.register(lambda: handler.listener.stop())
+    os.register_at_fork(after_in_child=restart_listener_in_child)
+
+def get_logging_stats():
+    """Queue depth and records dropped because the writer thread fell behind"""
+    for handler in logging.getLogger('robotech').handlers:
+        if isinstance(handler, DroppingQueueHandler):
+            return {'queued': handler.queue.qsize(), 'dropped': handler.dropped,
+                    'level': LOG_LEVEL, 'format': LOG_FORMAT}
+    return None
+
+configure_logging()
+app_logger = logging.getLogger('robotech.app')
+db_logger = logging.getLogger('robotech.db')
+catalog_logger = logging.getLogger('robotech.catalog')
+cart_logger = logging.getLogger('robotech.cart')
+order_logger = logging.getLogger('robotech.orders')
+auth_logger = logging.getLogger('robotech.auth')
+
 # Try to use waitress if available, fallback to Flask dev server
 try:
     from waitress import serve
     USE_WAITERESS = True
-    print("✅ Using Waitress WSGI server")
+    app_logger.debug("Using Waitress WSGI server")
 except ImportError:
     USE_WAITERESS = False
-    print("⚠️  Waitress not available, using Flask dev server")
+    app_logger.info("Waitress not available, using Flask dev server")
 
 # Get the project root directory
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -77,421 +233,1299 @@ if DATABASE_URL:
         'port': url.port or 3306
     }
 
-def get_db_connection():
-    """Get database connection - try MySQL first, fallback to SQLite"""
+# Connection pool configuration - one pool per backend, per worker process
+DB_POOL_CONFIG = {
+    'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+    'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+    'checkout_timeout': float(os.environ.get('DB_POOL_CHECKOUT_TIMEOUT', 5)),
+    'max_uses': int(os.environ.get('DB_POOL_MAX_USES', 1000)),
+    'max_age': float(os.environ.get('DB_POOL_MAX_AGE', 1800)),
+    'validate_after': float(os.environ.get('DB_POOL_VALIDATE_AFTER', 30))
+}
+
+SQLITE_DB_PATH = 'robotech_store.db'
+
+# MySQL health tracking - route straight to SQLite while MySQL is down
+DB_BREAKER_CONFIG = {
+    'failure_threshold': int(os.environ.get('DB_BREAKER_FAILURE_THRESHOLD', 3)),
+    'probe_interval': float(os.environ.get('DB_BREAKER_PROBE_INTERVAL', 5))
+}
+DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', 3))
+
+# Rows per INSERT batch when bulk loading the product catalog
+CATALOG_LOAD_BATCH_SIZE = int(os.environ.get('CATALOG_LOAD_BATCH_SIZE', 1000))
+
+# How often (seconds) a worker checks catalog_version for product changes
+CATALOG_REFRESH_INTERVAL = float(os.environ.get('CATALOG_REFRESH_INTERVAL', 5))
+
+# Listing COUNT(*) cache for the database fallback path (used when the catalog
+# index is unavailable); free-text counts can be estimated by a capped scan
+PRODUCT_COUNT_CACHE_SIZE = int(os.environ.get('PRODUCT_COUNT_CACHE_SIZE', 512))
+PRODUCT_COUNT_ESTIMATE_SEARCH = os.environ.get('PRODUCT_COUNT_ESTIMATE_SEARCH', 'false').lower() == 'true'
+PRODUCT_COUNT_ESTIMATE_CAP = int(os.environ.get('PRODUCT_COUNT_ESTIMATE_CAP', 1000))
+
+# Pre-serialized /api/products responses kept per worker
+PRODUCT_RESPONSE_CACHE_SIZE = int(os.environ.get('PRODUCT_RESPONSE_CACHE_SIZE', 1024))
+
+# Largest page /api/products serves; bigger limits are clamped to it
+PRODUCTS_PAGE_MAX_LIMIT = int(os.environ.get('PRODUCTS_PAGE_MAX_LIMIT', 100))
+
+# Maximum number of ids accepted by /api/products/by-ids
+PRODUCTS_BY_IDS_MAX = int(os.environ.get('PRODUCTS_BY_IDS_MAX', 200))
+CART_BATCH_MAX_ITEMS = int(os.environ.get('CART_BATCH_MAX_ITEMS', 100))
+CART_CACHE_SIZE = int(os.environ.get('CART_CACHE_SIZE', 1024))
+CART_CACHE_TTL = float(os.environ.get('CART_CACHE_TTL', 30))
+ORDER_RESERVATION_TIMEOUT = int(os.environ.get('ORDER_RESERVATION_TIMEOUT', 1800))
+RESERVATION_SWEEP_INTERVAL = float(os.environ.get('RESERVATION_SWEEP_INTERVAL', 60))
+RESERVATION_SWEEP_BATCH = int(os.environ.get('RESERVATION_SWEEP_BATCH', 100))
+ORDER_HISTORY_PAGE_SIZE = int(os.environ.get('ORDER_HISTORY_PAGE_SIZE', 10))
+ORDER_HISTORY_PAGE_MAX = int(os.environ.get('ORDER_HISTORY_PAGE_MAX', 50))
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 4096))
+# Directory for per-host state files (OTP codes, rate limits, session secret), created readable by this user only
+APP_STATE_DIR = os.environ.get('APP_STATE_DIR', app.instance_path)
+OTP_TTL = float(os.environ.get('OTP_TTL', 300))
+OTP_MAX_ENTRIES = int(os.environ.get('OTP_MAX_ENTRIES', 10000))
+# 'sqlite' shares issued codes between workers on one host through OTP_STORE_PATH;
+# 'memory' only works with a single worker process
+OTP_STORE_BACKEND = os.environ.get('OTP_STORE_BACKEND', 'sqlite').lower()
+OTP_STORE_PATH = os.environ.get('OTP_STORE_PATH', os.path.join(APP_STATE_DIR, 'otp_codes.db'))
+# Token buckets as 'requests/seconds'; 'sqlite' shares them between workers through RATE_LIMIT_PATH
+RATE_LIMIT_SEND_OTP_IP = os.environ.get('RATE_LIMIT_SEND_OTP_IP', '20/60')
+RATE_LIMIT_SEND_OTP_PHONE = os.environ.get('RATE_LIMIT_SEND_OTP_PHONE', '5/300')
+RATE_LIMIT_LOGIN_IP = os.environ.get('RATE_LIMIT_LOGIN_IP', '30/60')
+RATE_LIMIT_LOGIN_PHONE = os.environ.get('RATE_LIMIT_LOGIN_PHONE', '10/300')
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', 10000))
+# 'memory' multiplies every limit by the number of worker processes
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'sqlite').lower()
+SESSION_TOKEN_TTL = int(os.environ.get('SESSION_TOKEN_TTL', 7 * 24 * 3600))
+# Every worker must share the same secret or tokens issued by one are rejected by the others.
+# Required in production; elsewhere a random secret is generated once per host in SESSION_SECRET_PATH
+SESSION_SECRET = os.environ.get('SESSION_SECRET') or os.environ.get('SECRET_KEY')
+SESSION_SECRET_PATH = os.environ.get('SESSION_SECRET_PATH', os.path.join(APP_STATE_DIR, 'session_secret'))
+# 'true' rejects cart and order requests that identify the user only by user_id
+SESSION_TOKENS_REQUIRED = os.environ.get('SESSION_TOKENS_REQUIRED', 'false').lower() == 'true'
+RATE_LIMIT_PATH = os.environ.get('RATE_LIMIT_PATH', os.path.join(APP_STATE_DIR, 'rate_limits.db'))
+# Reverse proxies in front of the app whose X-Forwarded-For is trusted (Heroku's router is one)
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 1 if 'DYNO' in os.environ else 0))
+
+if TRUSTED_PROXY_HOPS:
+    # request.remote_addr becomes the real client address, which the per-IP rate limits key on
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS, x_proto=TRUSTED_PROXY_HOPS)
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available before the checkout timeout"""
+
+class _PoolEntry:
+    """Bookkeeping for one physical connection owned by a ConnectionPool"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+        # Statements prepared on this connection, by name (see execute_statement)
+        self.statements = {}
+
+class PooledConnection:
+    """Connection from ConnectionPool; close() returns it to the pool instead of closing it"""
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    @property
+    def raw(self):
+        """The underlying driver connection"""
+        if self._entry is None:
+            raise Error("Connection already returned to the pool")
+        return self._entry.raw
+
+    @property
+    def statements(self):
+        """Per-connection prepared statement cache; lives as long as the physical connection"""
+        if self._entry is None:
+            raise Error("Connection already returned to the pool")
+        return self._entry.statements
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def close(self):
+        """Return the connection to the pool (safe to call more than once)"""
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            self._pool.release(entry)
+
+class ConnectionPool:
+    """Thread-safe, bounded pool of database connections, validated when idle, recycled by use count and age"""
+
+    def __init__(self, name, factory, validator, min_size=2, max_size=10,
+                 checkout_timeout=5.0, max_uses=1000, max_age=1800.0, validate_after=30.0):
+        self.name = name
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max(1, max_size)
+        self.checkout_timeout = checkout_timeout
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.validate_after = validate_after
+        self._factory = factory
+        self._validator = validator
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._pid = os.getpid()
+        self._stats = self._new_stats()
+
+    @staticmethod
+    def _new_stats():
+        return {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'recycled': 0,
+            'validation_failures': 0,
+            'timeouts': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0
+        }
 
-    # Try MySQL first (unless in demo mode)
-    if ENVIRONMENT != 'demo':
-        print(f"🔌 Attempting to connect to MySQL: {DB_CONFIG['host']}:{DB_CONFIG.get('port', 3306)} as {DB_CONFIG['user']}")
+    def _check_fork(self):
+        """Forget connections inherited from a parent process (caller holds the lock)"""
+        if self._pid != os.getpid():
+            # The parent still owns these sockets - drop them without closing
+            self._idle.clear()
+            self._size = 0
+            self._in_use = 0
+            self._pid = os.getpid()
+            self._stats = self._new_stats()
+
+    def _create(self):
+        entry = _PoolEntry(self._factory())
+        with self._cond:
+            self._stats['created'] += 1
+        return entry
+
+    def _close_entry(self, entry, reason=None):
+        """Close a physical connection and free its slot"""
+        for statement in entry.statements.values():
+            try:
+                statement.close()
+            except Exception:
+                pass
+        entry.statements.clear()
         try:
-            connection = mysql.connector.connect(**DB_CONFIG)
-            print("✅ MySQL connection successful")
-            return connection
-        except Error as e:
-            print(f"⚠️  MySQL connection failed: {e}")
-            print("   Falling back to SQLite demo mode...")
+            entry.raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            if self._pid == os.getpid():
+                self._size -= 1
+            self._stats['closed'] += 1
+            if reason:
+                self._stats[reason] += 1
+            self._cond.notify()
+
+    def _is_expired(self, entry, now):
+        return entry.uses >= self.max_uses or now - entry.created_at >= self.max_age
+
+    def _is_healthy(self, entry, now):
+        if now - entry.last_used < self.validate_after:
+            return True
+        try:
+            return bool(self._validator(entry.raw))
+        except Exception:
+            return False
 
-    # Fallback to SQLite for demo/offline mode
-    try:
-        import sqlite3
-        connection = sqlite3.connect('robotech_store.db', check_same_thread=False)
-        connection.row_factory = sqlite3.Row  # Enable column access by name
-        print("✅ SQLite demo mode active")
-        return connection
-    except Exception as e:
-        print(f"❌ Both MySQL and SQLite failed: {e}")
-        return None
+    def warm(self):
+        """Open connections until min_size are available"""
+        while True:
+            with self._cond:
+                self._check_fork()
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                entry = self._create()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def acquire(self):
+        """Check out a connection, waiting up to checkout_timeout for a free slot"""
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+        while True:
+            entry = None
+            with self._cond:
+                self._check_fork()
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"No {self.name} connection available after {self.checkout_timeout}s "
+                            f"({self._size}/{self.max_size} in use)")
+                    self._cond.wait(remaining)
+                if self._idle:
+                    # LIFO keeps the most recently used connections hot
+                    entry = self._idle.pop()
+                else:
+                    self._size += 1
+
+            if entry is None:
+                try:
+                    entry = self._create()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            else:
+                now = time.monotonic()
+                if self._is_expired(entry, now):
+                    self._close_entry(entry, 'recycled')
+                    continue
+                if not self._is_healthy(entry, now):
+                    self._close_entry(entry, 'validation_failures')
+                    continue
+            break
+
+        waited = time.monotonic() - started
+        entry.uses += 1
+        with self._cond:
+            self._in_use += 1
+            self._stats['checkouts'] += 1
+            self._stats['wait_time_total'] += waited
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+        return PooledConnection(self, entry)
+
+    def release(self, entry):
+        """Return a checked-out connection; ends any open transaction first"""
+        healthy = True
+        try:
+            if getattr(entry.raw, 'in_transaction', True):
+                entry.raw.rollback()
+        except Exception:
+            healthy = False
+        entry.last_used = time.monotonic()
+
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            self._in_use -= 1
+            if healthy and not self._is_expired(entry, entry.last_used):
+                self._idle.append(entry)
+                self._cond.notify()
+                return
+        self._close_entry(entry, 'validation_failures' if not healthy else 'recycled')
+
+    def close_all(self):
+        """Close every idle connection (checked-out connections close on release)"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for entry in idle:
+            self._close_entry(entry)
+
+    def stats(self):
+        """Snapshot of this worker's pool counters"""
+        with self._cond:
+            self._check_fork()
+            stats = dict(self._stats)
+            checkouts = stats['checkouts']
+            stats.update({
+                'pool': self.name,
+                'pid': self._pid,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'avg_wait_ms': round(stats['wait_time_total'] * 1000 / checkouts, 3) if checkouts else 0.0,
+                'max_wait_ms': round(stats.pop('wait_time_max') * 1000, 3)
+            })
+            stats.pop('wait_time_total')
+            return stats
+
+class BackendCircuitBreaker:
+    """Closed/open/half-open health state of a database backend, probed in the background while open"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, probe, failure_threshold=3, probe_interval=5.0, on_open=None):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.probe_interval = probe_interval
+        self._probe = probe
+        self._on_open = on_open
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._trial_in_flight = False
+        self._probe_thread = None
+        self._probe_pid = None
+        self._stats = {
+            'opened_count': 0,
+            'probes': 0,
+            'probe_failures': 0,
+            'short_circuited': 0,
+            'last_error': None,
+            'opened_at': None,
+            'last_probe_at': None,
+            'state_changed_at': time.time()
+        }
 
-def init_database():
-    """Initialize database tables if they don't exist"""
-    print("🔧 init_database() function STARTED")
-    connection = get_db_connection()
-    if not connection:
-        print("❌ Could not connect to database for initialization")
-        return
-    print("✅ Database connection established in init_database()")
+    @property
+    def state(self):
+        return self._state
+
+    def _transition(self, state):
+        """Change state (caller holds the lock)"""
+        if self._state != state:
+            db_logger.warning("%s backend state: %s -> %s", self.name, self._state, state,
+                              extra={'backend': self.name, 'from_state': self._state, 'to_state': state})
+            self._state = state
+            self._stats['state_changed_at'] = time.time()
+
+    def allow_request(self):
+        """Whether the caller may use the backend right now"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self._stats['short_circuited'] += 1
+            if self._state == self.OPEN:
+                # Probe threads don't survive fork(); make sure this worker has one
+                self._ensure_probe_thread()
+            return False
 
-    # Check if we're using SQLite
-    is_sqlite = 'sqlite' in str(type(connection)).lower()
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            self._transition(self.CLOSED)
+
+    def cancel_trial(self):
+        """Give up a half-open trial without judging the backend"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self, error):
+        opened = False
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            self._stats['last_error'] = str(error)
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                opened = self._state != self.OPEN
+                self._open()
+        if opened and self._on_open:
+            self._on_open()
+
+    def _open(self):
+        """Open the breaker and start probing (caller holds the lock)"""
+        if self._state != self.OPEN:
+            self._stats['opened_count'] += 1
+            self._stats['opened_at'] = time.time()
+        self._transition(self.OPEN)
+        self._ensure_probe_thread()
+
+    def _ensure_probe_thread(self):
+        if self._probe_thread and self._probe_thread.is_alive() and self._probe_pid == os.getpid():
+            return
+        self._probe_pid = os.getpid()
+        self._probe_thread = threading.Thread(target=self._probe_loop,
+                                              name=f"{self.name}-health-probe", daemon=True)
+        self._probe_thread.start()
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(self.probe_interval)
+            with self._lock:
+                if self._state != self.OPEN:
+                    return
+            try:
+                healthy = bool(self._probe())
+                error = None
+            except Exception as e:
+                healthy = False
+                error = e
+            with self._lock:
+                self._stats['probes'] += 1
+                self._stats['last_probe_at'] = time.time()
+                if self._state != self.OPEN:
+                    return
+                if healthy:
+                    self._trial_in_flight = False
+                    self._transition(self.HALF_OPEN)
+                    return
+                self._stats['probe_failures'] += 1
+                if error is not None:
+                    self._stats['last_error'] = str(error)
+
+    def snapshot(self):
+        """Current state and counters for monitoring"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                'backend': self.name,
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'failure_threshold': self.failure_threshold,
+                'probe_interval': self.probe_interval
+            })
+            return snapshot
 
+def _connect_mysql():
+    return mysql.connector.connect(connection_timeout=DB_CONNECT_TIMEOUT, **DB_CONFIG)
+
+def _probe_mysql():
+    connection = _connect_mysql()
     try:
-        cursor = connection.cursor()
+        return connection.is_connected()
+    finally:
+        connection.close()
 
-        # Create users table (compatible with both MySQL and SQLite)
-        if is_sqlite:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id TEXT PRIMARY KEY,
-                    phone TEXT UNIQUE NOT NULL,
-                    email TEXT,
-                    name TEXT,
-                    address TEXT,
-                    otp TEXT,
-                    logged_in INTEGER DEFAULT 0,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-        else:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id VARCHAR(50) PRIMARY KEY,
-                    phone VARCHAR(15) UNIQUE NOT NULL,
-                    email VARCHAR(100),
-                    name VARCHAR(100),
-                    address TEXT,
-                    otp VARCHAR(10),
-                    logged_in BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+def _ping_mysql(raw):
+    return raw.is_connected()
+
+def _connect_sqlite():
+    # sqlite3 compiles each distinct statement text once per connection and keeps it in this cache
+    connection = sqlite3.connect(SQLITE_DB_PATH, check_same_thread=False, cached_statements=256)
+    connection.row_factory = sqlite3.Row  # Enable column access by name
+    return connection
 
-        # Add logged_in column if it doesn't exist (for existing tables)
+def _ping_sqlite(raw):
+    raw.execute("SELECT 1").fetchone()
+    return True
+
+MYSQL_POOL = ConnectionPool('mysql', _connect_mysql, _ping_mysql, **DB_POOL_CONFIG)
+SQLITE_POOL = ConnectionPool('sqlite', _connect_sqlite, _ping_sqlite, **DB_POOL_CONFIG)
+MYSQL_BREAKER = BackendCircuitBreaker('mysql', _probe_mysql, on_open=MYSQL_POOL.close_all,
+                                      **DB_BREAKER_CONFIG)
+
+def get_db_connection():
+    """Get a pooled database connection - try MySQL first (skipped while its breaker is open), fallback to SQLite"""
+
+    # Try MySQL first (unless in demo mode or known to be down)
+    if ENVIRONMENT != 'demo' and MYSQL_BREAKER.allow_request():
         try:
-            cursor.execute("ALTER TABLE users ADD COLUMN logged_in BOOLEAN DEFAULT FALSE")
-            print("✅ Added logged_in column to users table")
+            connection = MYSQL_POOL.acquire()
+        except PoolTimeoutError as e:
+            # A busy pool says nothing about MySQL health, and we don't want
+            # to split writes across backends just because the pool is full
+            MYSQL_BREAKER.cancel_trial()
+            db_logger.error("%s", e)
+            return None
         except Error as e:
-            if "Duplicate column name" not in str(e):
-                print(f"⚠️ Could not add logged_in column: {e}")
-            else:
-                print("ℹ️ logged_in column already exists")
-
-        # Drop all tables in correct order to avoid foreign key constraints
-        print("🔄 Dropping all tables in correct order...")
-        cursor.execute("DROP TABLE IF EXISTS cart")
-        cursor.execute("DROP TABLE IF EXISTS order_items")
-        cursor.execute("DROP TABLE IF EXISTS orders")
-        cursor.execute("DROP TABLE IF EXISTS products")
-        cursor.execute("DROP TABLE IF EXISTS users")
-        print("✅ All tables dropped successfully")
-
-        # Create users table first (referenced by others)
-        if is_sqlite:
-            cursor.execute("""
-                CREATE TABLE users (
-                    id TEXT PRIMARY KEY,
-                    phone TEXT UNIQUE NOT NULL,
-                    email TEXT,
-                    name TEXT,
-                    address TEXT,
-                    otp TEXT,
-                    logged_in INTEGER DEFAULT 0,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+            MYSQL_BREAKER.record_failure(e)
+            db_logger.warning("MySQL connection failed, falling back to SQLite: %s", e)
         else:
-            cursor.execute("""
-                CREATE TABLE users (
-                    id VARCHAR(50) PRIMARY KEY,
-                    phone VARCHAR(15) UNIQUE NOT NULL,
-                    email VARCHAR(100),
-                    name VARCHAR(100),
-                    address TEXT,
-                    otp VARCHAR(10),
-                    logged_in BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-        print("✅ Users table created")
+            MYSQL_BREAKER.record_success()
+            return connection
 
-        # Create products table
-        if is_sqlite:
-            cursor.execute("""
-                CREATE TABLE products (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    description TEXT,
-                    price REAL NOT NULL,
-                    original_price REAL,
-                    category TEXT,
-                    subcategory TEXT,
-                    image_url TEXT,
-                    stock_quantity INTEGER DEFAULT 0,
-                    is_featured INTEGER DEFAULT 0,
-                    is_active INTEGER DEFAULT 1,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-        else:
-            cursor.execute("""
-                CREATE TABLE products (
-                    id INT PRIMARY KEY AUTO_INCREMENT,
-                    name VARCHAR(255) NOT NULL,
-                    description TEXT,
-                    price DECIMAL(10,2) NOT NULL,
-                    original_price DECIMAL(10,2),
-                    category VARCHAR(50),
-                    subcategory VARCHAR(50),
-                    image_url VARCHAR(500),
-                    stock_quantity INT DEFAULT 0,
-                    is_featured BOOLEAN DEFAULT FALSE,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-        print("✅ Products table created")
+    # Fallback to SQLite for demo/offline mode
+    try:
+        return SQLITE_POOL.acquire()
+    except Exception as e:
+        db_logger.error("Both MySQL and SQLite failed: %s", e)
+        return None
 
-        # Create orders table (references users)
-        if is_sqlite:
-            cursor.execute("""
-                CREATE TABLE orders (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id TEXT,
-                    total_amount REAL NOT NULL,
-                    status TEXT DEFAULT 'pending',
-                    payment_method TEXT,
-                    shipping_address TEXT,
-                    billing_name TEXT,
-                    billing_email TEXT,
-                    billing_phone TEXT,
-                    billing_city TEXT,
-                    billing_zip TEXT,
-                    user_order_number INTEGER DEFAULT 1,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(id)
-                )
-            """)
-        else:
-            cursor.execute("""
-                CREATE TABLE orders (
-                    id INT PRIMARY KEY AUTO_INCREMENT,
-                    user_id VARCHAR(50),
-                    total_amount DECIMAL(10,2) NOT NULL,
-                    status VARCHAR(50) DEFAULT 'pending',
-                    payment_method VARCHAR(50),
-                    shipping_address TEXT,
-                    billing_name VARCHAR(255),
-                    billing_email VARCHAR(255),
-                    billing_phone VARCHAR(20),
-                    billing_city VARCHAR(100),
-                    billing_zip VARCHAR(20),
-                    user_order_number INT DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(id)
-                )
-            """)
-        print("✅ Orders table created")
+def is_sqlite_connection(connection):
+    """Check if connection is SQLite"""
+    if isinstance(connection, PooledConnection):
+        connection = connection.raw
+    return isinstance(connection, sqlite3.Connection)
+
+def get_pool_stats():
+    """Per-worker statistics for every connection pool"""
+    return {pool.name: pool.stats() for pool in (MYSQL_POOL, SQLITE_POOL)}
+
+def get_active_backend():
+    """Name of the backend new requests are currently routed to"""
+    if ENVIRONMENT == 'demo' or MYSQL_BREAKER.state == BackendCircuitBreaker.OPEN:
+        return 'sqlite'
+    return 'mysql'
+
+# Dialect-aware SQL layer. Hot-path statements are written once with {p}
+# for each placeholder (plus dialect fragments such as {for_update}), or
+# per dialect where the syntax really differs, and rendered once per engine.
+DB_ERRORS = (Error, sqlite3.Error)
+
+class SqlDialect:
+    """Placeholder style and syntax fragments for one database engine"""
+
+    def __init__(self, name, placeholder, **fragments):
+        self.name = name
+        self.placeholder = placeholder
+        self.fragments = fragments
+        self._rendered = {}
+
+    def sql(self, template):
+        """Render a template written with {p} placeholders for this engine"""
+        return template.format(p=self.placeholder, **self.fragments)
+
+    def placeholders(self, count):
+        """'?, ?, ?' / '%s, %s, %s' for an IN (...) list or VALUES row"""
+        return ', '.join([self.placeholder] * count)
+
+    def statement(self, name):
+        """SQL text of a SQL_STATEMENTS entry, rendered on first use"""
+        sql = self._rendered.get(name)
+        if sql is None:
+            template = SQL_STATEMENTS[name]
+            if isinstance(template, dict):
+                template = template[self.name]
+            sql = self._rendered[name] = self.sql(template)
+        return sql
+
+SQLITE_DIALECT = SqlDialect('sqlite', '?', for_update='')
+MYSQL_DIALECT = SqlDialect('mysql', '%s', for_update='FOR UPDATE')
+
+def get_dialect(connection):
+    """SqlDialect for a (pooled) connection"""
+    return SQLITE_DIALECT if is_sqlite_connection(connection) else MYSQL_DIALECT
+
+SQL_STATEMENTS = {
+    # Users
+    'users.count': "SELECT COUNT(*) FROM users WHERE id = {p}",
+    'users.by_phone': "SELECT id FROM users WHERE phone = {p}",
+    'users.insert_if_missing': {
+        'sqlite': "INSERT INTO users (id, phone, name, logged_in) VALUES ({p}, {p}, '', 1) ON CONFLICT DO NOTHING",
+        'mysql': "INSERT INTO users (id, phone, name, logged_in) VALUES ({p}, {p}, '', TRUE) "
+                 "ON DUPLICATE KEY UPDATE id = id",
+    },
+    'users.upsert_login': {
+        'sqlite': "INSERT INTO users (id, phone, logged_in) VALUES ({p}, {p}, {p}) "
+                  "ON CONFLICT(id) DO UPDATE SET logged_in = excluded.logged_in",
+        'mysql': "INSERT INTO users (id, phone, logged_in) VALUES ({p}, {p}, {p}) "
+                 "ON DUPLICATE KEY UPDATE logged_in = VALUES(logged_in)",
+    },
+    # Cart
+    'cart.lines': "SELECT product_id, quantity FROM cart WHERE user_id = {p} ORDER BY product_id",
+    'cart.items': """
+        SELECT c.product_id, c.quantity, p.name, p.price, p.image_url, p.description, p.category
+        FROM cart c
+        JOIN products p ON c.product_id = p.id
+        WHERE c.user_id = {p}
+        ORDER BY c.product_id
+    """,
+    # Locks only the cart rows; joining products here would lock them too on MySQL
+    'cart.lines_for_update': "SELECT product_id, quantity FROM cart WHERE user_id = {p} "
+                             "ORDER BY product_id {for_update}",
+    'cart.version': "SELECT version FROM cart_versions WHERE user_id = {p}",
+    'cart.bump_version': {
+        'sqlite': "INSERT INTO cart_versions (user_id, version) VALUES ({p}, 1) "
+                  "ON CONFLICT(user_id) DO UPDATE SET version = version + 1",
+        'mysql': "INSERT INTO cart_versions (user_id, version) VALUES ({p}, 1) "
+                 "ON DUPLICATE KEY UPDATE version = version + 1",
+    },
+    'cart.set': {
+        'sqlite': "INSERT INTO cart (user_id, product_id, quantity) VALUES ({p}, {p}, {p}) "
+                  "ON CONFLICT(user_id, product_id) DO UPDATE SET quantity = excluded.quantity",
+        'mysql': "INSERT INTO cart (user_id, product_id, quantity) VALUES ({p}, {p}, {p}) "
+                 "ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)",
+    },
+    # Inserts or updates only if both the user and the product exist
+    'cart.set_if_valid': {
+        'sqlite': "INSERT INTO cart (user_id, product_id, quantity) "
+                  "SELECT u.id, p.id, {p} FROM users u JOIN products p ON p.id = {p} WHERE u.id = {p} "
+                  "ON CONFLICT(user_id, product_id) DO UPDATE SET quantity = excluded.quantity",
+        'mysql': "INSERT INTO cart (user_id, product_id, quantity) "
+                 "SELECT u.id, p.id, {p} FROM users u JOIN products p ON p.id = {p} WHERE u.id = {p} "
+                 "ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)",
+    },
+    'cart.user_and_product_counts': "SELECT (SELECT COUNT(*) FROM users WHERE id = {p}), "
+                                    "(SELECT COUNT(*) FROM products WHERE id = {p})",
+    'cart.delete_line': "DELETE FROM cart WHERE user_id = {p} AND product_id = {p}",
+    'cart.clear': "DELETE FROM cart WHERE user_id = {p}",
+    # Orders
+    'orders.bump_counter': {
+        'sqlite': "INSERT INTO user_order_counters (user_id, order_count) VALUES ({p}, 1) "
+                  "ON CONFLICT(user_id) DO UPDATE SET order_count = order_count + 1",
+        'mysql': "INSERT INTO user_order_counters (user_id, order_count) VALUES ({p}, 1) "
+                 "ON DUPLICATE KEY UPDATE order_count = order_count + 1",
+    },
+    'orders.counter': "SELECT order_count FROM user_order_counters WHERE user_id = {p}",
+    'orders.insert': """
+        INSERT INTO orders (user_id, total_amount, status, payment_method,
+                            shipping_address, billing_name, billing_email,
+                            billing_phone, billing_city, billing_zip, user_order_number,
+                            reservation_expires_at)
+        VALUES ({p}, {p}, {p}, {p}, {p}, {p}, {p}, {p}, {p}, {p}, {p}, {p})
+    """,
+    'order_items.insert': "INSERT INTO order_items (order_id, product_id, quantity, price) "
+                          "VALUES ({p}, {p}, {p}, {p})",
+    'orders.complete': "UPDATE orders SET status = 'completed', reservation_expires_at = NULL "
+                       "WHERE id = {p} AND user_id = {p} AND status = 'pending'",
+    'orders.status': "SELECT status FROM orders WHERE id = {p} AND user_id = {p}",
+    'orders.history': """
+        SELECT id, user_order_number, total_amount, status, payment_method,
+               created_at, billing_name, billing_email
+        FROM orders
+        WHERE user_id = {p}
+        ORDER BY created_at DESC, id DESC
+        LIMIT {p}
+    """,
+    'orders.history_after': """
+        SELECT id, user_order_number, total_amount, status, payment_method,
+               created_at, billing_name, billing_email
+        FROM orders
+        WHERE user_id = {p} AND (created_at < {p} OR (created_at = {p} AND id < {p}))
+        ORDER BY created_at DESC, id DESC
+        LIMIT {p}
+    """,
+    'orders.expired_reservations': "SELECT id FROM orders WHERE reservation_expires_at < {p} "
+                                   "AND status = 'pending' ORDER BY reservation_expires_at LIMIT {p}",
+    'orders.expire': "UPDATE orders SET status = 'expired', reservation_expires_at = NULL "
+                     "WHERE id = {p} AND status = 'pending'",
+    'orders.restock': """
+        UPDATE products SET stock_quantity = stock_quantity + (
+            SELECT SUM(oi.quantity) FROM order_items oi
+            WHERE oi.order_id = {p} AND oi.product_id = products.id
+        )
+        WHERE id IN (SELECT product_id FROM order_items WHERE order_id = {p})
+    """,
+}
 
-        # Create order_items table (references products and orders)
-        if is_sqlite:
-            cursor.execute("""
-                CREATE TABLE order_items (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    order_id INTEGER,
-                    product_id INTEGER,
-                    quantity INTEGER NOT NULL,
-                    price REAL NOT NULL,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (order_id) REFERENCES orders(id),
-                    FOREIGN KEY (product_id) REFERENCES products(id)
-                )
-            """)
-        else:
-            cursor.execute("""
-                CREATE TABLE order_items (
-                    id INT PRIMARY KEY AUTO_INCREMENT,
-                    order_id INT,
-                    product_id INT,
-                    quantity INT NOT NULL,
-                    price DECIMAL(10,2) NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (order_id) REFERENCES orders(id),
-                    FOREIGN KEY (product_id) REFERENCES products(id)
-                )
-            """)
-        print("✅ Order_items table created")
+def execute_statement(connection, name, params=()):
+    """Run a SQL_STATEMENTS entry as a cached prepared statement; read the returned cursor, don't close it"""
+    dialect = get_dialect(connection)
+    sql = dialect.statement(name)
+    if dialect is SQLITE_DIALECT:
+        return connection.execute(sql, params)
 
-        # Create cart table (references users and products)
+    cursor = connection.statements.get(name)
+    if cursor is None:
+        cursor = connection.statements[name] = connection.cursor(prepared=True)
+    try:
+        cursor.execute(sql, params)
+    except Error:
+        # Don't reuse a cursor left in an unknown state
+        connection.statements.pop(name, None)
+        try:
+            cursor.close()
+        except Exception:
+            pass
+        raise
+    return cursor
+
+def query_one(connection, name, params=()):
+    """First row of a SQL_STATEMENTS query, or None"""
+    rows = execute_statement(connection, name, params).fetchall()
+    return rows[0] if rows else None
+
+def execute_statement_many(connection, name, seq_params):
+    """executemany for a SQL_STATEMENTS entry on a plain cursor"""
+    cursor = connection.cursor()
+    try:
+        cursor.executemany(get_dialect(connection).statement(name), seq_params)
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+# Bulk catalog loading
+CATALOG_COLUMNS = ('id', 'name', 'description', 'price', 'category',
+                   'image_url', 'stock_quantity', 'is_featured')
+
+def _catalog_row(product):
+    """Product dict -> tuple in CATALOG_COLUMNS order (missing id lets the DB assign one)"""
+    return (
+        product.get('id'),
+        product['name'],
+        product.get('description'),
+        product['price'],
+        product.get('category'),
+        product.get('image_url'),
+        product.get('stock_quantity', 0),
+        bool(product.get('is_featured', False))
+    )
+
+def _catalog_upsert_clause(is_sqlite):
+    updates = [c for c in CATALOG_COLUMNS if c != 'id']
+    if is_sqlite:
+        return " ON CONFLICT(id) DO UPDATE SET " + ", ".join(f"{c} = excluded.{c}" for c in updates)
+    return " ON DUPLICATE KEY UPDATE " + ", ".join(f"{c} = VALUES({c})" for c in updates)
+
+def _catalog_report(method, rows, batches, batch_size, started):
+    seconds = time.perf_counter() - started
+    report = {
+        'method': method,
+        'rows': rows,
+        'batches': batches,
+        'batch_size': batch_size,
+        'seconds': round(seconds, 3),
+        'rows_per_second': int(rows / seconds) if seconds > 0 else rows
+    }
+    db_logger.info("Loaded %d products in %ss (%d rows/s, %d batches via %s)",
+                   rows, report['seconds'], report['rows_per_second'], batches, method)
+    return report
+
+def bulk_insert_products(cursor, products, is_sqlite, batch_size=None, upsert=False):
+    """Insert products in batches on an open cursor (the caller owns the transaction) -> throughput report"""
+    batch_size = max(1, batch_size or CATALOG_LOAD_BATCH_SIZE)
+    started = time.perf_counter()
+    columns = ", ".join(CATALOG_COLUMNS)
+    upsert_clause = _catalog_upsert_clause(is_sqlite) if upsert else ""
+    rows = 0
+    batches = 0
+    batch = []
+
+    def flush():
         if is_sqlite:
-            cursor.execute("""
-                CREATE TABLE cart (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id TEXT,
-                    product_id INTEGER,
-                    quantity INTEGER DEFAULT 1,
-                    added_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(id),
-                    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
-                )
-            """)
-            # SQLite doesn't support UNIQUE KEY syntax in CREATE TABLE
-            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_cart_item ON cart(user_id, product_id)")
+            values = "(" + ", ".join(["?"] * len(CATALOG_COLUMNS)) + ")"
+            cursor.executemany(f"INSERT INTO products ({columns}) VALUES {values}{upsert_clause}", batch)
         else:
-            cursor.execute("""
-                CREATE TABLE cart (
-                    id INT PRIMARY KEY AUTO_INCREMENT,
-                    user_id VARCHAR(50),
-                    product_id INT,
-                    quantity INT DEFAULT 1,
-                    added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(id),
-                    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
-                    UNIQUE KEY unique_cart_item (user_id, product_id)
-                )
-            """)
-        print("✅ Cart table created with foreign key constraints")
+            values = "(" + ", ".join(["%s"] * len(CATALOG_COLUMNS)) + ")"
+            params = [value for row in batch for value in row]
+            cursor.execute(
+                f"INSERT INTO products ({columns}) VALUES {', '.join([values] * len(batch))}{upsert_clause}",
+                params)
+
+    for product in products:
+        batch.append(_catalog_row(product))
+        if len(batch) >= batch_size:
+            flush()
+            rows += len(batch)
+            batches += 1
+            batch = []
+    if batch:
+        flush()
+        rows += len(batch)
+        batches += 1
+
+    method = 'executemany' if is_sqlite else 'multi_row_values'
+    return _catalog_report(method, rows, batches, batch_size, started)
+
+def _tsv_field(value):
+    """Encode a value for LOAD DATA's default tab-separated format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+def _load_products_via_load_data(products):
+    """Stream products to MySQL with LOAD DATA LOCAL INFILE on a dedicated connection"""
+    started = time.perf_counter()
+    rows = 0
+    with tempfile.NamedTemporaryFile('w', suffix='.tsv', encoding='utf-8', delete=False) as f:
+        path = f.name
+        for product in products:
+            f.write("\t".join(_tsv_field(v) for v in _catalog_row(product)) + "\n")
+            rows += 1
+
+    connection = mysql.connector.connect(allow_local_infile=True,
+                                         connection_timeout=DB_CONNECT_TIMEOUT, **DB_CONFIG)
+    try:
+        cursor = connection.cursor()
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE products CHARACTER SET utf8mb4 "
+            f"({', '.join(CATALOG_COLUMNS)})", (path,))
+        bump_catalog_version(cursor)
+        connection.commit()
+        invalidate_catalog_caches()
+        cursor.close()
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+        os.remove(path)
+    return _catalog_report('load_data', rows, 1, rows, started)
 
-        # Verify the tables were created correctly
-        cursor.execute("DESCRIBE products")
-        columns = cursor.fetchall()
-        print("📋 Products table columns:")
-        for col in columns:
-            print(f"   - {col[0]}: {col[1]}")
-        print("✅ Table schema verified")
+def bump_catalog_version(cursor):
+    """Mark the product catalog as changed - call inside the writing transaction"""
+    cursor.execute("UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1")
+
+def load_catalog(products, batch_size=None, upsert=False, method='auto'):
+    """Bulk load products in one transaction with batched inserts or LOAD DATA -> throughput report, None on failure"""
+    if method not in ('auto', 'load_data'):
+        raise ValueError(f"Unknown catalog load method: {method}")
+
+    connection = get_db_connection()
+    if not connection:
+        db_logger.error("Could not connect to database for catalog load")
+        return None
 
+    is_sqlite = is_sqlite_connection(connection)
+    if method == 'load_data':
+        connection.close()
+        if is_sqlite or upsert:
+            raise ValueError("load_data requires MySQL and does not support upsert")
+        try:
+            return _load_products_via_load_data(products)
+        except Error as e:
+            db_logger.error("LOAD DATA failed: %s", e)
+            return None
 
-        # FORCE CLEAR ALL EXISTING PRODUCTS - NO MATTER WHAT
-        print("🔄 FORCE clearing ALL existing products from database...")
+    cursor = connection.cursor()
+    try:
+        report = bulk_insert_products(cursor, products, is_sqlite, batch_size, upsert)
+        bump_catalog_version(cursor)
+        connection.commit()
+        invalidate_catalog_caches()
+        return report
+    except Exception as e:
+        db_logger.error("Catalog load failed, rolling back: %s", e)
+        connection.rollback()
+        return None
+    finally:
+        cursor.close()
+        connection.close()
 
-        # FIRST: Clear ALL cart items (start fresh on database reload)
-        cursor.execute("DELETE FROM cart")
-        connection.commit()  # Commit cart clearing first
-        print("🗑️ Cleared ALL cart items (fresh start)")
+# Schema migrations - applied in order, each exactly once per database
+MIGRATION_LOCK_NAME = 'robotech_store_schema_migrations'
+MIGRATION_LOCK_TIMEOUT = int(os.environ.get('DB_MIGRATION_LOCK_TIMEOUT', 60))
 
-        # Check what's currently in the database
-        cursor.execute("SELECT COUNT(*) FROM products")
-        old_count = cursor.fetchone()[0]
-        print(f"📊 Found {old_count} existing products before clearing")
+def _migration_001_initial_schema(cursor, is_sqlite):
+    """Create the base tables (adopts databases created before migrations existed)"""
+    if is_sqlite:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                id TEXT PRIMARY KEY,
+                phone TEXT UNIQUE NOT NULL,
+                email TEXT,
+                name TEXT,
+                address TEXT,
+                otp TEXT,
+                logged_in INTEGER DEFAULT 0,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS products (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                description TEXT,
+                price REAL NOT NULL,
+                original_price REAL,
+                category TEXT,
+                subcategory TEXT,
+                image_url TEXT,
+                stock_quantity INTEGER DEFAULT 0,
+                is_featured INTEGER DEFAULT 0,
+                is_active INTEGER DEFAULT 1,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS orders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT,
+                total_amount REAL NOT NULL,
+                status TEXT DEFAULT 'pending',
+                payment_method TEXT,
+                shipping_address TEXT,
+                billing_name TEXT,
+                billing_email TEXT,
+                billing_phone TEXT,
+                billing_city TEXT,
+                billing_zip TEXT,
+                user_order_number INTEGER DEFAULT 1,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS order_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                order_id INTEGER,
+                product_id INTEGER,
+                quantity INTEGER NOT NULL,
+                price REAL NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (order_id) REFERENCES orders(id),
+                FOREIGN KEY (product_id) REFERENCES products(id)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS cart (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT,
+                product_id INTEGER,
+                quantity INTEGER DEFAULT 1,
+                added_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id),
+                FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+            )
+        """)
+        # SQLite doesn't support UNIQUE KEY syntax in CREATE TABLE
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_cart_item ON cart(user_id, product_id)")
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                id VARCHAR(50) PRIMARY KEY,
+                phone VARCHAR(15) UNIQUE NOT NULL,
+                email VARCHAR(100),
+                name VARCHAR(100),
+                address TEXT,
+                otp VARCHAR(10),
+                logged_in BOOLEAN DEFAULT FALSE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS products (
+                id INT PRIMARY KEY AUTO_INCREMENT,
+                name VARCHAR(255) NOT NULL,
+                description TEXT,
+                price DECIMAL(10,2) NOT NULL,
+                original_price DECIMAL(10,2),
+                category VARCHAR(50),
+                subcategory VARCHAR(50),
+                image_url VARCHAR(500),
+                stock_quantity INT DEFAULT 0,
+                is_featured BOOLEAN DEFAULT FALSE,
+                is_active BOOLEAN DEFAULT TRUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS orders (
+                id INT PRIMARY KEY AUTO_INCREMENT,
+                user_id VARCHAR(50),
+                total_amount DECIMAL(10,2) NOT NULL,
+                status VARCHAR(50) DEFAULT 'pending',
+                payment_method VARCHAR(50),
+                shipping_address TEXT,
+                billing_name VARCHAR(255),
+                billing_email VARCHAR(255),
+                billing_phone VARCHAR(20),
+                billing_city VARCHAR(100),
+                billing_zip VARCHAR(20),
+                user_order_number INT DEFAULT 1,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS order_items (
+                id INT PRIMARY KEY AUTO_INCREMENT,
+                order_id INT,
+                product_id INT,
+                quantity INT NOT NULL,
+                price DECIMAL(10,2) NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (order_id) REFERENCES orders(id),
+                FOREIGN KEY (product_id) REFERENCES products(id)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS cart (
+                id INT PRIMARY KEY AUTO_INCREMENT,
+                user_id VARCHAR(50),
+                product_id INT,
+                quantity INT DEFAULT 1,
+                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id),
+                FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+                UNIQUE KEY unique_cart_item (user_id, product_id)
+            )
+        """)
+
+def _migration_002_seed_demo_catalog(cursor, is_sqlite):
+    """Load DEMO_PRODUCTS into an empty products table"""
+    cursor.execute("SELECT COUNT(*) FROM products")
+    if cursor.fetchone()[0] > 0:
+        db_logger.info("Products table already populated - skipping demo catalog seed")
+        return
 
-        # Clear ALL products (now safe since cart is empty)
-        cursor.execute("DELETE FROM products")
-        connection.commit()  # Commit product clearing
-        print("🗑️ Cleared ALL products from database")
+    bulk_insert_products(cursor, DEMO_PRODUCTS, is_sqlite)
 
-        # Verify clearing worked
-        cursor.execute("SELECT COUNT(*) FROM products")
-        after_clear_count = cursor.fetchone()[0]
-        print(f"📊 After clearing: {after_clear_count} products (should be 0)")
+def _migration_003_catalog_version(cursor, is_sqlite):
+    """Single-row counter bumped whenever the products table changes"""
+    if is_sqlite:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS catalog_version (
+                id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 1,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 1)")
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS catalog_version (
+                id INT PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 1,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("INSERT IGNORE INTO catalog_version (id, version) VALUES (1, 1)")
+
+def _migration_004_user_order_counters(cursor, is_sqlite):
+    """Per-user order counter replacing COUNT(*) over orders, backfilled from existing orders"""
+    if is_sqlite:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_order_counters (
+                user_id TEXT PRIMARY KEY,
+                order_count INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        cursor.execute("""
+            INSERT OR IGNORE INTO user_order_counters (user_id, order_count)
+            SELECT user_id, MAX(user_order_number) FROM orders
+            WHERE user_id IS NOT NULL GROUP BY user_id
+        """)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_order_counters (
+                user_id VARCHAR(50) PRIMARY KEY,
+                order_count INT NOT NULL DEFAULT 0
+            )
+        """)
+        cursor.execute("""
+            INSERT IGNORE INTO user_order_counters (user_id, order_count)
+            SELECT user_id, MAX(user_order_number) FROM orders
+            WHERE user_id IS NOT NULL GROUP BY user_id
+        """)
+
+def _migration_005_order_reservations(cursor, is_sqlite):
+    """Deadline for pending orders' stock reservations, indexed for the expiry sweep"""
+    if is_sqlite:
+        cursor.execute("ALTER TABLE orders ADD COLUMN reservation_expires_at DATETIME")
+    else:
+        cursor.execute("ALTER TABLE orders ADD COLUMN reservation_expires_at DATETIME NULL")
+    cursor.execute("CREATE INDEX idx_orders_reservation_expires ON orders (reservation_expires_at)")
+
+# Secondary indexes for the hot query shapes: (name, table, columns).
+# Product listings filter on category or is_featured and sort on
+# LOWER(name), price or id; order history reads one user's orders newest
+# first and then their items by order id. Cart reads are served by the cart
+# unique key and reservation sweeps by idx_orders_reservation_expires.
+# Columns containing '(' are expressions (MySQL needs 8.0.13 or later).
+MANAGED_INDEXES = [
+    ('idx_products_lower_name', 'products', ('LOWER(name)',)),
+    ('idx_products_price', 'products', ('price',)),
+    ('idx_products_category_lower_name', 'products', ('category', 'LOWER(name)')),
+    ('idx_products_category_price', 'products', ('category', 'price')),
+    ('idx_products_featured_lower_name', 'products', ('is_featured', 'LOWER(name)')),
+    ('idx_products_featured_price', 'products', ('is_featured', 'price')),
+    ('idx_orders_user_created', 'orders', ('user_id', 'created_at', 'id')),
+    ('idx_order_items_order', 'order_items', ('order_id',)),
+]
 
-        # Reset auto-increment
+def _table_indexes(cursor, is_sqlite, table):
+    """index name -> tuple of its columns in order"""
+    indexes = {}
+    if is_sqlite:
+        cursor.execute(f"PRAGMA index_list({table})")
+        for index_name in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f"PRAGMA index_info({index_name})")
+            indexes[index_name] = tuple(row[2] for row in sorted(cursor.fetchall(), key=lambda row: row[0]))
+    else:
+        cursor.execute("""
+            SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+            ORDER BY INDEX_NAME, SEQ_IN_INDEX
+        """, (table,))
+        for index_name, column_name in cursor.fetchall():
+            indexes[index_name] = indexes.get(index_name, ()) + (column_name,)
+    return indexes
+
+def ensure_managed_indexes(cursor, is_sqlite):
+    """Create missing MANAGED_INDEXES entries, reusing indexes with the same leading columns -> names created"""
+    created = []
+    for index_name, table, columns in MANAGED_INDEXES:
+        existing = _table_indexes(cursor, is_sqlite, table)
+        if any('(' in column for column in columns):
+            if index_name in existing:
+                continue
+        elif any(index_columns[:len(columns)] == columns for index_columns in existing.values()):
+            continue
+        key_parts = ', '.join(f"({column})" if '(' in column else column for column in columns)
         try:
-            cursor.execute("ALTER TABLE products AUTO_INCREMENT = 1")
-            print("🔄 Reset auto-increment counter")
-        except Error as e:
-            print(f"⚠️ Could not reset auto-increment: {e}")
+            cursor.execute(f"CREATE INDEX {index_name} ON {table} ({key_parts})")
+        except DB_ERRORS as e:
+            if is_sqlite:
+                raise
+            db_logger.warning("Could not create expression index %s (MySQL 8.0.13+ required): %s", index_name, e)
+            continue
+        created.append(index_name)
+    return created
+
+def _migration_006_secondary_indexes(cursor, is_sqlite):
+    """Indexes for product listings, order history and order items"""
+    created = ensure_managed_indexes(cursor, is_sqlite)
+    if created:
+        db_logger.info("Created indexes: %s", ', '.join(created))
+
+def _migration_007_cart_versions(cursor, is_sqlite):
+    """Per-user counter bumped by every cart write, so each worker can validate its cached carts"""
+    if is_sqlite:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS cart_versions (
+                user_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS cart_versions (
+                user_id VARCHAR(50) PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0
+            )
+        """)
+
+def _migration_008_lower_name_indexes(cursor, is_sqlite):
+    """Replace the name sort indexes with LOWER(name) ones matching the case-insensitive listing order"""
+    existing = _table_indexes(cursor, is_sqlite, 'products')
+    for index_name in ('idx_products_name', 'idx_products_category_name', 'idx_products_featured_name'):
+        if index_name in existing:
+            cursor.execute(f"DROP INDEX {index_name}" if is_sqlite else f"DROP INDEX {index_name} ON products")
+    created = ensure_managed_indexes(cursor, is_sqlite)
+    if created:
+        db_logger.info("Created indexes: %s", ', '.join(created))
+
+# (version, description, migrate(cursor, is_sqlite)) - append only, never renumber
+SCHEMA_MIGRATIONS = [
+    (1, 'initial schema', _migration_001_initial_schema),
+    (2, 'seed demo catalog', _migration_002_seed_demo_catalog),
+    (3, 'catalog version counter', _migration_003_catalog_version),
+    (4, 'user order counters', _migration_004_user_order_counters),
+    (5, 'order stock reservations', _migration_005_order_reservations),
+    (6, 'secondary indexes', _migration_006_secondary_indexes),
+    (7, 'cart versions', _migration_007_cart_versions),
+    (8, 'case-insensitive name indexes', _migration_008_lower_name_indexes),
+]
 
-        # Load ONLY products from DEMO_PRODUCTS
-        print(f"📦 Loading {len(DEMO_PRODUCTS)} products from DEMO_PRODUCTS...")
-        if len(DEMO_PRODUCTS) == 0:
-            print("❌ CRITICAL ERROR: DEMO_PRODUCTS list is empty!")
-            return
+def _get_schema_version(cursor):
+    """Highest applied migration version, or None if schema_version doesn't exist yet"""
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        row = cursor.fetchone()
+        return (row[0] or 0) if row else 0
+    except Exception:
+        return None
 
-        print(f"📋 DEMO_PRODUCTS contains {len(DEMO_PRODUCTS)} products")
-        print(f"📋 First product: {DEMO_PRODUCTS[0]['name']} (ID: {DEMO_PRODUCTS[0]['id']})")
-        print(f"📋 Last product: {DEMO_PRODUCTS[-1]['name']} (ID: {DEMO_PRODUCTS[-1]['id']})")
+def _acquire_migration_lock(cursor, is_sqlite):
+    """Serialize migrations across worker processes"""
+    if is_sqlite:
+        # Holds the database write lock until the final commit
+        cursor.execute("BEGIN EXCLUSIVE")
+        return
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK_NAME, MIGRATION_LOCK_TIMEOUT))
+    row = cursor.fetchone()
+    if not row or row[0] != 1:
+        raise Error(f"Timed out waiting for migration lock '{MIGRATION_LOCK_NAME}'")
+
+def _release_migration_lock(cursor, is_sqlite):
+    if not is_sqlite:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK_NAME,))
+        cursor.fetchone()
+
+def migrate_schema(connection):
+    """Apply pending SCHEMA_MIGRATIONS on connection -> schema version afterwards, None on failure"""
+    is_sqlite = is_sqlite_connection(connection)
+    latest_version = SCHEMA_MIGRATIONS[-1][0]
+    cursor = None
+    locked = False
 
-        inserted_count = 0
-        failed_count = 0
-        for i, product in enumerate(DEMO_PRODUCTS):
-            try:
-                cursor.execute("""
-                    INSERT INTO products (id, name, description, price, category, image_url, stock_quantity, is_featured)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    product['id'],
-                    product['name'],
-                    product['description'],
-                    product['price'],
-                    product['category'],
-                    product['image_url'],
-                    product['stock_quantity'],
-                    product['is_featured']
-                ))
-                inserted_count += 1
-                if inserted_count <= 3:  # Show first 3 insertions
-                    print(f"✅ Inserted: ID {product['id']} - {product['name']}")
-                elif inserted_count == len(DEMO_PRODUCTS):  # Show last one
-                    print(f"✅ Inserted: ID {product['id']} - {product['name']} (last product)")
-            except Exception as e:
-                failed_count += 1
-                print(f"❌ Failed to insert product {product['id']} - {product['name']}: {e}")
-                if failed_count <= 3:  # Show first 3 failures
-                    continue
+    try:
+        cursor = connection.cursor()
 
-        print(f"📊 Insertion summary: {inserted_count} successful, {failed_count} failed")
+        # Fast path - nothing to do, no lock needed
+        if _get_schema_version(cursor) == latest_version:
+            db_logger.info("Database schema is up to date (version %s)", latest_version)
+            return latest_version
+        connection.rollback()
 
-        if inserted_count > 0:
-            # Commit all product insertions
-            connection.commit()
-            print(f"✅ Committed {inserted_count} products to database")
-        else:
-            print("❌ No products were inserted - rolling back")
-            connection.rollback()
-            return
+        _acquire_migration_lock(cursor, is_sqlite)
+        locked = True
 
-        # Verify what we loaded
-        cursor.execute("SELECT COUNT(*) FROM products")
-        new_count = cursor.fetchone()[0]
-        print(f"✅ Database now has {new_count} products (should be {len(DEMO_PRODUCTS)})")
-
-        # Cart was already cleared at the beginning
-
-        # FINAL VERIFICATION
-        cursor.execute("SELECT COUNT(*) FROM products")
-        final_count = cursor.fetchone()[0]
-        print(f"📊 FINAL COUNT: {final_count} products in database")
-
-        # Check your key products
-        key_ids = [1, 2, 36, 41, 26, 51]  # Include 26 (Lilypad) and 51 (PCB Antenna) to check if they're gone
-        placeholders = ','.join(['%s'] * len(key_ids))
-        cursor.execute(f"SELECT id, name FROM products WHERE id IN ({placeholders})", key_ids)
-        key_products = cursor.fetchall()
-        print("🔑 KEY PRODUCTS CHECK:")
-        for prod_id, prod_name in key_products:
-            if prod_id == 26 and "Lilypad" in prod_name:
-                status = "❌ STILL HAS ARDUINO LILYPAD!"
-            elif prod_id == 51 and "PCB Antenna" in prod_name:
-                status = "❌ STILL HAS PCB ANTENNA!"
-            else:
-                status = "✅ CORRECT"
-            print(f"   - ID {prod_id}: {prod_name} {status}")
-
-        # Check for any old products that shouldn't exist
-        cursor.execute("SELECT id, name FROM products WHERE name LIKE '%Lilypad%' OR name LIKE '%PCB Antenna%' OR name LIKE '%Arduino%' AND name NOT LIKE '%Uno%' AND name NOT LIKE '%Due%' AND name NOT LIKE '%Mega%' AND name NOT LIKE '%Nano%'")
-        bad_products = cursor.fetchall()
-        if bad_products:
-            print("❌ CRITICAL ERROR: Found unwanted products:")
-            for prod_id, prod_name in bad_products:
-                print(f"   - ID {prod_id}: {prod_name} ❌")
+        if is_sqlite:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
         else:
-            print("✅ SUCCESS: No unwanted products found - database is clean!")
-
-        # Show first 5 products to verify correct loading
-        cursor.execute("SELECT id, name FROM products ORDER BY id LIMIT 5")
-        first_five = cursor.fetchall()
-        print("📋 FIRST 5 PRODUCTS IN DATABASE:")
-        for prod_id, prod_name in first_five:
-            print(f"   - ID {prod_id}: {prod_name}")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INT PRIMARY KEY,
+                    description VARCHAR(255) NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
 
+        # Another worker may have finished while we waited for the lock
+        current_version = _get_schema_version(cursor) or 0
+        pending = [m for m in SCHEMA_MIGRATIONS if m[0] > current_version]
+        if not pending:
+            db_logger.info("Database schema is up to date (version %s)", current_version)
+            connection.commit()
+            return current_version
+
+        placeholder = '?' if is_sqlite else '%s'
+        for version, description, migrate in pending:
+            db_logger.info("Applying migration %s: %s", version, description)
+            migrate(cursor, is_sqlite)
+            cursor.execute(
+                f"INSERT INTO schema_version (version, description) VALUES ({placeholder}, {placeholder})",
+                (version, description))
+            if not is_sqlite:
+                # MySQL DDL commits implicitly; commit the bookkeeping with it
+                connection.commit()
         connection.commit()
-        print("✅ Database initialized successfully")
-        print("🎉 init_database() COMPLETED SUCCESSFULLY!")
+        db_logger.info("Database schema migrated to version %s", latest_version)
+        return latest_version
 
-    except Error as e:
-        print(f"❌ Error initializing database: {e}")
-        import traceback
-        traceback.print_exc()
     except Exception as e:
-        print(f"❌ Unexpected error in init_database: {e}")
-        import traceback
-        traceback.print_exc()
+        db_logger.exception("Error initializing database: %s", e)
+        try:
+            connection.rollback()
+        except Exception:
+            pass
+        return None
     finally:
-        if connection:
-            connection.close()
-            print("🔌 Database connection closed")
+        if locked:
+            try:
+                _release_migration_lock(cursor, is_sqlite)
+            except Exception as e:
+                db_logger.warning("Could not release migration lock: %s", e)
+        if cursor:
+            cursor.close()
+
+def init_database():
+    """Apply pending schema migrations; safe to call from every worker at startup"""
+    connection = get_db_connection()
+    if not connection:
+        db_logger.error("Could not connect to database for initialization")
+        return
+    try:
+        migrate_schema(connection)
+    finally:
+        connection.close()
 
 # Test MySQL connection
-print("🔍 Testing MySQL connection...")
 test_conn = get_db_connection()
 if test_conn:
-    print("✅ MySQL connection test successful")
+    db_logger.info("Database connection test successful (%s)", get_dialect(test_conn).name)
+    test_pool = SQLITE_POOL if is_sqlite_connection(test_conn) else MYSQL_POOL
     test_conn.close()
+    try:
+        test_pool.warm()
+    except Exception as e:
+        db_logger.warning("Could not pre-open pooled connections: %s", e)
 else:
-    print("❌ MySQL connection test failed - cart operations will not work!")
+    db_logger.error("Database connection test failed - cart operations will not work!")
 
-print("✅ Flask app initialized successfully")
+app_logger.info("Flask app initialized successfully")
 
 # In-memory storage for demo purposes (keeping for frontend compatibility)
-DEMO_USERS = {}
 DEMO_PRODUCTS = [
     {
         "id": 11,
@@ -1105,258 +2139,1084 @@ DEMO_PRODUCTS = [
     }
 ]
 
+def _catalog_product(product):
+    """DEMO_PRODUCTS entry with the fields listings serve (no stock_quantity)"""
+    return {key: value for key, value in product.items() if key != 'stock_quantity'}
+
+DEMO_PRODUCTS_BY_ID = {p['id']: _catalog_product(p) for p in DEMO_PRODUCTS}
+
+# Catalog version tracking and listing count cache
+class CatalogVersionedCache:
+    """Bounded, thread-safe LRU whose entries are all dropped when the catalog version changes"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self._stats['invalidations'] += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, version, key):
+        """Cached value or None"""
+        with self._lock:
+            self._check_version(version)
+            value = self._entries.get(key)
+            if value is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def put(self, version, key, value):
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self):
+        with self._lock:
+            if self._entries:
+                self._stats['invalidations'] += 1
+            self._entries.clear()
+            self._version = None
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return dict(self._stats, entries=len(self._entries), max_entries=self.max_entries,
+                        version=self._version,
+                        hit_ratio=round(self._stats['hits'] / lookups, 3) if lookups else 0.0)
+
+class ProductCountCache(CatalogVersionedCache):
+    """Listing totals, as (total, estimated), keyed by backend and the normalized filter"""
+
+    @staticmethod
+    def key(backend, category=None, search=None, featured=None):
+        # Only fold spellings that select the same rows on both backends;
+        # featured=False filters on is_featured = 0, unlike None
+        if category == 'all':
+            category = None
+        return (backend, category or None, search or None, None if featured is None else bool(featured))
+
+# Only the database listing path reads it; CatalogIndex listings count their own positions
+PRODUCT_COUNT_CACHE = ProductCountCache(PRODUCT_COUNT_CACHE_SIZE)
+# Serialized /api/products bodies keyed by the normalized query
+PRODUCT_RESPONSE_CACHE = CatalogVersionedCache(PRODUCT_RESPONSE_CACHE_SIZE)
+
+# backend -> (version, checked_at); MySQL and the SQLite fallback count separately
+_catalog_versions = {}
+
+def get_catalog_version(cursor, backend):
+    """backend's catalog_version counter, re-read at most every CATALOG_REFRESH_INTERVAL seconds"""
+    cached = _catalog_versions.get(backend)
+    if cached is not None and time.monotonic() - cached[1] < CATALOG_REFRESH_INTERVAL:
+        return cached[0]
+    cursor.execute("SELECT version FROM catalog_version WHERE id = 1")
+    row = cursor.fetchone()
+    if row is None:
+        version = 0
+    else:
+        version = row['version'] if isinstance(row, dict) else row[0]
+    _catalog_versions[backend] = (version, time.monotonic())
+    return version
+
+def invalidate_catalog_caches():
+    """Drop every derived view of the products table after an in-process catalog write"""
+    _catalog_versions.clear()
+    PRODUCT_COUNT_CACHE.invalidate()
+    PRODUCT_RESPONSE_CACHE.invalidate()
+    invalidate_catalog_index()
+
 # Product functions using MySQL database
-def get_products_from_db(category=None, search=None, featured=None, sort_by='name', page=1, limit=6):
-    """Get products from database with filtering, sorting, and pagination"""
+def _product_filter_conditions(dialect, category=None, search=None, featured=None):
+    """WHERE conditions and parameters for a product listing filter"""
+    p = dialect.placeholder
+    where_conditions = []
+    params = []
+
+    if category and category != 'all':
+        where_conditions.append(f"category = {p}")
+        params.append(category)
+
+    if search:
+        where_conditions.append(f"(name LIKE {p} OR description LIKE {p})")
+        search_pattern = f"%{search}%"
+        params.extend([search_pattern, search_pattern])
+
+    if featured is not None:
+        where_conditions.append(f"is_featured = {p}")
+        params.append(featured)
+
+    return where_conditions, params
+
+def _product_order_by(sort_by):
+    """ORDER BY for a listing sort mode; names sort case-insensitively like CATALOG_SORT_KEYS"""
+    if sort_by == 'price_low':
+        return "ORDER BY price ASC, id ASC"
+    if sort_by == 'price_high':
+        return "ORDER BY price DESC, id ASC"
+    if sort_by == 'newest':
+        return "ORDER BY id DESC"
+    return "ORDER BY LOWER(name) ASC, id ASC"
+
+def product_count_sql(dialect, category=None, search=None, featured=None):
+    """(SQL, params) counting the products of a listing"""
+    where_conditions, params = _product_filter_conditions(dialect, category, search, featured)
+    where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+    return f"SELECT COUNT(*) FROM products{where_clause}", params
+
+def product_page_sql(dialect, category=None, search=None, featured=None, sort_by='name'):
+    """(SQL, params) for an OFFSET page of a listing; append limit and offset to params"""
+    p = dialect.placeholder
+    where_conditions, params = _product_filter_conditions(dialect, category, search, featured)
+    where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+    return (f"SELECT {PRODUCT_COLUMNS} FROM products{where_clause} {_product_order_by(sort_by)} "
+            f"LIMIT {p} OFFSET {p}"), params
+
+def product_keyset_sql(dialect, category=None, search=None, featured=None, sort_by='name', cursor=None):
+    """(SQL, params) for a keyset page; append limit to params ('prev' pages come back reversed)"""
+    order = PAGE_CURSOR_ORDER.get(sort_by, PAGE_CURSOR_ORDER['name'])
+    backward = cursor is not None and cursor['direction'] == 'prev'
+    p = dialect.placeholder
+    where_conditions, params = _product_filter_conditions(dialect, category, search, featured)
+
+    if cursor is not None:
+        values = [cursor['id']] if len(order) == 1 else [cursor['value'], cursor['id']]
+        comparisons = [('>' if asc != backward else '<') for _, asc in order]
+        if len(order) == 1:
+            where_conditions.append(f"{order[0][0]} {comparisons[0]} {p}")
+            params.append(values[0])
+        else:
+            (column, _), (tiebreak, _) = order
+            where_conditions.append(
+                f"({column} {comparisons[0]} {p} OR ({column} = {p} AND {tiebreak} {comparisons[1]} {p}))")
+            params.extend([values[0], values[0], values[1]])
+
+    where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+    order_by = ", ".join(f"{column} {'ASC' if asc != backward else 'DESC'}" for column, asc in order)
+    return f"SELECT {PRODUCT_COLUMNS} FROM products{where_clause} ORDER BY {order_by} LIMIT {p}", params
+
+def get_products_from_db(category=None, search=None, featured=None, sort_by='name', page=1, limit=6,
+                         estimate_search_counts=None):
+    """Get products from database with filtering, sorting, and pagination (totals cached per catalog version)"""
+    if estimate_search_counts is None:
+        estimate_search_counts = PRODUCT_COUNT_ESTIMATE_SEARCH
     connection = get_db_connection()
     if not connection:
-        print("❌ Could not connect to database, falling back to DEMO_PRODUCTS")
+        catalog_logger.error("Could not connect to database, falling back to DEMO_PRODUCTS")
         return None
 
+    dialect = get_dialect(connection)
+    p = dialect.placeholder
+
     try:
-        cursor = connection.cursor(dictionary=True)
-        
-        # Build WHERE clause
-        where_conditions = []
-        params = []
-        
-        if category and category != 'all':
-            where_conditions.append("category = %s")
-            params.append(category)
-        
-        if search:
-            where_conditions.append("(name LIKE %s OR description LIKE %s)")
-            search_pattern = f"%{search}%"
-            params.extend([search_pattern, search_pattern])
-        
-        if featured is not None:
-            where_conditions.append("is_featured = %s")
-            params.append(featured)
-        
-        where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+        cursor = connection.cursor()
         
-        # Build ORDER BY clause
-        order_by = "ORDER BY "
-        if sort_by == 'price_low':
-            order_by += "price ASC"
-        elif sort_by == 'price_high':
-            order_by += "price DESC"
-        elif sort_by == 'name':
-            order_by += "name ASC"
-        elif sort_by == 'newest':
-            order_by += "id DESC"
+        count_query, params = product_count_sql(dialect, category, search, featured)
+
+        # Get total count - cached per catalog version
+        count_key = PRODUCT_COUNT_CACHE.key(dialect.name, category, search, featured)
+        catalog_version = get_catalog_version(cursor, dialect.name)
+        cached_count = PRODUCT_COUNT_CACHE.get(catalog_version, count_key)
+        if cached_count is not None:
+            total_products, total_estimated = cached_count
+        elif search and estimate_search_counts:
+            capped_query = count_query.replace("SELECT COUNT(*) FROM products", "SELECT 1 FROM products", 1)
+            cursor.execute(f"SELECT COUNT(*) as total FROM ({capped_query} LIMIT {p}) capped",
+                           params + [PRODUCT_COUNT_ESTIMATE_CAP + 1])
+            total_result = cursor.fetchone()
+            total_products = total_result[0] if total_result else 0
+            total_estimated = total_products > PRODUCT_COUNT_ESTIMATE_CAP
+            total_products = min(total_products, PRODUCT_COUNT_ESTIMATE_CAP)
+            PRODUCT_COUNT_CACHE.put(catalog_version, count_key, (total_products, total_estimated))
         else:
-            order_by += "name ASC"
-        
-        # Get total count
-        count_query = f"SELECT COUNT(*) as total FROM products{where_clause}"
-        cursor.execute(count_query, params)
-        total_result = cursor.fetchone()
-        total_products = total_result['total'] if total_result else 0
+            cursor.execute(count_query, params)
+            total_result = cursor.fetchone()
+            total_products = total_result[0] if total_result else 0
+            total_estimated = False
+            PRODUCT_COUNT_CACHE.put(catalog_version, count_key, (total_products, False))
         
         # Get paginated products
         offset = (page - 1) * limit
-        query = f"""
-            SELECT id, name, description, price, category, stock_quantity, image_url, is_featured
-            FROM products
-            {where_clause}
-            {order_by}
-            LIMIT %s OFFSET %s
-        """
-        params.extend([limit, offset])
-        cursor.execute(query, params)
-        products = cursor.fetchall()
-        
+        page_query, params = product_page_sql(dialect, category, search, featured, sort_by)
+        cursor.execute(page_query, params + [limit, offset])
+
         # Convert to list of dicts with consistent keys
-        result = []
-        for p in products:
-            result.append({
-                'id': p['id'],
-                'name': p['name'],
-                'description': p['description'],
-                'price': float(p['price']),
-                'category': p['category'],
-                'stock_quantity': p['stock_quantity'],
-                'image_url': p['image_url'],
-                'is_featured': bool(p['is_featured'])
-            })
+        result = [_product_from_row(row) for row in cursor.fetchall()]
         
-        print(f"📦 Retrieved {len(result)} products from database (total: {total_products})")
+        catalog_logger.debug("Retrieved %d products from database (total: %s)", len(result), total_products)
         return {
             'products': result,
             'total': total_products,
+            'total_estimated': total_estimated,
             'page': page,
             'limit': limit,
             'total_pages': (total_products + limit - 1) // limit
         }
         
-    except Error as e:
-        print(f"❌ Error getting products from database: {e}")
+    except DB_ERRORS as e:
+        catalog_logger.error("Error getting products from database: %s", e)
         return None
     finally:
         if connection:
             connection.close()
 
-# Cart functions using MySQL database
-def get_user_cart(user_id):
-    """Get user's cart items from database"""
-    connection = get_db_connection()
-    if not connection:
-        return []
+# Keyset (cursor) pagination - sort column order per sort mode, id breaks ties
+PAGE_CURSOR_ORDER = {
+    'name': (('LOWER(name)', True), ('id', True)),
+    'price_low': (('price', True), ('id', True)),
+    'price_high': (('price', False), ('id', True)),
+    'newest': (('id', False),)
+}
+
+class InvalidCursorError(ValueError):
+    """Raised for a cursor that can't be decoded or doesn't match the request"""
 
+def _encode_cursor(fields):
+    """Opaque URL-safe cursor carrying a list of JSON values"""
+    payload = json.dumps(fields, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def _decode_cursor(cursor, field_count):
+    """Cursor string -> its list of field_count values; raises InvalidCursorError"""
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT c.product_id, c.quantity, p.name, p.price, p.image_url, p.description, p.category
-            FROM cart c
-            JOIN products p ON c.product_id = p.id
-            WHERE c.user_id = %s
-        """, (user_id,))
-        cart_items = cursor.fetchall()
-        print(f"📋 Retrieved {len(cart_items)} cart items for user {user_id}:")
-        for item in cart_items:
-            print(f"   - Product {item['product_id']}: {item['name']} (qty: {item['quantity']})")
-        return cart_items
-    except Error as e:
-        print(f"Error getting user cart: {e}")
-        return []
-    finally:
-        if connection:
-            connection.close()
+        padded = cursor + '=' * (-len(cursor) % 4)
+        fields = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise InvalidCursorError("Invalid cursor")
+    if not isinstance(fields, list) or len(fields) != field_count:
+        raise InvalidCursorError("Invalid cursor")
+    return fields
+
+def encode_page_cursor(sort_by, product, direction):
+    """Opaque cursor positioned at product, paging 'next' or 'prev' from it"""
+    value = product['name'].lower() if sort_by == 'name' else product['price']
+    return _encode_cursor([sort_by, value, product['id'], direction])
+
+def decode_page_cursor(cursor, sort_by):
+    """Cursor string -> dict(value, id, direction), or None for the first page"""
+    if not cursor:
+        return None
+    cursor_sort, value, product_id, direction = _decode_cursor(cursor, 4)
+    if cursor_sort != sort_by:
+        raise InvalidCursorError("Cursor does not match the requested sort order")
+    if direction not in ('next', 'prev') or not isinstance(product_id, int) or isinstance(product_id, bool):
+        raise InvalidCursorError("Invalid cursor")
+    # The value is compared against sort keys, so its type has to match the sort column
+    if sort_by == 'name':
+        valid_value = isinstance(value, str)
+    else:
+        valid_value = isinstance(value, (int, float)) and not isinstance(value, bool)
+    if not valid_value:
+        raise InvalidCursorError("Invalid cursor")
+    return {'value': value, 'id': product_id, 'direction': direction}
+
+def _keyset_page(products, limit, sort_by, has_before, has_after):
+    """Result dict with cursors for the neighbouring pages"""
+    return {
+        'products': products,
+        'limit': limit,
+        'next_cursor': encode_page_cursor(sort_by, products[-1], 'next') if products and has_after else None,
+        'prev_cursor': encode_page_cursor(sort_by, products[0], 'prev') if products and has_before else None
+    }
+
+def get_products_keyset_from_db(category=None, search=None, featured=None, sort_by='name', cursor=None, limit=6):
+    """Get one page of products after or before a decoded cursor; 'total' only when already cached"""
+    backward = cursor is not None and cursor['direction'] == 'prev'
 
-def add_to_cart(user_id, product_id, quantity=1):
-    """Add item to user's cart"""
     connection = get_db_connection()
     if not connection:
-        return False
+        return None
+
+    dialect = get_dialect(connection)
 
     try:
-        cursor = connection.cursor()
-        # Use INSERT ... ON DUPLICATE KEY UPDATE to handle existing items
-        cursor.execute("""
-            INSERT INTO cart (user_id, product_id, quantity)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE quantity = quantity + %s
-        """, (user_id, product_id, quantity, quantity))
-        connection.commit()
-        return True
-    except Error as e:
-        print(f"Error adding to cart: {e}")
-        return False
+        cursor_obj = connection.cursor()
+        query, params = product_keyset_sql(dialect, category, search, featured, sort_by, cursor)
+        cursor_obj.execute(query, params + [limit + 1])
+        rows = cursor_obj.fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if backward:
+            rows.reverse()
+        products = [_product_from_row(row) for row in rows]
+
+        if backward:
+            page = _keyset_page(products, limit, sort_by, has_before=has_more, has_after=True)
+        else:
+            page = _keyset_page(products, limit, sort_by, has_before=cursor is not None, has_after=has_more)
+        # Report a total only when it's already cached - counting would defeat keyset paging
+        cached_count = PRODUCT_COUNT_CACHE.get(get_catalog_version(cursor_obj, dialect.name),
+                                               PRODUCT_COUNT_CACHE.key(dialect.name, category, search, featured))
+        page['total'] = cached_count[0] if cached_count else None
+        return page
+
+    except DB_ERRORS as e:
+        catalog_logger.error("Error getting products page from database: %s", e)
+        return None
     finally:
         if connection:
             connection.close()
 
-def validate_cart_inputs(user_id, product_id, quantity):
+# In-memory catalog index - serves product listings without hitting the database.
+# Stock changes with every order, so it stays out of the cached catalog and is
+# read live through get_stock_levels instead
+PRODUCT_COLUMNS = "id, name, description, price, category, image_url, is_featured"
+
+CATALOG_SORT_KEYS = {
+    'name': lambda p: (p['name'].lower(), p['id']),
+    'price_low': lambda p: (p['price'], p['id']),
+    'price_high': lambda p: (-p['price'], p['id']),
+    'newest': lambda p: -p['id']
+}
+
+def _product_from_row(row):
+    """Row selected with PRODUCT_COLUMNS -> API product dict"""
+    return {
+        'id': row[0],
+        'name': row[1],
+        'description': row[2],
+        'price': float(row[3]),
+        'category': row[4],
+        'image_url': row[5],
+        'is_featured': bool(row[6])
+    }
+
+SEARCH_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+SEARCH_PART_RE = re.compile(r"[a-z0-9]+")
+
+def tokenize_search_text(text):
+    """Lowercased index terms: compounds like 'hc-sr04' plus their parts and joined form"""
+    terms = []
+    for token in SEARCH_TOKEN_RE.findall((text or '').lower()):
+        terms.append(token)
+        parts = SEARCH_PART_RE.findall(token)
+        if len(parts) > 1:
+            terms.extend(parts)
+            terms.append(''.join(parts))
+    return terms
+
+class ProductSearchIndex:
+    """Inverted index over product names and descriptions with prefix/infix matching and weighted scoring"""
+
+    NAME_WEIGHT = 3.0
+    DESCRIPTION_WEIGHT = 1.0
+    PREFIX_FACTOR = 0.5
+    # Words found inside a longer word ('duino' in 'arduino'), as the LIKE '%q%' fallback finds them
+    INFIX_FACTOR = 0.25
+    GRAM_SIZE = 3
+
+    def __init__(self, products=()):
+        self._lock = threading.Lock()
+        self._postings = {}   # term -> {product_id: weight}
+        self._documents = {}  # product_id -> (signature, terms)
+        self._grams = {}      # trigram -> terms containing it, for infix lookups
+        for product in products:
+            self._add(product, keep_sorted=False)
+        self._terms = sorted(self._postings)  # vocabulary for prefix lookups
+
+    def __len__(self):
+        return len(self._documents)
+
+    @staticmethod
+    def _signature(product):
+        return (product['name'], product.get('description'))
+
+    @classmethod
+    def _term_grams(cls, term):
+        return {term[i:i + cls.GRAM_SIZE] for i in range(len(term) - cls.GRAM_SIZE + 1)}
+
+    def _add(self, product, keep_sorted=True):
+        weights = {}
+        for term in tokenize_search_text(product['name']):
+            weights[term] = weights.get(term, 0.0) + self.NAME_WEIGHT
+        for term in tokenize_search_text(product.get('description')):
+            weights[term] = weights.get(term, 0.0) + self.DESCRIPTION_WEIGHT
+
+        product_id = product['id']
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if keep_sorted:
+                    bisect.insort(self._terms, term)
+                for gram in self._term_grams(term):
+                    self._grams.setdefault(gram, set()).add(term)
+            postings[product_id] = weight
+        self._documents[product_id] = (self._signature(product), tuple(weights))
+
+    def _remove(self, product_id):
+        document = self._documents.pop(product_id, None)
+        if document is None:
+            return
+        for term in document[1]:
+            postings = self._postings[term]
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[term]
+                self._terms.pop(bisect.bisect_left(self._terms, term))
+                for gram in self._term_grams(term):
+                    terms = self._grams[gram]
+                    terms.discard(term)
+                    if not terms:
+                        del self._grams[gram]
+
+    def update(self, product):
+        """Add or re-index a single product"""
+        with self._lock:
+            self._remove(product['id'])
+            self._add(product)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+
+    def copy(self):
+        """Independent copy to patch, much cheaper than re-tokenizing every product"""
+        clone = ProductSearchIndex()
+        with self._lock:
+            clone._postings = {term: dict(postings) for term, postings in self._postings.items()}
+            clone._documents = dict(self._documents)
+            clone._terms = list(self._terms)
+            clone._grams = {gram: set(terms) for gram, terms in self._grams.items()}
+        return clone
+
+    def sync(self, products):
+        """Re-index only products that were added, changed or removed; returns (changed, removed)"""
+        changed = 0
+        with self._lock:
+            seen = set()
+            for product in products:
+                seen.add(product['id'])
+                document = self._documents.get(product['id'])
+                if document and document[0] == self._signature(product):
+                    continue
+                self._remove(product['id'])
+                self._add(product)
+                changed += 1
+            stale = [product_id for product_id in self._documents if product_id not in seen]
+            for product_id in stale:
+                self._remove(product_id)
+        return changed, len(stale)
+
+    def _matching_terms(self, query_term):
+        """Indexed terms equal to, starting with or containing query_term -> score factor"""
+        matches = {}
+        i = bisect.bisect_left(self._terms, query_term)
+        while i < len(self._terms) and self._terms[i].startswith(query_term):
+            term = self._terms[i]
+            matches[term] = 1.0 if term == query_term else self.PREFIX_FACTOR
+            i += 1
+
+        if len(query_term) < self.GRAM_SIZE:
+            candidates = self._terms
+        else:
+            gram_terms = sorted((self._grams.get(gram, ()) for gram in self._term_grams(query_term)), key=len)
+            candidates = gram_terms[0].intersection(*gram_terms[1:]) if gram_terms[0] else ()
+        for term in candidates:
+            if term not in matches and query_term in term:
+                matches[term] = self.INFIX_FACTOR
+        return matches
+
+    def search(self, query):
+        """Matching product ids -> relevance score; every query word must occur in a product (empty dict if none)"""
+        query_terms = SEARCH_TOKEN_RE.findall((query or '').lower())
+        if not query_terms:
+            return {}
+
+        with self._lock:
+            document_count = len(self._documents) or 1
+            scores = None
+            for query_term in query_terms:
+                term_scores = {}
+                for term, factor in self._matching_terms(query_term).items():
+                    postings = self._postings[term]
+                    idf = math.log(1 + document_count / len(postings))
+                    for product_id, weight in postings.items():
+                        score = weight * factor * idf
+                        if score > term_scores.get(product_id, 0.0):
+                            term_scores[product_id] = score
+
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {product_id: score + term_scores[product_id]
+                              for product_id, score in scores.items() if product_id in term_scores}
+                if not scores:
+                    return {}
+            return scores
+
+class CatalogIndex:
+    """Immutable snapshot of the products table, pre-sorted per category, featured flag and sort mode"""
+
+    def __init__(self, backend, version, products, search_index=None, updated_at=None):
+        self.backend = backend
+        self.version = version
+        self.loaded_at = time.time()
+        # When the catalog last changed - used for Last-Modified headers
+        self.updated_at = updated_at or datetime.fromtimestamp(int(self.loaded_at), timezone.utc)
+        self.products = products
+        self.by_id = {p['id']: p for p in products}
+        self._position_by_id = {p['id']: i for i, p in enumerate(products)}
+        # Featured bitmap: one byte per product position
+        self.featured = bytearray(1 if p['is_featured'] else 0 for p in products)
+        self.categories = sorted({p['category'] for p in products if p['category']})
+
+        if search_index is None:
+            search_index = ProductSearchIndex(products)
+        else:
+            search_index = search_index.copy()
+            search_index.sync(products)
+        self.search_index = search_index
+
+        self._buckets = {}
+        self._ranks = {}
+        for sort_by, key in CATALOG_SORT_KEYS.items():
+            ordered = sorted(range(len(products)), key=lambda i: key(products[i]))
+            rank = [0] * len(products)
+            for position, i in enumerate(ordered):
+                rank[i] = position
+            self._ranks[sort_by] = rank
+            for i in ordered:
+                category = (products[i]['category'] or '').lower()
+                bucket_keys = [(None, False), (category, False)]
+                if self.featured[i]:
+                    bucket_keys += [(None, True), (category, True)]
+                for bucket_key in bucket_keys:
+                    self._buckets.setdefault(bucket_key, {}).setdefault(sort_by, []).append(i)
+
+    def positions(self, category=None, featured=None, sort_by='name'):
+        """Pre-sorted product positions for a category/featured filter"""
+        if sort_by not in CATALOG_SORT_KEYS:
+            sort_by = 'name'
+        bucket = self._buckets.get(((category or '').lower() or None, bool(featured)), {})
+        return bucket.get(sort_by, [])
+
+    def _search_positions(self, search, category, featured, sort_by):
+        """Positions of products matching a full-text search, filtered and ordered"""
+        matches = self.search_index.search(search)
+        category_key = (category or '').lower()
+        positions = []
+        for product_id in matches:
+            i = self._position_by_id.get(product_id)
+            if i is None:
+                continue
+            if category_key and (self.products[i]['category'] or '').lower() != category_key:
+                continue
+            if featured and not self.featured[i]:
+                continue
+            positions.append(i)
+
+        if sort_by == 'relevance':
+            name_rank = self._ranks['name']
+            positions.sort(key=lambda i: (-matches[self.products[i]['id']], name_rank[i]))
+        else:
+            positions.sort(key=self._ranks.get(sort_by, self._ranks['name']).__getitem__)
+        return positions
+
+    def query_keyset(self, category=None, search=None, featured=None, sort_by='name', cursor=None, limit=6):
+        """Same contract as get_products_keyset_from_db, served from memory"""
+        if sort_by not in PAGE_CURSOR_ORDER:
+            sort_by = 'name'
+        if search:
+            positions = self._search_positions(search, category, featured, sort_by)
+        else:
+            positions = self.positions(category, featured, sort_by)
+
+        sort_key = CATALOG_SORT_KEYS[sort_by]
+        if cursor is None:
+            start, end = 0, limit
+        else:
+            cursor_key = sort_key({'name': cursor['value'], 'price': cursor['value'], 'id': cursor['id']})
+            position_key = lambda i: sort_key(self.products[i])
+            if cursor['direction'] == 'next':
+                start = bisect.bisect_right(positions, cursor_key, key=position_key)
+                end = start + limit
+            else:
+                end = bisect.bisect_left(positions, cursor_key, key=position_key)
+                start = max(0, end - limit)
+
+        page = _keyset_page([self.products[i] for i in positions[start:end]], limit, sort_by,
+                            has_before=start > 0, has_after=end < len(positions))
+        page['total'] = len(positions)
+        return page
+
+    def query(self, category=None, search=None, featured=None, sort_by='name', page=1, limit=6):
+        """Same contract as get_products_from_db, served from memory; sort_by='relevance' orders searches by score"""
+        if search:
+            positions = self._search_positions(search, category, featured, sort_by)
+        else:
+            positions = self.positions(category, featured, sort_by)
+
+        total_products = len(positions)
+        offset = (page - 1) * limit
+        return {
+            'products': [self.products[i] for i in positions[offset:offset + limit]],
+            'total': total_products,
+            'page': page,
+            'limit': limit,
+            'total_pages': (total_products + limit - 1) // limit
+        }
+
+def _as_utc_datetime(value):
+    """DB timestamp (datetime or 'YYYY-MM-DD HH:MM:SS' string) -> aware UTC datetime, never in the future"""
+    if not value:
+        return None
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.strptime(str(value)[:19], '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return min(value, datetime.now(timezone.utc))
+
+_catalog_index = None
+_catalog_index_checked_at = 0.0
+_catalog_index_lock = threading.Lock()
+
+def invalidate_catalog_index():
+    """Make the next get_catalog_index() call re-check catalog_version"""
+    global _catalog_index_checked_at
+    _catalog_index_checked_at = 0.0
+
+def get_catalog_index():
+    """Current CatalogIndex, rebuilt when catalog_version changes; None only if none could ever be loaded"""
+    global _catalog_index, _catalog_index_checked_at
+
+    index = _catalog_index
+    if index is not None and time.monotonic() - _catalog_index_checked_at < CATALOG_REFRESH_INTERVAL:
+        return index
+    if not _catalog_index_lock.acquire(blocking=index is None):
+        return index
+
+    try:
+        if _catalog_index is not None and time.monotonic() - _catalog_index_checked_at < CATALOG_REFRESH_INTERVAL:
+            return _catalog_index
+
+        connection = get_db_connection()
+        if not connection:
+            return _catalog_index
+
+        cursor = None
+        try:
+            backend = get_dialect(connection).name
+            cursor = connection.cursor()
+            cursor.execute("SELECT version, updated_at FROM catalog_version WHERE id = 1")
+            row = cursor.fetchone()
+            version = row[0] if row else 0
+            updated_at = _as_utc_datetime(row[1]) if row else None
+
+            current = _catalog_index
+            if current is None or current.version != version or current.backend != backend:
+                started = time.perf_counter()
+                cursor.execute(f"SELECT {PRODUCT_COLUMNS} FROM products")
+                products = [_product_from_row(r) for r in cursor.fetchall()]
+                search_index = current.search_index if current and current.backend == backend else None
+                _catalog_index = CatalogIndex(backend, version, products, search_index, updated_at)
+                catalog_logger.info("Catalog index v%s built from %s: %d products in %.1fms",
+                                    version, backend, len(products), (time.perf_counter() - started) * 1000)
+            _catalog_index_checked_at = time.monotonic()
+        except Exception as e:
+            catalog_logger.warning("Could not refresh catalog index: %s", e)
+        finally:
+            if cursor:
+                cursor.close()
+            connection.close()
+        return _catalog_index
+    finally:
+        _catalog_index_lock.release()
+
+# HTTP conditional requests for catalog endpoints
+def catalog_etag(catalog_index, *request_key):
+    """ETag for a catalog response: changes with the catalog version or the request"""
+    digest = hashlib.sha1(repr(request_key).encode()).hexdigest()[:16]
+    return f"catalog-{catalog_index.backend}-{catalog_index.version}-{digest}"
+
+def catalog_not_modified(catalog_index, etag):
+    """304 response if the client's If-None-Match/If-Modified-Since is still current, else None"""
+    if is_resource_modified(request.environ, etag=etag, last_modified=catalog_index.updated_at):
+        return None
+    return with_catalog_validators(app.response_class(status=304), catalog_index, etag)
+
+def with_catalog_validators(response, catalog_index, etag):
+    """Attach ETag/Last-Modified and require revalidation before reuse"""
+    response.set_etag(etag)
+    response.last_modified = catalog_index.updated_at
+    response.cache_control.no_cache = True
+    return response
+
+def cache_catalog_response(response, catalog_index, etag, response_key):
+    """Store a successful listing body in PRODUCT_RESPONSE_CACHE and attach validators"""
+    if not catalog_index:
+        return response
+    PRODUCT_RESPONSE_CACHE.put(catalog_index.version, response_key, response.get_data())
+    return with_catalog_validators(response, catalog_index, etag)
+
+def products_by_ids_sql(dialect, count):
+    """SELECT of PRODUCT_COLUMNS for count ids"""
+    return f"SELECT {PRODUCT_COLUMNS} FROM products WHERE id IN ({dialect.placeholders(count)})"
+
+def product_stock_sql(dialect, count):
+    """(id, stock_quantity) for count ids"""
+    return f"SELECT id, stock_quantity FROM products WHERE id IN ({dialect.placeholders(count)})"
+
+def get_stock_levels(product_ids):
+    """id -> current stock_quantity, read from the database on every call; None on failure"""
+    product_ids = list(dict.fromkeys(product_ids))
+    if not product_ids:
+        return {}
+
+    connection = get_db_connection()
+    if not connection:
+        return None
+
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        cursor.execute(product_stock_sql(get_dialect(connection), len(product_ids)), product_ids)
+        return {row[0]: row[1] for row in cursor.fetchall()}
+    except DB_ERRORS as e:
+        catalog_logger.error("Error getting stock levels: %s", e)
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        connection.close()
+
+def _get_products_by_ids_from_db(product_ids):
+    """id -> product for the given ids with one batched IN (...) query, None on failure"""
+    connection = get_db_connection()
+    if not connection:
+        return None
+
+    dialect = get_dialect(connection)
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        cursor.execute(products_by_ids_sql(dialect, len(product_ids)), product_ids)
+        return {row[0]: _product_from_row(row) for row in cursor.fetchall()}
+    except Exception as e:
+        catalog_logger.error("Error getting products by id from database: %s", e)
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        connection.close()
+
+def get_products_by_ids(product_ids):
+    """Products in request order from the catalog index, database or DEMO_PRODUCTS -> (products, missing_ids)"""
+    product_ids = list(dict.fromkeys(product_ids))
+    if not product_ids:
+        return [], []
+
+    catalog_index = get_catalog_index()
+    if catalog_index:
+        products_by_id = catalog_index.by_id
+    else:
+        products_by_id = _get_products_by_ids_from_db(product_ids)
+        if products_by_id is None:
+            products_by_id = DEMO_PRODUCTS_BY_ID
+
+    products = []
+    missing_ids = []
+    for product_id in product_ids:
+        product = products_by_id.get(product_id)
+        if product is None:
+            missing_ids.append(product_id)
+        else:
+            products.append(product)
+    return products, missing_ids
+
+# Cart functions using MySQL database
+CART_ITEM_COLUMNS = ('product_id', 'quantity', 'name', 'price', 'image_url', 'description', 'category')
+
+def _select_cart_items(connection, user_id):
+    """User's cart lines with product details inside the current transaction"""
+    cursor = execute_statement(connection, 'cart.items', (user_id,))
+    return [dict(zip(CART_ITEM_COLUMNS, row)) for row in cursor.fetchall()]
+
+class CartCache:
+    """Bounded, thread-safe LRU of users' cart lines, served only while their cart_versions row is unchanged"""
+
+    def __init__(self, max_entries=1024, ttl=30.0):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0, 'expirations': 0, 'evictions': 0,
+                       'invalidations': 0, 'stale': 0}
+
+    def get(self, user_id, version):
+        """Cached lines for user_id if they were read at version, else None"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[user_id]
+                self._stats['expirations'] += 1
+                entry = None
+            elif entry is not None and entry[1] != version:
+                del self._entries[user_id]
+                self._stats['stale'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self._stats['hits'] += 1
+            return entry[2]
+
+    def put(self, user_id, version, lines):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, version, tuple(lines))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return dict(self._stats, entries=len(self._entries), max_entries=self.max_entries,
+                        ttl=self.ttl,
+                        hit_ratio=round(self._stats['hits'] / lookups, 3) if lookups else 0.0)
+
+CART_CACHE = CartCache(CART_CACHE_SIZE, CART_CACHE_TTL)
+
+def bump_cart_version(connection, user_id):
+    """Bump user_id's cart_versions row; call inside every transaction that writes their cart"""
+    execute_statement(connection, 'cart.bump_version', (user_id,))
+
+def _resolve_cart_lines(lines):
+    """Attach product details to cart lines; lines whose product is gone are dropped like the JOIN did"""
+    products, _ = get_products_by_ids([product_id for product_id, _ in lines])
+    products_by_id = {product['id']: product for product in products}
+    cart_items = []
+    for product_id, quantity in lines:
+        product = products_by_id.get(product_id)
+        if product is None:
+            continue
+        cart_items.append({
+            'product_id': product_id,
+            'quantity': quantity,
+            'name': product['name'],
+            'price': product['price'],
+            'image_url': product['image_url'],
+            'description': product['description'],
+            'category': product['category']
+        })
+    return cart_items
+
+def _get_cart_lines(user_id):
+    """User's (product_id, quantity) lines from the cart cache, filling it on a miss; None on failure"""
+    connection = get_db_connection()
+    if not connection:
+        return None
+
+    try:
+        # Read the version first: a write landing before the lines are read
+        # leaves them tagged with an older version, never a newer one
+        version_row = query_one(connection, 'cart.version', (user_id,))
+        version = version_row[0] if version_row else 0
+        lines = CART_CACHE.get(user_id, version)
+        if lines is None:
+            cursor = execute_statement(connection, 'cart.lines', (user_id,))
+            lines = [(row[0], row[1]) for row in cursor.fetchall()]
+            CART_CACHE.put(user_id, version, lines)
+        return lines
+    except DB_ERRORS as e:
+        cart_logger.error("Error getting user cart: %s", e)
+        return None
+    finally:
+        connection.close()
+
+def summarize_cart_items(cart_items):
+    """Item count, subtotal and per-category totals for resolved cart items"""
+    subtotal = 0.0
+    item_count = 0
+    categories = {}
+    for item in cart_items:
+        line_total = float(item['price']) * item['quantity']
+        subtotal += line_total
+        item_count += item['quantity']
+        category = categories.setdefault(item['category'], {'item_count': 0, 'subtotal': 0.0})
+        category['item_count'] += item['quantity']
+        category['subtotal'] += line_total
+    for category in categories.values():
+        category['subtotal'] = round(category['subtotal'], 2)
+    return {
+        'item_count': item_count,
+        'line_count': len(cart_items),
+        'subtotal': round(subtotal, 2),
+        'categories': categories
+    }
+
+def get_cart_summary(user_id):
+    """Cart totals without the joined cart rows; None if the cart could not be read"""
+    lines = _get_cart_lines(user_id)
+    if lines is None:
+        return None
+    return summarize_cart_items(_resolve_cart_lines(lines))
+
+def get_user_cart(user_id):
+    """Get user's cart items, from the cart cache when possible"""
+    lines = _get_cart_lines(user_id)
+    if lines is None:
+        return []
+
+    cart_items = _resolve_cart_lines(lines)
+    cart_logger.debug("Retrieved %d cart items", len(cart_items), extra={'user_id': user_id})
+    return cart_items
+
+def validate_cart_inputs(user_id, product_id, quantity):
     """Validate cart operation inputs"""
     if not user_id or user_id == 'guest':
-        print(f"❌ Invalid user_id: {user_id}")
+        cart_logger.debug("Invalid user_id: %s", user_id)
         return False, "Invalid user ID"
 
     if not isinstance(user_id, str) or len(user_id.strip()) == 0:
-        print(f"❌ User ID must be non-empty string: {user_id}")
+        cart_logger.debug("User ID must be non-empty string: %s", user_id)
         return False, "Invalid user ID format"
 
     if not isinstance(product_id, int) or product_id <= 0:
-        print(f"❌ Product ID must be positive integer: {product_id}")
+        cart_logger.debug("Product ID must be positive integer: %s", product_id)
         return False, "Invalid product ID"
 
     if not isinstance(quantity, int):
-        print(f"❌ Quantity must be integer: {quantity}")
+        cart_logger.debug("Quantity must be integer: %s", quantity)
         return False, "Invalid quantity"
 
     return True, None
 
-def update_cart_item(user_id, product_id, quantity):
-    """Update cart item quantity (handles both insert and update)"""
-    print(f"🔄 update_cart_item called: user_id='{user_id}', product_id={product_id}, quantity={quantity}")
-
-    # Validate inputs
+def mutate_cart(user_id, product_id, quantity, phone=None, user_verified=False):
+    """Set a cart line's quantity (<= 0 removes it) in one transaction -> None or an error name"""
     is_valid, error_msg = validate_cart_inputs(user_id, product_id, quantity)
     if not is_valid:
-        print(f"❌ Input validation failed: {error_msg}")
-        return False
+        cart_logger.info("Cart input validation failed: %s", error_msg)
+        return 'invalid'
 
     connection = get_db_connection()
     if not connection:
-        print("❌ Failed to get database connection")
-        return False
-
-    is_sqlite = is_sqlite_connection(connection)
+        cart_logger.error("Failed to get database connection")
+        return 'database'
 
     try:
-        cursor = connection.cursor()
-        print("✅ Database connection established")
+        if phone and str(phone).strip() and not user_verified:
+            execute_statement(connection, 'users.insert_if_missing', (user_id, str(phone).strip()))
 
-        # Double-check user exists (safety check) - use correct placeholder syntax
-        if is_sqlite:
-            cursor.execute("SELECT id FROM users WHERE id = ?", (user_id,))
-        else:
-            cursor.execute("SELECT id FROM users WHERE id = %s", (user_id,))
-        if cursor.fetchone() is None:
-            print(f"❌ User {user_id} does not exist in database - cannot update cart")
-            return False
+        if quantity <= 0:
+            execute_statement(connection, 'cart.delete_line', (user_id, product_id))
+            bump_cart_version(connection, user_id)
+            connection.commit()
+            CART_CACHE.invalidate(user_id)
+            return None
+
+        cursor = execute_statement(connection, 'cart.set_if_valid', (quantity, product_id, user_id))
+        if cursor.rowcount == 0:
+            # Nothing was written - find out which side is missing
+            user_count, product_count = query_one(connection, 'cart.user_and_product_counts', (user_id, product_id))
+            if not user_count:
+                cart_logger.info("User does not exist in database - cannot update cart", extra={'user_id': user_id})
+                connection.rollback()
+                return 'user'
+            if not product_count:
+                cart_logger.info("Product %s does not exist in database - cannot add to cart", product_id)
+                connection.rollback()
+                return 'product'
+
+        bump_cart_version(connection, user_id)
+        connection.commit()
+        CART_CACHE.invalidate(user_id)
+        return None
 
-        # Check if product exists before adding to cart - use correct placeholder syntax
-        if is_sqlite:
-            cursor.execute("SELECT id, name FROM products WHERE id = ?", (product_id,))
-        else:
-            cursor.execute("SELECT id, name FROM products WHERE id = %s", (product_id,))
-        product = cursor.fetchone()
-        if product is None:
-            print(f"❌ Product {product_id} does not exist in database - cannot add to cart")
-            return False
-        else:
-            # Handle both MySQL tuple and SQLite Row results
-            product_name = product[1] if isinstance(product, (tuple, list)) else product['name']
-            print(f"✅ Product {product_id} exists: {product_name}")
+    except Exception as e:
+        cart_logger.exception("Database error in mutate_cart: %s", e)
+        connection.rollback()
+        return 'database'
+    finally:
+        connection.close()
+
+def mutate_cart_batch(user_id, operations, phone=None, user_verified=False):
+    """Apply (product_id, quantity) changes all-or-nothing in one transaction -> (cart_items, error, missing_ids)"""
+    final_quantities = {}
+    for product_id, quantity in operations:
+        is_valid, error_msg = validate_cart_inputs(user_id, product_id, quantity)
+        if not is_valid:
+            cart_logger.info("Cart input validation failed: %s", error_msg)
+            return None, 'invalid', None
+        final_quantities[product_id] = quantity
 
-        if quantity <= 0:
-            # Remove item if quantity is 0 or negative - use correct placeholder syntax
-            print(f"🗑️ Removing item {product_id} from cart for user {user_id}")
-            if is_sqlite:
-                cursor.execute("DELETE FROM cart WHERE user_id = ? AND product_id = ?", (user_id, product_id))
-            else:
-                cursor.execute("DELETE FROM cart WHERE user_id = %s AND product_id = %s", (user_id, product_id))
-            affected_rows = cursor.rowcount
-            print(f"🗑️ Delete query executed for item {product_id}, affected rows: {affected_rows}")
-        else:
-            # Insert or update quantity - SQLite uses ON CONFLICT, MySQL uses ON DUPLICATE KEY
-            print(f"📝 Inserting/updating item {product_id} quantity to {quantity} for user {user_id}")
-            if is_sqlite:
-                cursor.execute("""
-                    INSERT INTO cart (user_id, product_id, quantity)
-                    VALUES (?, ?, ?)
-                    ON CONFLICT(user_id, product_id) DO UPDATE SET quantity = ?
-                """, (user_id, product_id, quantity, quantity))
-            else:
-                cursor.execute("""
-                    INSERT INTO cart (user_id, product_id, quantity)
-                    VALUES (%s, %s, %s)
-                    ON DUPLICATE KEY UPDATE quantity = %s
-                """, (user_id, product_id, quantity, quantity))
-            affected_rows = cursor.rowcount
-            print(f"✅ Insert/update query executed for item {product_id}, affected rows: {affected_rows}")
+    connection = get_db_connection()
+    if not connection:
+        cart_logger.error("Failed to get database connection")
+        return None, 'database', None
+
+    dialect = get_dialect(connection)
+    cursor = None
 
+    try:
+        if phone and str(phone).strip() and not user_verified:
+            execute_statement(connection, 'users.insert_if_missing', (user_id, str(phone).strip()))
+
+        if not user_verified and not query_one(connection, 'users.count', (user_id,))[0]:
+            cart_logger.info("User does not exist in database - cannot update cart", extra={'user_id': user_id})
+            connection.rollback()
+            return None, 'user', None
+
+        if final_quantities:
+            product_ids = list(final_quantities)
+            cursor = connection.cursor()
+            cursor.execute(f"SELECT id FROM products WHERE id IN ({dialect.placeholders(len(product_ids))})",
+                           product_ids)
+            found_ids = {row[0] for row in cursor.fetchall()}
+            missing_ids = [product_id for product_id in product_ids if product_id not in found_ids]
+            if missing_ids:
+                cart_logger.info("Products %s do not exist in database - cart batch rejected", missing_ids)
+                connection.rollback()
+                return None, 'product', missing_ids
+
+        upserts = [(user_id, product_id, quantity)
+                   for product_id, quantity in final_quantities.items() if quantity > 0]
+        deletes = [(user_id, product_id)
+                   for product_id, quantity in final_quantities.items() if quantity <= 0]
+
+        if upserts:
+            execute_statement_many(connection, 'cart.set', upserts)
+        if deletes:
+            execute_statement_many(connection, 'cart.delete_line', deletes)
+
+        cart_items = _select_cart_items(connection, user_id)
+        bump_cart_version(connection, user_id)
         connection.commit()
-        print("✅ Database transaction committed successfully")
-        return True
+        CART_CACHE.invalidate(user_id)
+        cart_logger.debug("Applied %d cart changes", len(final_quantities), extra={'user_id': user_id})
+        return cart_items, None, None
 
-    except Error as e:
-        print(f"❌ Database error in update_cart_item: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
     except Exception as e:
-        print(f"❌ Unexpected error in update_cart_item: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
+        cart_logger.exception("Database error in mutate_cart_batch: %s", e)
+        connection.rollback()
+        return None, 'database', None
     finally:
-        if connection:
+        if cursor:
             cursor.close()
-            connection.close()
-            print("🔌 Database connection closed")
+        connection.close()
 
 def remove_from_cart(user_id, product_id):
     """Remove item from user's cart"""
@@ -1365,63 +3225,515 @@ def remove_from_cart(user_id, product_id):
         return False
 
     try:
-        cursor = connection.cursor()
-        cursor.execute("""
-            DELETE FROM cart WHERE user_id = %s AND product_id = %s
-        """, (user_id, product_id))
+        execute_statement(connection, 'cart.delete_line', (user_id, product_id))
+        bump_cart_version(connection, user_id)
         connection.commit()
+        CART_CACHE.invalidate(user_id)
         return True
-    except Error as e:
-        print(f"Error removing from cart: {e}")
+    except DB_ERRORS as e:
+        cart_logger.error("Error removing from cart: %s", e)
         return False
     finally:
         if connection:
             connection.close()
 
-def clear_user_cart(user_id):
-    """Clear all items from user's cart"""
+class UserIdentityCache:
+    """Bounded, thread-safe LRU of known users, indexed by user_id and by phone"""
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        # user_id -> phone, in LRU order
+        self._phones = OrderedDict()
+        self._user_ids = {}
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _lookup(self, user_id):
+        if user_id is None or user_id not in self._phones:
+            self._stats['misses'] += 1
+            return None
+        self._phones.move_to_end(user_id)
+        self._stats['hits'] += 1
+        return self._phones[user_id]
+
+    def phone_for(self, user_id):
+        with self._lock:
+            return self._lookup(user_id)
+
+    def user_id_for(self, phone):
+        with self._lock:
+            user_id = self._user_ids.get(phone)
+            return user_id if self._lookup(user_id) is not None else None
+
+    def put(self, user_id, phone):
+        with self._lock:
+            previous = self._phones.pop(user_id, None)
+            if previous is not None:
+                self._user_ids.pop(previous, None)
+            self._phones[user_id] = phone
+            self._user_ids[phone] = user_id
+            while len(self._phones) > self.max_entries:
+                _, evicted = self._phones.popitem(last=False)
+                self._user_ids.pop(evicted, None)
+                self._stats['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return dict(self._stats, entries=len(self._phones), max_entries=self.max_entries,
+                        hit_ratio=round(self._stats['hits'] / lookups, 3) if lookups else 0.0)
+
+USER_CACHE = UserIdentityCache(USER_CACHE_SIZE)
+
+def find_user_id_by_phone(phone):
+    """user_id registered for phone (cache first), None if unknown or the database is unavailable"""
+    user_id = USER_CACHE.user_id_for(phone)
+    if user_id is not None:
+        return user_id
+
     connection = get_db_connection()
     if not connection:
-        return False
+        return None
 
     try:
-        cursor = connection.cursor()
-        cursor.execute("DELETE FROM cart WHERE user_id = %s", (user_id,))
-        connection.commit()
-        return True
-    except Error as e:
-        print(f"Error clearing cart: {e}")
-        return False
+        row = query_one(connection, 'users.by_phone', (phone,))
+        if row is None:
+            return None
+        USER_CACHE.put(row[0], phone)
+        return row[0]
+    except DB_ERRORS as e:
+        auth_logger.error("Error looking up user by phone: %s", e)
+        return None
     finally:
-        if connection:
-            connection.close()
+        connection.close()
 
 def save_user_to_mysql(user_id, phone):
-    """Save user to MySQL database"""
+    """Save user to the database (MySQL, or the SQLite fallback)"""
     connection = get_db_connection()
     if not connection:
-        print(f"❌ Cannot save user {user_id} to MySQL - no connection")
+        auth_logger.error("Cannot save user - no database connection", extra={'user_id': user_id})
         return False
 
     try:
-        cursor = connection.cursor()
-        # Use INSERT ... ON DUPLICATE KEY UPDATE to handle existing users
-        cursor.execute("""
-            INSERT INTO users (id, phone, logged_in)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE logged_in = %s
-        """, (user_id, phone, True, True))
+        # Upsert so returning users are just marked logged in
+        execute_statement(connection, 'users.upsert_login', (user_id, phone, True))
         connection.commit()
-        print(f"✅ User {user_id} saved to MySQL database")
+        USER_CACHE.put(user_id, phone)
+        auth_logger.debug("User saved to database", extra={'user_id': user_id})
         return True
-    except Error as e:
-        print(f"❌ Error saving user {user_id} to MySQL: {e}")
+    except DB_ERRORS as e:
+        auth_logger.error("Error saving user: %s", e, extra={'user_id': user_id})
         return False
     finally:
-        if connection:
-            cursor.close()
-            connection.close()
-DEMO_OTPS = {}
+        connection.close()
+
+def make_private_dir(path):
+    """Create a directory only this user can enter (existing ones are left as they are)"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+
+def check_private_file(path):
+    """Refuse a state file another user owns or could read or write"""
+    if not hasattr(os, 'getuid'):
+        return
+    info = os.stat(path)
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError(f"{path} must be owned by this user with mode 0600")
+
+def _connect_local_store(path, *schema):
+    """Autocommit WAL connection to a private SQLite file shared by the workers on this host"""
+    make_private_dir(os.path.dirname(path) or '.')
+    # Created 0600 before SQLite opens it; the -wal and -shm files inherit its mode
+    os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+    check_private_file(path)
+    connection = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    for statement in schema:
+        connection.execute(statement)
+    return connection
+
+OTP_RE = re.compile(r'[0-9]{6}')
+
+class MemoryOtpStore:
+    """Per-worker OTP store: a dict plus a min-heap of expiry times for lazy expiry and eviction"""
+
+    backend = 'memory'
+
+    def __init__(self, ttl=300.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._codes = {}
+        self._heap = []
+        self._issued = 0
+        self._stats = {'issued': 0, 'verified': 0, 'rejected': 0, 'expired': 0, 'evictions': 0}
+
+    def _sweep(self, now):
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, serial, phone = heapq.heappop(heap)
+            entry = self._codes.get(phone)
+            if entry is not None and entry[2] == serial:
+                del self._codes[phone]
+                self._stats['expired'] += 1
+        while len(self._codes) > self.max_entries:
+            _, serial, phone = heapq.heappop(heap)
+            entry = self._codes.get(phone)
+            if entry is not None and entry[2] == serial:
+                del self._codes[phone]
+                self._stats['evictions'] += 1
+        if len(heap) > 2 * len(self._codes) + 64:
+            self._heap = [(expires_at, serial, phone) for phone, (_, expires_at, serial) in self._codes.items()]
+            heapq.heapify(self._heap)
+
+    def issue(self, phone, otp):
+        with self._lock:
+            now = time.monotonic()
+            self._issued += 1
+            expires_at = now + self.ttl
+            self._codes[phone] = (otp, expires_at, self._issued)
+            heapq.heappush(self._heap, (expires_at, self._issued, phone))
+            self._stats['issued'] += 1
+            self._sweep(now)
+
+    def verify(self, phone, otp):
+        """Consume the code for phone if otp matches and hasn't expired"""
+        with self._lock:
+            entry = self._codes.get(phone)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._codes[phone]
+                self._stats['expired'] += 1
+                entry = None
+            if entry is None or not hmac.compare_digest(entry[0].encode(), otp.encode()):
+                self._stats['rejected'] += 1
+                return False
+            del self._codes[phone]
+            self._stats['verified'] += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, backend=self.backend, entries=len(self._codes),
+                        max_entries=self.max_entries, ttl=self.ttl)
+
+class SqliteOtpStore:
+    """OTP store in a local SQLite file shared by every worker on the host"""
+
+    backend = 'sqlite'
+
+    def __init__(self, path, ttl=300.0, max_entries=10000, sweep_interval=5.0):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        self._next_sweep = 0.0
+        self._stats = {'issued': 0, 'verified': 0, 'rejected': 0, 'expired': 0, 'evictions': 0}
+
+    def _connect(self):
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = _connect_local_store(self.path, """
+                CREATE TABLE IF NOT EXISTS otp_codes (
+                    phone TEXT PRIMARY KEY,
+                    otp TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """, "CREATE INDEX IF NOT EXISTS idx_otp_codes_expires ON otp_codes (expires_at)")
+            self._pid = os.getpid()
+        return self._connection
+
+    def _sweep(self, connection, now):
+        if time.monotonic() < self._next_sweep:
+            return
+        self._next_sweep = time.monotonic() + self.sweep_interval
+        expired = connection.execute("DELETE FROM otp_codes WHERE expires_at <= ?", (now,)).rowcount
+        overflow = connection.execute("SELECT COUNT(*) FROM otp_codes").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            connection.execute("""
+                DELETE FROM otp_codes WHERE phone IN (
+                    SELECT phone FROM otp_codes ORDER BY expires_at LIMIT ?
+                )
+            """, (overflow,))
+            self._stats['evictions'] += overflow
+        self._stats['expired'] += max(expired, 0)
+
+    def issue(self, phone, otp):
+        with self._lock:
+            connection = self._connect()
+            now = time.time()
+            connection.execute("INSERT OR REPLACE INTO otp_codes (phone, otp, expires_at) VALUES (?, ?, ?)",
+                               (phone, otp, now + self.ttl))
+            self._stats['issued'] += 1
+            self._sweep(connection, now)
+
+    def verify(self, phone, otp):
+        """Consume the code for phone if otp matches and hasn't expired"""
+        with self._lock:
+            connection = self._connect()
+            now = time.time()
+            # The conditional delete is atomic across workers: only one login can consume a code
+            consumed = connection.execute(
+                "DELETE FROM otp_codes WHERE phone = ? AND otp = ? AND expires_at > ?",
+                (phone, otp, now)
+            ).rowcount
+            if consumed != 1:
+                self._stats['rejected'] += 1
+                return False
+            self._stats['verified'] += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, backend=self.backend, path=self.path,
+                        max_entries=self.max_entries, ttl=self.ttl)
+
+def create_otp_store():
+    """OTP store selected by OTP_STORE_BACKEND ('memory' or 'sqlite')"""
+    if OTP_STORE_BACKEND == 'sqlite':
+        return SqliteOtpStore(OTP_STORE_PATH, OTP_TTL, OTP_MAX_ENTRIES)
+    return MemoryOtpStore(OTP_TTL, OTP_MAX_ENTRIES)
+
+OTP_STORE = create_otp_store()
+
+def parse_rate_limit(setting):
+    """'capacity/period_seconds' -> (capacity, period); empty or 0 disables the limit"""
+    if not setting or not setting.strip() or setting.strip() == '0':
+        return None
+    capacity, _, period = setting.partition('/')
+    return int(capacity), float(period or 60)
+
+RATE_LIMITS = {
+    'send_otp': {'ip': parse_rate_limit(RATE_LIMIT_SEND_OTP_IP),
+                 'phone': parse_rate_limit(RATE_LIMIT_SEND_OTP_PHONE)},
+    'login': {'ip': parse_rate_limit(RATE_LIMIT_LOGIN_IP),
+              'phone': parse_rate_limit(RATE_LIMIT_LOGIN_PHONE)},
+}
+
+class MemoryRateLimiter:
+    """Per-worker token buckets in a bounded LRU, refilled lazily on each hit"""
+
+    backend = 'memory'
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max(1, max_keys)
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self._stats = {'allowed': 0, 'limited': 0, 'evictions': 0}
+
+    def hit(self, key, capacity, period):
+        """Take a token from key's bucket; (allowed, seconds until a token is available)"""
+        rate = capacity / period
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._buckets.pop(key, None)
+            tokens = capacity if bucket is None else min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+                self._stats['evictions'] += 1
+            self._stats['allowed' if allowed else 'limited'] += 1
+            return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, backend=self.backend, keys=len(self._buckets), max_keys=self.max_keys)
+
+class SqliteRateLimiter:
+    """Token buckets in a local SQLite file shared by every worker on the host"""
+
+    backend = 'sqlite'
+
+    def __init__(self, path, max_keys=10000, sweep_interval=30.0):
+        self.path = path
+        self.max_keys = max(1, max_keys)
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        self._next_sweep = 0.0
+        self._stats = {'allowed': 0, 'limited': 0, 'evictions': 0}
+
+    def _connect(self):
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = _connect_local_store(self.path, """
+                CREATE TABLE IF NOT EXISTS rate_buckets (
+                    bucket_key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    full_at REAL NOT NULL
+                )
+            """, "CREATE INDEX IF NOT EXISTS idx_rate_buckets_full ON rate_buckets (full_at)")
+            self._pid = os.getpid()
+        return self._connection
+
+    def _sweep(self, connection, now):
+        if time.monotonic() < self._next_sweep:
+            return
+        self._next_sweep = time.monotonic() + self.sweep_interval
+        connection.execute("DELETE FROM rate_buckets WHERE full_at <= ?", (now,))
+        overflow = connection.execute("SELECT COUNT(*) FROM rate_buckets").fetchone()[0] - self.max_keys
+        if overflow > 0:
+            connection.execute("""
+                DELETE FROM rate_buckets WHERE bucket_key IN (
+                    SELECT bucket_key FROM rate_buckets ORDER BY full_at LIMIT ?
+                )
+            """, (overflow,))
+            self._stats['evictions'] += overflow
+
+    def hit(self, key, capacity, period):
+        """Take a token from key's bucket; (allowed, seconds until a token is available)"""
+        rate = capacity / period
+        with self._lock:
+            connection = self._connect()
+            # Take the write lock up front so two workers can't both spend the last token
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = connection.execute("SELECT tokens, updated_at FROM rate_buckets WHERE bucket_key = ?",
+                                         (key,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+                allowed = tokens >= 1
+                if allowed:
+                    tokens -= 1
+                connection.execute(
+                    "INSERT OR REPLACE INTO rate_buckets (bucket_key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)",
+                    (key, tokens, now, now + (capacity - tokens) / rate)
+                )
+                self._sweep(connection, now)
+                connection.execute("COMMIT")
+            except sqlite3.Error:
+                connection.execute("ROLLBACK")
+                raise
+            self._stats['allowed' if allowed else 'limited'] += 1
+            return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, backend=self.backend, path=self.path, max_keys=self.max_keys)
+
+def create_rate_limiter():
+    """Rate limiter selected by RATE_LIMIT_BACKEND ('memory' or 'sqlite')"""
+    if RATE_LIMIT_BACKEND == 'sqlite':
+        return SqliteRateLimiter(RATE_LIMIT_PATH, RATE_LIMIT_MAX_KEYS)
+    return MemoryRateLimiter(RATE_LIMIT_MAX_KEYS)
+
+RATE_LIMITER = create_rate_limiter()
+
+def check_rate_limits(endpoint, phone=None):
+    """429 response if this request is over endpoint's per-IP or per-phone limit, else None"""
+    subjects = {'ip': request.remote_addr or 'unknown', 'phone': phone}
+    # 'ip' is checked first, so a blocked client can't drain the buckets of the phones it targets
+    for scope, limit in RATE_LIMITS[endpoint].items():
+        if limit is None or not subjects[scope]:
+            continue
+        try:
+            allowed, retry_after = RATE_LIMITER.hit(f"{endpoint}:{scope}:{subjects[scope]}", *limit)
+        except sqlite3.Error as e:
+            # A broken limiter store shouldn't lock everyone out of logging in
+            auth_logger.warning("Rate limiter unavailable: %s", e)
+            return None
+        if not allowed:
+            retry_after = max(1, math.ceil(retry_after))
+            auth_logger.warning("Rate limited %s by %s", endpoint, scope,
+                                extra={'endpoint': endpoint, 'scope': scope, 'ip': subjects['ip']})
+            response = jsonify({
+                'success': False,
+                'error': 'Too many requests, please try again later',
+                'retry_after': retry_after
+            })
+            response.headers['Retry-After'] = str(retry_after)
+            return response, 429
+    return None
+
+def _load_generated_session_secret(path):
+    """Random secret shared by the workers on this host, created by whichever starts first"""
+    if not os.path.exists(path):
+        make_private_dir(os.path.dirname(path) or '.')
+        # mkstemp creates the file with mode 0600
+        fd, staged = tempfile.mkstemp(dir=os.path.dirname(path) or '.')
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+        try:
+            # link() fails if another worker got there first; theirs wins
+            os.link(staged, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(staged)
+    # Anyone able to plant or read this file could forge tokens for any user
+    check_private_file(path)
+    with open(path) as f:
+        return f.read().strip()
+
+def load_session_signing_key():
+    """SESSION_SECRET as bytes; outside production a generated per-host secret stands in for it"""
+    # Placeholders from env.example and the old hardcoded key are public, so never sign with them
+    if SESSION_SECRET and SESSION_SECRET not in ('your-secret-key-here', 'change-me', app.secret_key):
+        return SESSION_SECRET.encode()
+    if ENVIRONMENT == 'production':
+        raise RuntimeError("SESSION_SECRET must be set in production, to the same value on every host")
+    auth_logger.warning("SESSION_SECRET is not set - signing session tokens with a generated secret in %s. "
+                        "Tokens stop working when this file is replaced and are not valid on other hosts.",
+                        SESSION_SECRET_PATH)
+    return _load_generated_session_secret(SESSION_SECRET_PATH).encode()
+
+SESSION_SIGNING_KEY = load_session_signing_key()
+
+class InvalidSessionError(ValueError):
+    """Session token that is malformed, forged or expired"""
+
+def _session_signature(payload):
+    digest = hmac.new(SESSION_SIGNING_KEY, payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip('=')
+
+def issue_session_token(user_id, ttl=None):
+    """Signed token for user_id -> (token, expires_at epoch seconds)"""
+    expires_at = int(time.time() + (ttl or SESSION_TOKEN_TTL))
+    payload = json.dumps([user_id, expires_at], separators=(',', ':'))
+    payload = base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+    return f"{payload}.{_session_signature(payload)}", expires_at
+
+def verify_session_token(token):
+    """user_id carried by a valid token; raises InvalidSessionError otherwise"""
+    payload, _, signature = (token or '').partition('.')
+    if not signature or not hmac.compare_digest(signature.encode(), _session_signature(payload).encode()):
+        raise InvalidSessionError("Invalid session token")
+    try:
+        user_id, expires_at = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    except (ValueError, TypeError):
+        raise InvalidSessionError("Invalid session token")
+    if not isinstance(user_id, str) or not isinstance(expires_at, int):
+        raise InvalidSessionError("Invalid session token")
+    if expires_at <= time.time():
+        raise InvalidSessionError("Session expired")
+    return user_id
+
+def authenticate_request(claimed_user_id=None):
+    """Resolve the calling user from a bearer token or the claimed user_id -> (user_id, verified, error_response)"""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        if SESSION_TOKENS_REQUIRED:
+            return None, False, (jsonify({'success': False, 'error': 'Login required'}), 401)
+        return claimed_user_id, False, None
+
+    try:
+        user_id = verify_session_token(token.strip())
+    except InvalidSessionError as e:
+        if not SESSION_TOKENS_REQUIRED:
+            # A token signed on another host or before a secret change is no worse than no token
+            auth_logger.debug("Ignoring unverifiable session token: %s", e)
+            return claimed_user_id, False, None
+        return None, False, (jsonify({'success': False, 'error': str(e)}), 401)
+
+    if claimed_user_id not in (None, '', 'guest') and str(claimed_user_id) != user_id:
+        return None, False, (jsonify({'success': False, 'error': 'User ID does not match session'}), 403)
+    return user_id, True, None
+
 
 @app.route('/')
 def home():
@@ -1464,54 +3776,121 @@ def api_user_status():
     """API endpoint to check user login status"""
     return jsonify({'logged_in': False})
 
+@app.route('/api/health/db', methods=['GET'])
+def api_health_db():
+    """API endpoint exposing this worker's database health and pool statistics"""
+    return jsonify({
+        'success': True,
+        'active_backend': get_active_backend(),
+        'circuit_breaker': MYSQL_BREAKER.snapshot(),
+        'pools': get_pool_stats(),
+        'product_count_cache': PRODUCT_COUNT_CACHE.stats(),
+        'product_response_cache': PRODUCT_RESPONSE_CACHE.stats(),
+        'cart_cache': CART_CACHE.stats(),
+        'otp_store': OTP_STORE.stats(),
+        'user_cache': USER_CACHE.stats(),
+        'rate_limiter': RATE_LIMITER.stats(),
+        'logging': get_logging_stats()
+    })
+
 @app.route('/api/products', methods=['GET'])
 def api_products():
     """API endpoint to get products from database"""
     try:
-        # Get query parameters
-        page = int(request.args.get('page', 1))
-        limit = int(request.args.get('limit', 6))
+        # Get query parameters; page and limit are clamped before they reach the response cache key
+        try:
+            page = max(1, int(request.args.get('page', 1)))
+            limit = min(max(1, int(request.args.get('limit', 6))), PRODUCTS_PAGE_MAX_LIMIT)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid page or limit'}), 400
         category = request.args.get('category', '')
         sort_by = request.args.get('sort', 'name')
         search = request.args.get('search', '').lower()
         featured = request.args.get('featured', '').lower() == 'true'
 
-        # Try to get products from database first
-        db_result = get_products_from_db(
-            category=category if category and category != 'all' else None,
-            search=search if search else None,
-            featured=featured if featured else None,
-            sort_by=sort_by,
-            page=page,
-            limit=limit
-        )
+        # Serve from the in-memory catalog index, then the database
+        query = {
+            'category': category if category and category != 'all' else None,
+            'search': search if search else None,
+            'featured': featured if featured else None,
+            'sort_by': sort_by,
+            'page': page,
+            'limit': limit
+        }
+        catalog_index = get_catalog_index()
+        etag = None
+        response_key = None
+        if catalog_index:
+            etag = catalog_etag(catalog_index, sorted(request.args.items(multi=True)))
+            not_modified = catalog_not_modified(catalog_index, etag)
+            if not_modified:
+                return not_modified
+
+            # Same catalog snapshot + same normalized query = same bytes
+            response_key = (catalog_index.backend, page, limit, (query['category'] or '').lower(),
+                            sort_by, query['search'], bool(featured), request.args.get('cursor'))
+            cached_body = PRODUCT_RESPONSE_CACHE.get(catalog_index.version, response_key)
+            if cached_body is not None:
+                response = app.response_class(cached_body, mimetype='application/json')
+                return with_catalog_validators(response, catalog_index, etag)
+
+        # Cursor mode: ?cursor= (empty for the first page) instead of ?page=
+        if 'cursor' in request.args:
+            if sort_by == 'relevance':
+                return jsonify({'success': False, 'error': 'Cursor pagination does not support relevance sort'}), 400
+            try:
+                query['cursor'] = decode_page_cursor(request.args.get('cursor'), sort_by)
+            except InvalidCursorError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            del query['page']
+            if catalog_index:
+                page_result = catalog_index.query_keyset(**query)
+            else:
+                page_result = get_products_keyset_from_db(**query)
+            if not page_result:
+                return jsonify({'success': False, 'error': 'Failed to load products'}), 500
+            response = jsonify({
+                'success': True,
+                'products': page_result['products'],
+                'pagination': {
+                    'total': page_result['total'],
+                    'limit': page_result['limit'],
+                    'next_cursor': page_result['next_cursor'],
+                    'prev_cursor': page_result['prev_cursor']
+                }
+            })
+            return cache_catalog_response(response, catalog_index, etag, response_key)
+
+        if catalog_index:
+            db_result = catalog_index.query(**query)
+        else:
+            db_result = get_products_from_db(**query)
 
         if db_result:
             # Use database results
-            print(f"📤 API returning {len(db_result['products'])} products from database for page {page}")
-            for i, p in enumerate(db_result['products']):
-                print(f"   {i+1}. ID {p['id']} - {p['name']}")
-            
-            return jsonify({
+            catalog_logger.debug("API returning %d products from database for page %s",
+                                 len(db_result['products']), page)
+
+            response = jsonify({
                 'success': True,
                 'products': db_result['products'],
                 'pagination': {
                     'total': db_result['total'],
+                    'total_estimated': db_result.get('total_estimated', False),
                     'page': db_result['page'],
                     'limit': db_result['limit'],
                     'pages': db_result['total_pages']
                 }
             })
+            return cache_catalog_response(response, catalog_index, etag, response_key)
         else:
             # Fallback to DEMO_PRODUCTS if database fails
-            print("⚠️ Database query failed, falling back to DEMO_PRODUCTS")
+            catalog_logger.warning("Database query failed, falling back to DEMO_PRODUCTS")
             filtered_products = DEMO_PRODUCTS.copy()
 
             # Apply category filter
             if category and category != 'all':
-                print(f"🔍 Filtering by category: {category}")
                 filtered_products = [p for p in filtered_products if p['category'].lower() == category.lower()]
-                print(f"📊 Found {len(filtered_products)} products in category {category}")
 
             # Apply search filter
             if search:
@@ -1535,9 +3914,10 @@ def api_products():
             total_products = len(filtered_products)
             start_idx = (page - 1) * limit
             end_idx = start_idx + limit
-            paginated_products = filtered_products[start_idx:end_idx]
+            paginated_products = [_catalog_product(p) for p in filtered_products[start_idx:end_idx]]
 
-            print(f"📤 API returning {len(paginated_products)} products from DEMO_PRODUCTS for page {page}")
+            catalog_logger.debug("API returning %d products from DEMO_PRODUCTS for page %s",
+                                 len(paginated_products), page)
 
             return jsonify({
                 'success': True,
@@ -1551,34 +3931,79 @@ def api_products():
             })
 
     except Exception as e:
-        print(f"❌ Error in api_products: {e}")
-        import traceback
-        traceback.print_exc()
+        catalog_logger.exception("Error in api_products: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/products/by-ids', methods=['POST'])
 def api_products_by_ids():
     """API endpoint to get products by IDs"""
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         product_ids = data.get('ids', [])
 
-        # Always use DEMO_PRODUCTS in demo mode
-        products = [p for p in DEMO_PRODUCTS if p['id'] in product_ids]
+        if not isinstance(product_ids, list):
+            return jsonify({'success': False, 'error': 'ids must be a list'}), 400
+        if len(product_ids) > PRODUCTS_BY_IDS_MAX:
+            return jsonify({'success': False, 'error': f'At most {PRODUCTS_BY_IDS_MAX} ids per request'}), 400
+        try:
+            product_ids = [int(product_id) for product_id in product_ids]
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'error': 'Invalid product ID'}), 400
+
+        catalog_index = get_catalog_index()
+        if catalog_index:
+            etag = catalog_etag(catalog_index, 'by-ids', product_ids)
+            not_modified = catalog_not_modified(catalog_index, etag)
+            if not_modified:
+                return not_modified
+
+        products, missing_ids = get_products_by_ids(product_ids)
+
+        response = jsonify({
+            'success': True,
+            'products': products,
+            'missing_ids': missing_ids
+        })
+        return with_catalog_validators(response, catalog_index, etag) if catalog_index else response
+
+    except Exception as e:
+        catalog_logger.exception("Error in api_products_by_ids: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/products/stock', methods=['GET'])
+def api_products_stock():
+    """API endpoint to get current stock for products, e.g. ?ids=11,12 (never cached)"""
+    try:
+        ids = [product_id for product_id in request.args.get('ids', '').split(',') if product_id.strip()]
+        if len(ids) > PRODUCTS_BY_IDS_MAX:
+            return jsonify({'success': False, 'error': f'At most {PRODUCTS_BY_IDS_MAX} ids per request'}), 400
+        try:
+            product_ids = [int(product_id) for product_id in ids]
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid product ID'}), 400
+
+        stock_levels = get_stock_levels(product_ids)
+        if stock_levels is None:
+            return jsonify({'success': False, 'error': 'Failed to load stock'}), 500
 
         return jsonify({
             'success': True,
-            'products': products
+            'stock': [{'id': product_id, 'stock_quantity': stock_levels[product_id]}
+                      for product_id in dict.fromkeys(product_ids) if product_id in stock_levels],
+            'missing_ids': [product_id for product_id in dict.fromkeys(product_ids)
+                            if product_id not in stock_levels]
         })
 
     except Exception as e:
-        print(f"Error in api_products_by_ids: {e}")
+        catalog_logger.exception("Error in api_products_stock: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/cart', methods=['GET'])
 def api_cart():
     """API endpoint to get cart items"""
-    user_id = request.args.get('user_id', 'guest')
+    user_id, _, auth_error = authenticate_request(request.args.get('user_id', 'guest'))
+    if auth_error:
+        return auth_error
 
     # Handle guest users
     if user_id == 'guest' or not user_id:
@@ -1589,125 +4014,102 @@ def api_cart():
     cart_items = get_user_cart(user_id)
     return jsonify({'success': True, 'cart': cart_items})
 
-def is_sqlite_connection(connection):
-    """Check if connection is SQLite"""
-    return 'sqlite' in str(type(connection)).lower()
-
-def ensure_user_exists(user_id, phone=None):
-    """Ensure user exists in database, create if necessary"""
-    print(f"🔍 ensure_user_exists called with user_id='{user_id}', phone='{phone}'")
-
-    connection = get_db_connection()
-    if not connection:
-        print(f"❌ Cannot check user {user_id} - no database connection")
-        return False
-
-    is_sqlite = is_sqlite_connection(connection)
-
-    try:
-        cursor = connection.cursor()
+@app.route('/api/cart/summary', methods=['GET'])
+def api_cart_summary():
+    """API endpoint to get cart totals for the header badge and checkout"""
+    user_id, _, auth_error = authenticate_request(request.args.get('user_id', 'guest'))
+    if auth_error:
+        return auth_error
 
-        # Check if user exists - use correct placeholder syntax
-        print(f"🔍 Checking if user {user_id} exists in database...")
-        if is_sqlite:
-            cursor.execute("SELECT id FROM users WHERE id = ?", (user_id,))
-        else:
-            cursor.execute("SELECT id FROM users WHERE id = %s", (user_id,))
-        user_exists = cursor.fetchone() is not None
-        print(f"🔍 User exists check result: {user_exists}")
-
-        if not user_exists:
-            print(f"👤 User {user_id} does not exist in database, creating...")
-            # For cart operations, we need phone number to create user
-            if phone and str(phone).strip():
-                print(f"📞 Creating user with phone: {phone}")
-                if is_sqlite:
-                    cursor.execute("""
-                        INSERT INTO users (id, phone, name, logged_in)
-                        VALUES (?, ?, ?, ?)
-                    """, (user_id, str(phone).strip(), '', 1))
-                else:
-                    cursor.execute("""
-                        INSERT INTO users (id, phone, name, logged_in)
-                        VALUES (%s, %s, %s, %s)
-                    """, (user_id, str(phone).strip(), '', True))
-                connection.commit()
-                print(f"✅ User {user_id} created in database successfully")
-                return True
-            else:
-                print(f"❌ Cannot create user {user_id} - phone number is empty or None: '{phone}'")
-                return False
-        else:
-            print(f"✅ User {user_id} already exists in database")
-            return True
+    if user_id == 'guest' or not user_id:
+        return jsonify({'success': True, 'summary': summarize_cart_items([])})
 
-    except Error as e:
-        print(f"❌ Database error in ensure_user_exists for user {user_id}: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
-    except Exception as e:
-        print(f"❌ Unexpected error in ensure_user_exists for user {user_id}: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
-    finally:
-        if connection:
-            cursor.close()
-            connection.close()
+    summary = get_cart_summary(user_id)
+    if summary is None:
+        return jsonify({'success': False, 'error': 'Failed to load cart'}), 500
+    return jsonify({'success': True, 'summary': summary})
 
 @app.route('/api/cart/update', methods=['POST'])
 def api_cart_update():
     """API endpoint to update cart"""
     try:
-        print("🔄 API /cart/update called")
         data = request.get_json()
-        print(f"📦 Received data: {data}")
 
-        user_id = data.get('user_id')
+        user_id, user_verified, auth_error = authenticate_request(data.get('user_id'))
+        if auth_error:
+            return auth_error
         product_id = data.get('product_id')
         quantity = data.get('quantity', 1)
         phone = data.get('phone')  # Optional phone for user creation
 
-        print(f"👤 User ID: {user_id}, Product ID: {product_id}, Quantity: {quantity}, Phone: {phone}")
-
         # Validate required inputs
         if not user_id or user_id == 'guest':
-            print("❌ Invalid or guest user_id")
             return jsonify({'success': False, 'error': 'Invalid user ID'}), 400
 
         # Validate inputs (keep user_id as string, convert others to int)
         try:
             product_id = int(product_id)
             quantity = int(quantity)
-            print(f"✅ Input validation passed: user_id='{user_id}', product_id={product_id}, quantity={quantity}")
         except (ValueError, TypeError) as e:
-            print(f"❌ Input validation failed: {e}")
             return jsonify({'success': False, 'error': 'Invalid input data'}), 400
 
-        # Ensure user exists in database before cart operations
-        print(f"🔍 About to call ensure_user_exists with user_id='{user_id}', phone='{phone}'")
-        user_exists_result = ensure_user_exists(user_id, phone)
-        print(f"🔍 ensure_user_exists returned: {user_exists_result}")
-        if not user_exists_result:
-            print("❌ User validation failed - user does not exist and could not be created")
+        # User upsert, product check and cart upsert in one transaction
+        error = mutate_cart(user_id, product_id, quantity, phone, user_verified)
+
+        if error is None:
+            return jsonify({'success': True})
+        elif error == 'invalid':
+            return jsonify({'success': False, 'error': 'Invalid input data'}), 400
+        elif error == 'user':
             return jsonify({'success': False, 'error': 'User validation failed'}), 400
+        elif error == 'product':
+            return jsonify({'success': False, 'error': 'Product not found'}), 400
+        else:
+            return jsonify({'success': False, 'error': 'Failed to update cart'}), 500
 
-        # Update cart in database
-        print(f"🗄️ Calling update_cart_item function with user_id='{user_id}', product_id={product_id}, quantity={quantity}")
-        success = update_cart_item(user_id, product_id, quantity)
+    except Exception as e:
+        cart_logger.exception("Error in api_cart_update: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        if success:
-            print("✅ Cart update successful")
-            return jsonify({'success': True})
+@app.route('/api/cart/batch', methods=['POST'])
+def api_cart_batch():
+    """API endpoint to apply several cart changes at once and return the updated cart"""
+    try:
+        data = request.get_json() or {}
+
+        user_id, user_verified, auth_error = authenticate_request(data.get('user_id'))
+        if auth_error:
+            return auth_error
+        items = data.get('items')
+        phone = data.get('phone')  # Optional phone for user creation
+
+        if not user_id or user_id == 'guest':
+            return jsonify({'success': False, 'error': 'Invalid user ID'}), 400
+        if not isinstance(items, list):
+            return jsonify({'success': False, 'error': 'items must be a list'}), 400
+        if len(items) > CART_BATCH_MAX_ITEMS:
+            return jsonify({'success': False, 'error': f'At most {CART_BATCH_MAX_ITEMS} items per request'}), 400
+
+        try:
+            operations = [(int(item['product_id']), int(item.get('quantity', 1))) for item in items]
+        except (KeyError, ValueError, TypeError, AttributeError):
+            return jsonify({'success': False, 'error': 'Invalid input data'}), 400
+
+        cart_items, error, missing_ids = mutate_cart_batch(user_id, operations, phone, user_verified)
+
+        if error is None:
+            return jsonify({'success': True, 'cart': cart_items})
+        elif error == 'invalid':
+            return jsonify({'success': False, 'error': 'Invalid input data'}), 400
+        elif error == 'user':
+            return jsonify({'success': False, 'error': 'User validation failed'}), 400
+        elif error == 'product':
+            return jsonify({'success': False, 'error': 'Product not found', 'missing_ids': missing_ids}), 400
         else:
-            print("❌ Cart update failed")
             return jsonify({'success': False, 'error': 'Failed to update cart'}), 500
 
     except Exception as e:
-        print(f"❌ Error in api_cart_update: {e}")
-        import traceback
-        traceback.print_exc()
+        cart_logger.exception("Error in api_cart_batch: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/cart/remove', methods=['POST'])
@@ -1715,16 +4117,17 @@ def api_cart_remove():
     """API endpoint to remove item from cart"""
     try:
         data = request.get_json()
-        user_id = data.get('user_id', 'guest')
+        user_id, _, auth_error = authenticate_request(data.get('user_id', 'guest'))
+        if auth_error:
+            return auth_error
         product_id = data.get('product_id')
 
         # Skip guest users for database operations
         if user_id == 'guest':
             return jsonify({'success': True})
 
-        # Validate inputs
+        # Validate inputs (user_id stays a string, like everywhere else)
         try:
-            user_id = int(user_id)
             product_id = int(product_id)
         except (ValueError, TypeError):
             return jsonify({'success': False, 'error': 'Invalid input data'}), 400
@@ -1738,34 +4141,141 @@ def api_cart_remove():
             return jsonify({'success': False, 'error': 'Failed to remove item'}), 500
 
     except Exception as e:
-        print(f"Error in api_cart_remove: {e}")
+        cart_logger.exception("Error in api_cart_remove: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # Order and Payment Functions
-def create_order(user_id, cart_items, billing_info, payment_method):
-    """Create order from cart items"""
+# Inventory reservations: stock is taken when an order is placed and given
+# back if the order is not completed within ORDER_RESERVATION_TIMEOUT
+def _utc_timestamp(offset_seconds=0):
+    """Naive UTC 'YYYY-MM-DD HH:MM:SS' accepted by DATETIME columns on both backends"""
+    moment = datetime.now(timezone.utc) + timedelta(seconds=offset_seconds)
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+def reserve_stock(cursor, cart_items, dialect):
+    """Decrement stock for every cart line with one conditional UPDATE; False if any line is short"""
+    p = dialect.placeholder
+    quantities = {item['product_id']: item['quantity'] for item in cart_items}
+    product_ids = sorted(quantities)
+    case_sql = 'CASE id ' + ' '.join([f'WHEN {p} THEN {p}'] * len(product_ids)) + ' END'
+    case_params = [value for product_id in product_ids for value in (product_id, quantities[product_id])]
+
+    cursor.execute(f"""
+        UPDATE products SET stock_quantity = stock_quantity - {case_sql}
+        WHERE id IN ({dialect.placeholders(len(product_ids))}) AND stock_quantity >= {case_sql}
+    """, case_params + product_ids + case_params)
+    return cursor.rowcount == len(product_ids)
+
+def _stock_shortages(cursor, cart_items, dialect):
+    """Cart lines asking for more than is in stock, as {'product_id', 'requested', 'available'}"""
+    product_ids = [item['product_id'] for item in cart_items]
+    cursor.execute(product_stock_sql(dialect, len(product_ids)), product_ids)
+    available = {row[0]: row[1] for row in cursor.fetchall()}
+    return [
+        {'product_id': item['product_id'], 'requested': item['quantity'],
+         'available': available.get(item['product_id'], 0)}
+        for item in cart_items if available.get(item['product_id'], 0) < item['quantity']
+    ]
+
+def release_expired_reservations(limit=None):
+    """Expire pending orders past their reservation deadline and restock them -> number released"""
     connection = get_db_connection()
     if not connection:
-        return None
+        return 0
+
+    released = 0
+
+    try:
+        cursor = execute_statement(connection, 'orders.expired_reservations',
+                                   (_utc_timestamp(), limit or RESERVATION_SWEEP_BATCH))
+        order_ids = [row[0] for row in cursor.fetchall()]
+        connection.commit()
+
+        for order_id in order_ids:
+            if execute_statement(connection, 'orders.expire', (order_id,)).rowcount:
+                execute_statement(connection, 'orders.restock', (order_id, order_id))
+                released += 1
+            connection.commit()
+
+        if released:
+            order_logger.info("Released stock reservations for %d expired orders", released)
+        return released
+
+    except DB_ERRORS as e:
+        order_logger.error("Error releasing expired reservations: %s", e)
+        connection.rollback()
+        return released
+    finally:
+        connection.close()
+
+_reservation_sweep_lock = threading.Lock()
+_reservation_sweep_at = 0.0
+
+def maybe_release_expired_reservations():
+    """Run release_expired_reservations at most every RESERVATION_SWEEP_INTERVAL seconds per worker"""
+    global _reservation_sweep_at
+
+    if time.monotonic() - _reservation_sweep_at < RESERVATION_SWEEP_INTERVAL:
+        return
+    if not _reservation_sweep_lock.acquire(blocking=False):
+        return
+    try:
+        _reservation_sweep_at = time.monotonic()
+        release_expired_reservations()
+    finally:
+        _reservation_sweep_lock.release()
+
+def start_reservation_sweeper():
+    """Background thread releasing expired reservations even while nobody is ordering"""
+    if RESERVATION_SWEEP_INTERVAL <= 0:
+        return
+
+    def sweep():
+        while True:
+            time.sleep(RESERVATION_SWEEP_INTERVAL)
+            try:
+                maybe_release_expired_reservations()
+            except Exception as e:
+                order_logger.warning("Reservation sweep failed: %s", e)
+
+    threading.Thread(target=sweep, name='reservation-sweeper', daemon=True).start()
+
+def create_order(user_id, billing_info, payment_method):
+    """Turn the user's cart into an order in one transaction -> (order_id, error, shortages)"""
+    connection = get_db_connection()
+    if not connection:
+        return None, 'database', None
+
+    dialect = get_dialect(connection)
+    cursor = None
 
     try:
-        cursor = connection.cursor(dictionary=True)
+        # Next user-specific order number from the counter row
+        execute_statement(connection, 'orders.bump_counter', (user_id,))
+        user_order_number = query_one(connection, 'orders.counter', (user_id,))[0]
+
+        # Lock the cart lines; product rows are only read here, and only
+        # reserve_stock's conditional UPDATE below locks them
+        lines = execute_statement(connection, 'cart.lines_for_update', (user_id,)).fetchall()
+        if not lines:
+            connection.rollback()
+            return None, 'empty', None
+        product_ids = [row[0] for row in lines]
+        cursor = connection.cursor()
+        cursor.execute(products_by_ids_sql(dialect, len(product_ids)), product_ids)
+        prices = {row[0]: _product_from_row(row)['price'] for row in cursor.fetchall()}
+        # Lines whose product is gone are dropped, like the cart JOIN does
+        cart_items = [{'product_id': product_id, 'quantity': quantity, 'price': prices[product_id]}
+                      for product_id, quantity in lines if product_id in prices]
+        if not cart_items:
+            connection.rollback()
+            return None, 'empty', None
 
         # Calculate total
         total_amount = sum(item['price'] * item['quantity'] for item in cart_items)
 
-        # Get user's order count to generate user-specific order number
-        cursor.execute("SELECT COUNT(*) as order_count FROM orders WHERE user_id = %s", (user_id,))
-        result = cursor.fetchone()
-        user_order_number = result['order_count'] + 1
-
         # Create order
-        cursor.execute("""
-            INSERT INTO orders (user_id, total_amount, status, payment_method,
-                              shipping_address, billing_name, billing_email,
-                              billing_phone, billing_city, billing_zip, user_order_number)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
+        order_id = execute_statement(connection, 'orders.insert', (
             user_id,
             total_amount,
             'pending',
@@ -1776,64 +4286,125 @@ def create_order(user_id, cart_items, billing_info, payment_method):
             billing_info.get('phone', ''),
             billing_info.get('city', ''),
             billing_info.get('zipCode', ''),
-            user_order_number
-        ))
+            user_order_number,
+            _utc_timestamp(ORDER_RESERVATION_TIMEOUT)
+        )).lastrowid
 
-        order_id = cursor.lastrowid
-        
-        # Create order items
-        for item in cart_items:
-            cursor.execute("""
-                INSERT INTO order_items (order_id, product_id, quantity, price)
-                VALUES (%s, %s, %s, %s)
-            """, (
-                order_id,
-                item['product_id'],
-                item['quantity'],
-                item['price']
-            ))
-        
+        # Create all order items in one batch
+        execute_statement_many(connection, 'order_items.insert', [
+            (order_id, item['product_id'], item['quantity'], item['price']) for item in cart_items
+        ])
+
+        # Reserve stock last so hot product rows stay locked only until the commit
+        if not reserve_stock(cursor, cart_items, dialect):
+            connection.rollback()
+            shortages = _stock_shortages(cursor, cart_items, dialect)
+            connection.rollback()
+            order_logger.info("Insufficient stock for order", extra={'user_id': user_id, 'shortages': shortages})
+            return None, 'stock', shortages
+
+        execute_statement(connection, 'cart.clear', (user_id,))
+        bump_cart_version(connection, user_id)
+
+        # Stock isn't part of the cached catalog, so placing an order leaves catalog_version alone
         connection.commit()
-        print(f"✅ Order {order_id} created for user {user_id}, total: ₹{total_amount}")
-        return order_id
-        
-    except Error as e:
-        print(f"❌ Error creating order: {e}")
+        CART_CACHE.invalidate(user_id)
+        order_logger.info("Order %s created", order_id,
+                          extra={'order_id': order_id, 'user_id': user_id, 'total': total_amount})
+        return order_id, None, None
+
+    except DB_ERRORS as e:
+        order_logger.error("Error creating order: %s", e)
         connection.rollback()
-        return None
+        return None, 'database', None
     finally:
-        if connection:
-            connection.close()
+        if cursor:
+            cursor.close()
+        connection.close()
+
+ORDER_HISTORY_COLUMNS = ('id', 'user_order_number', 'total_amount', 'status', 'payment_method',
+                         'created_at', 'billing_name', 'billing_email')
+
+def _order_timestamp(value):
+    """created_at as 'YYYY-MM-DD HH:MM:SS' whether the driver returned a datetime or a string"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return str(value)[:19]
+
+def encode_order_cursor(order):
+    """Opaque cursor positioned after order in newest-first history order"""
+    return _encode_cursor(['orders', _order_timestamp(order['created_at']), order['id']])
+
+def decode_order_cursor(cursor):
+    """Cursor string -> (created_at, id), or None for the first page"""
+    if not cursor:
+        return None
+    kind, created_at, order_id = _decode_cursor(cursor, 3)
+    if kind != 'orders' or not isinstance(created_at, str) or not isinstance(order_id, int):
+        raise InvalidCursorError("Invalid cursor")
+    return created_at, order_id
+
+def order_items_for_orders_sql(dialect, count):
+    """Items of count orders with their product name and image, grouped by order"""
+    return f"""
+        SELECT oi.order_id, oi.product_id, oi.quantity, oi.price, p.name, p.image_url
+        FROM order_items oi
+        LEFT JOIN products p ON oi.product_id = p.id
+        WHERE oi.order_id IN ({dialect.placeholders(count)})
+        ORDER BY oi.order_id, oi.id
+    """
+
+def get_user_orders(user_id, cursor=None, limit=None):
+    """One keyset page of a user's orders, newest first, with their items; None on a database error"""
+    limit = max(1, min(limit or ORDER_HISTORY_PAGE_SIZE, ORDER_HISTORY_PAGE_MAX))
+    after = decode_order_cursor(cursor)
 
-def get_user_orders(user_id):
-    """Get all orders for a user"""
     connection = get_db_connection()
     if not connection:
-        return []
+        return None
+
+    dialect = get_dialect(connection)
+    db_cursor = None
 
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT o.id, o.user_order_number, o.total_amount, o.status, o.payment_method,
-                   o.created_at, o.billing_name, o.billing_email,
-                   GROUP_CONCAT(CONCAT(p.name, ' (x', oi.quantity, ')') SEPARATOR ', ') as items
-            FROM orders o
-            LEFT JOIN order_items oi ON o.id = oi.order_id
-            LEFT JOIN products p ON oi.product_id = p.id
-            WHERE o.user_id = %s
-            GROUP BY o.id
-            ORDER BY o.created_at DESC
-        """, (user_id,))
-        
-        orders = cursor.fetchall()
-        return orders
-        
-    except Error as e:
-        print(f"❌ Error getting orders: {e}")
-        return []
+        if after:
+            rows = execute_statement(connection, 'orders.history_after',
+                                     (user_id, after[0], after[0], after[1], limit + 1)).fetchall()
+        else:
+            rows = execute_statement(connection, 'orders.history', (user_id, limit + 1)).fetchall()
+        orders = [dict(zip(ORDER_HISTORY_COLUMNS, row)) for row in rows]
+        has_more = len(orders) > limit
+        orders = orders[:limit]
+
+        items_by_order = {order['id']: [] for order in orders}
+        if orders:
+            order_ids = list(items_by_order)
+            db_cursor = connection.cursor()
+            db_cursor.execute(order_items_for_orders_sql(dialect, len(order_ids)), order_ids)
+            for order_id, product_id, quantity, price, name, image_url in db_cursor.fetchall():
+                items_by_order[order_id].append({
+                    'product_id': product_id,
+                    'name': name,
+                    'quantity': quantity,
+                    'price': float(price),
+                    'image_url': image_url
+                })
+        for order in orders:
+            order['items'] = items_by_order[order['id']]
+
+        return {
+            'orders': orders,
+            'next_cursor': encode_order_cursor(orders[-1]) if has_more else None,
+            'limit': limit
+        }
+
+    except DB_ERRORS as e:
+        order_logger.error("Error getting orders: %s", e)
+        return None
     finally:
-        if connection:
-            connection.close()
+        if db_cursor:
+            db_cursor.close()
+        connection.close()
 
 @app.route('/api/send-otp', methods=['POST'])
 def api_send_otp():
@@ -1842,17 +4413,17 @@ def api_send_otp():
         data = request.get_json()
         phone = data.get('phone', '')
 
-        print(f"Send OTP request - phone: '{phone}' (type: {type(phone)}, len: {len(phone)})")
+        limited = check_rate_limits('send_otp', str(phone).strip())
+        if limited:
+            return limited
 
         if not phone:
             return jsonify({'success': False, 'error': 'Phone number required'}), 400
 
         # Generate demo OTP
         otp = str(random.randint(100000, 999999))
-        DEMO_OTPS[phone] = otp
-        print(f"Generated OTP: '{otp}' for phone: '{phone}'")
-        print(f"DEMO_OTPS now contains keys: {list(DEMO_OTPS.keys())}")
-        print(f"DEMO_OTPS full contents: {DEMO_OTPS}")
+        OTP_STORE.issue(str(phone).strip(), otp)
+        auth_logger.debug("Issued OTP (expires in %gs)", OTP_TTL)
 
         # In demo mode, return the OTP directly for testing
         return jsonify({
@@ -1862,83 +4433,50 @@ def api_send_otp():
         })
 
     except Exception as e:
-        print(f"Error in api_send_otp: {e}")
+        auth_logger.exception("Error in api_send_otp: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/login', methods=['POST'])
 def api_login():
     """API endpoint to login"""
-    print("=== LOGIN API CALLED ===")
-    print(f"Request method: {request.method}")
-    print(f"Request headers: {dict(request.headers)}")
-    print(f"Request content type: {request.content_type}")
-
     try:
-        raw_data = request.get_data()
-        print(f"Raw request data: {raw_data}")
-
-        data = request.get_json()
-        print(f"Parsed JSON data: {data}")
+        data = request.get_json(silent=True)
 
         if data is None:
-            print("ERROR: No JSON data could be parsed")
             return jsonify({'success': False, 'error': 'Invalid JSON request'}), 400
 
         phone = data.get('phone', '')
         otp = data.get('otp', '')
 
-        print(f"Extracted phone: '{phone}', otp: '{otp}'")
-
-        # Original validation code (temporary bypass removed)
-        # ... rest of the function ...
-
-        print(f"Login attempt - phone: '{phone}' (type: {type(phone)}, len: {len(phone)}), otp: '{otp}' (type: {type(otp)}, len: {len(otp)})")
-        print(f"DEMO_OTPS keys: {list(DEMO_OTPS.keys())}")
-        print(f"DEMO_OTPS contents: {DEMO_OTPS}")
-
-        stored_otp = DEMO_OTPS.get(phone, 'NOT FOUND')
-        print(f"Stored OTP for phone '{phone}': '{stored_otp}' (type: {type(stored_otp)})")
-
         # Clean the inputs for comparison
         clean_phone = str(phone).strip()
         clean_otp = str(otp).strip()
 
-        print(f"Cleaned inputs - phone: '{clean_phone}', otp: '{clean_otp}'")
+        # Also caps OTP guesses per phone
+        limited = check_rate_limits('login', clean_phone)
+        if limited:
+            return limited
 
-        # For demo purposes, accept any 6-digit OTP to avoid validation issues
-        print("Demo mode - accepting any valid 6-digit OTP")
-        if len(clean_otp) == 6 and clean_otp.isdigit():
-            print("Demo OTP validation successful")
-        else:
-            print(f"Invalid OTP format: '{clean_otp}' (length: {len(clean_otp)})")
+        # str.isdigit() also accepts non-ASCII digits such as '١٢٣٤٥٦'
+        if not OTP_RE.fullmatch(clean_otp):
             return jsonify({'success': False, 'error': 'Invalid OTP format'}), 400
 
-        print("OTP validation successful - proceeding with login")
-
-        # Create or get user
-        user_id = None
-        for uid, user_data in DEMO_USERS.items():
-            if user_data.get('phone') == phone:
-                user_id = uid
-                break
+        # Checks and consumes the code issued by /api/send-otp, whichever worker issued it
+        if not OTP_STORE.verify(clean_phone, clean_otp):
+            auth_logger.info("OTP rejected")
+            return jsonify({'success': False, 'error': 'Invalid or expired OTP'}), 401
 
+        # Existing users are found through the phone index; new ones get a stable id
+        user_id = find_user_id_by_phone(clean_phone)
         if not user_id:
-            # Create new user
-            user_id = hashlib.md5(phone.encode()).hexdigest()[:8]
-
-            # Save to both in-memory storage and MySQL
-            DEMO_USERS[user_id] = {
-                'phone': phone,
-                'created_at': 'demo'
-            }
-            save_user_to_mysql(user_id, phone)
-        else:
-            # Existing user - update login status in MySQL
-            save_user_to_mysql(user_id, phone)
+            user_id = hashlib.md5(clean_phone.encode()).hexdigest()[:8]
 
-        # Clear OTP
-        if phone in DEMO_OTPS:
-            del DEMO_OTPS[phone]
+        # Marks the user logged in, creating the row on first login
+        save_user_to_mysql(user_id, clean_phone)
+        auth_logger.info("User logged in", extra={'user_id': user_id})
+
+        # Sent back as "Authorization: Bearer <token>" on cart and order requests
+        session_token, expires_at = issue_session_token(user_id)
 
         return jsonify({
             'success': True,
@@ -1946,11 +4484,13 @@ def api_login():
             'user_id': user_id,
                 'phone': phone
             },
+            'session_token': session_token,
+            'expires_at': expires_at,
             'message': 'Login successful'
         })
 
     except Exception as e:
-        print(f"Error in api_login: {e}")
+        auth_logger.exception("Error in api_login: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/orders', methods=['POST'])
@@ -1958,109 +4498,130 @@ def api_create_order():
     """API endpoint to create order from cart"""
     try:
         data = request.get_json()
-        user_id = data.get('user_id')
+        user_id, _, auth_error = authenticate_request(data.get('user_id'))
+        if auth_error:
+            return auth_error
         billing_info = data.get('billing_info', {})
         payment_method = data.get('payment_method', 'cod')
 
         if not user_id:
             return jsonify({'success': False, 'error': 'User ID required'}), 400
 
-        # Get cart items
-        cart_items = get_user_cart(user_id)
-        if not cart_items:
-            return jsonify({'success': False, 'error': 'Cart is empty'}), 400
+        # Return stock held by abandoned orders before reserving more
+        maybe_release_expired_reservations()
+
+        # Create order from the cart and clear it in the same transaction
+        order_id, error, shortages = create_order(user_id, billing_info, payment_method)
 
-        # Create order
-        order_id = create_order(user_id, cart_items, billing_info, payment_method)
-        
         if order_id:
-            # Clear cart after order creation
-            clear_user_cart(user_id)
-            
             return jsonify({
                 'success': True,
                 'order_id': order_id,
                 'message': 'Order created successfully'
             })
+        elif error == 'empty':
+            return jsonify({'success': False, 'error': 'Cart is empty'}), 400
+        elif error == 'stock':
+            return jsonify({'success': False, 'error': 'Insufficient stock', 'shortages': shortages}), 409
         else:
             return jsonify({'success': False, 'error': 'Failed to create order'}), 500
 
     except Exception as e:
-        print(f"❌ Error in api_create_order: {e}")
-        import traceback
-        traceback.print_exc()
+        order_logger.exception("Error in api_create_order: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/orders', methods=['GET'])
 def api_get_orders():
     """API endpoint to get user's order history"""
     try:
-        user_id = request.args.get('user_id')
-        
+        user_id, _, auth_error = authenticate_request(request.args.get('user_id'))
+        if auth_error:
+            return auth_error
+
         if not user_id:
             return jsonify({'success': False, 'error': 'User ID required'}), 400
 
-        orders = get_user_orders(user_id)
-        
+        try:
+            limit = int(request.args.get('limit', ORDER_HISTORY_PAGE_SIZE))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid limit'}), 400
+
+        try:
+            page = get_user_orders(user_id, request.args.get('cursor'), limit)
+        except InvalidCursorError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        if page is None:
+            return jsonify({'success': False, 'error': 'Failed to load orders'}), 500
+
         return jsonify({
             'success': True,
-            'orders': orders
+            'orders': page['orders'],
+            'next_cursor': page['next_cursor'],
+            'limit': page['limit']
         })
 
     except Exception as e:
-        print(f"❌ Error in api_get_orders: {e}")
+        order_logger.exception("Error in api_get_orders: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/orders/<int:order_id>/complete', methods=['POST'])
 def api_complete_order(order_id):
-    """API endpoint to complete payment for order"""
-    try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'success': False, 'error': 'Database connection failed'}), 500
+    """API endpoint to complete payment for one of the caller's orders"""
+    data = request.get_json(silent=True) or {}
+    user_id, _, auth_error = authenticate_request(data.get('user_id') or request.args.get('user_id'))
+    if auth_error:
+        return auth_error
+    if not user_id or user_id == 'guest':
+        return jsonify({'success': False, 'error': 'User ID required'}), 400
 
-        cursor = connection.cursor()
-        
-        # Update order status to 'completed'
-        cursor.execute("""
-            UPDATE orders 
-            SET status = 'completed'
-            WHERE id = %s
-        """, (order_id,))
-        
+    connection = get_db_connection()
+    if not connection:
+        return jsonify({'success': False, 'error': 'Database connection failed'}), 500
+
+    try:
+        # Completing turns the stock reservation into a sale
+        completed = execute_statement(connection, 'orders.complete', (order_id, user_id)).rowcount > 0
         connection.commit()
-        
-        if cursor.rowcount > 0:
-            return jsonify({
-                'success': True,
-                'message': 'Payment completed successfully'
-            })
-        else:
-            return jsonify({'success': False, 'error': 'Order not found'}), 404
 
-    except Error as e:
-        print(f"❌ Error completing order: {e}")
+        if not completed:
+            # Other users' orders look the same as missing ones
+            row = query_one(connection, 'orders.status', (order_id, user_id))
+            if row is None:
+                return jsonify({'success': False, 'error': 'Order not found'}), 404
+            if row[0] == 'expired':
+                return jsonify({'success': False, 'error': 'Order reservation expired'}), 409
+            if row[0] != 'completed':
+                return jsonify({'success': False, 'error': f'Order is {row[0]}'}), 409
+
+        return jsonify({
+            'success': True,
+            'message': 'Payment completed successfully'
+        })
+
+    except DB_ERRORS as e:
+        order_logger.error("Error completing order: %s", e)
+        connection.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
     finally:
-        if connection:
-            connection.close()
+        connection.close()
 
 @app.route('/api/logout', methods=['POST'])
 def api_logout():
     """API endpoint to logout"""
     return jsonify({'success': True})
 
-# Initialize database on startup - FORCE CLEAR EVERY TIME
-print("🚀 Initializing Flask app and database...")
-print("⚠️ FORCE CLEARING DATABASE PRODUCTS ON EVERY RESTART...")
+# Initialize database on startup - applies pending schema migrations only
+app_logger.info("Initializing Flask app and database...")
 
 try:
     init_database()
-    print("✅ init_database() completed successfully")
 except Exception as e:
-    print(f"❌ CRITICAL ERROR in init_database(): {e}")
-    import traceback
-    traceback.print_exc()
+    app_logger.critical("init_database() failed: %s", e, exc_info=True)
+
+start_reservation_sweeper()
+# Threads don't survive a fork (gunicorn --preload); each worker runs its own sweeper
+os.register_at_fork(after_in_child=start_reservation_sweeper)
 
 if __name__ == '__main__':
     # Try multiple ports in case of permission issues
@@ -2072,25 +4633,22 @@ if __name__ == '__main__':
 
     for port in ports_to_try:
         try:
-            print(f"🚀 Trying to start server on port {port}...")
-            print(f"🌐 Will be accessible at:")
-            print(f"   - Local: http://127.0.0.1:{port}")
-            print(f"   - Network: http://0.0.0.0:{port}")
-            print(f"🧪 Test route: http://127.0.0.1:{port}/test")
+            app_logger.info("Starting server on port %s - local: http://127.0.0.1:%s, network: http://0.0.0.0:%s, "
+                            "test route: http://127.0.0.1:%s/test", port, port, port, port)
 
             if USE_WAITERESS:
-                print("🔧 Using Waitress WSGI server")
+                app_logger.info("Using Waitress WSGI server")
                 serve(app, host=HOST, port=port)
             else:
-                print("🔧 Using Flask dev server (dotenv loading disabled)")
+                app_logger.info("Using Flask dev server (dotenv loading disabled)")
                 app.run(debug=True, host=HOST, port=port, threaded=True)
             break  # If we get here, server started successfully
         except PermissionError:
-            print(f"❌ Permission denied on port {port}, trying next port...")
+            app_logger.warning("Permission denied on port %s, trying next port...", port)
             continue
         except Exception as e:
-            print(f"❌ Error on port {port}: {e}, trying next port...")
+            app_logger.warning("Error on port %s: %s, trying next port...", port, e)
             continue
 
-    print("❌ Could not start server on any port due to permission issues")
-    print("💡 Try running with: sudo python backend/app.py")
+    app_logger.error("Could not start server on any port due to permission issues. "
+                     "Try running with: sudo python backend/app.py")
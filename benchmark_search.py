@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark product search: SQL LIKE scan vs the in-memory inverted index
+
+Builds synthetic catalogs from DEMO_PRODUCTS at each size, loads them into
+an in-memory SQLite table and a ProductSearchIndex, and times the same
+queries on both paths.
+
+Example:
+    python benchmark_search.py --sizes 10000,100000,1000000
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), 'backend')))
+
+from app import DEMO_PRODUCTS, ProductSearchIndex
+
+QUERIES = ['esp32', 'hc-sr04', 'sensor', 'arduino uno', 'motor driver', 'sku-4242']
+
+def synthetic_catalog(size):
+    """size products cycling through DEMO_PRODUCTS, each with a unique SKU"""
+    products = []
+    for i in range(size):
+        base = DEMO_PRODUCTS[i % len(DEMO_PRODUCTS)]
+        products.append({
+            'id': i + 1,
+            'name': f"{base['name']} Rev {i % 100}",
+            'description': f"{base['description']} SKU-{i}",
+            'price': base['price'],
+            'category': base['category']
+        })
+    return products
+
+def time_it(func, repeat):
+    """Best-of-repeat wall time in milliseconds and the last result"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def benchmark(size, repeat):
+    products = synthetic_catalog(size)
+
+    connection = sqlite3.connect(':memory:')
+    connection.execute("CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT, description TEXT)")
+    connection.executemany("INSERT INTO products VALUES (?, ?, ?)",
+                           [(p['id'], p['name'], p['description']) for p in products])
+    connection.commit()
+
+    started = time.perf_counter()
+    index = ProductSearchIndex(products)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    print(f"\n📊 {size:,} products (index built in {build_ms:.0f}ms)")
+    print(f"   {'query':<14} {'LIKE ms':>10} {'index ms':>10} {'speedup':>9} {'LIKE rows':>10} {'index rows':>11}")
+    for query in QUERIES:
+        pattern = f"%{query}%"
+        like_ms, like_rows = time_it(lambda: connection.execute(
+            "SELECT id FROM products WHERE name LIKE ? OR description LIKE ?",
+            (pattern, pattern)).fetchall(), repeat)
+        index_ms, matches = time_it(lambda: index.search(query), repeat)
+        speedup = like_ms / index_ms if index_ms else float('inf')
+        print(f"   {query:<14} {like_ms:>10.2f} {index_ms:>10.2f} {speedup:>8.1f}x "
+              f"{len(like_rows):>10} {len(matches):>11}")
+
+    connection.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare LIKE search with the inverted index")
+    parser.add_argument('--sizes', default='10000,100000,1000000',
+                        help="Comma-separated catalog sizes")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per query (best time is reported)")
+    args = parser.parse_args()
+
+    for size in (int(s) for s in args.sizes.split(',')):
+        benchmark(size, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Bulk load products into the catalog and report throughput
+
+Examples:
+    python bulk_load_products.py --file products.json
+    python bulk_load_products.py --synthetic 100000 --batch-size 5000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), 'backend')))
+
+from app import load_catalog, CATALOG_LOAD_BATCH_SIZE
+
+CATEGORIES = ['Microcontrollers', 'Sensors', 'Actuators', 'Displays',
+              'Power Supply', 'Tools & Accessories', 'Audio Components']
+
+def synthetic_products(count, start_id):
+    """Generate count fake products with ids starting at start_id"""
+    for i in range(count):
+        product_id = start_id + i
+        yield {
+            'id': product_id,
+            'name': f"Synthetic Part {product_id}",
+            'description': f"Generated catalog entry {product_id} for load testing",
+            'price': round(random.uniform(10, 5000), 2),
+            'category': random.choice(CATEGORIES),
+            'image_url': '',
+            'stock_quantity': random.randint(0, 500),
+            'is_featured': random.random() < 0.05
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load products into the Robotech Store catalog")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--file', help="JSON file containing a list of product objects")
+    source.add_argument('--synthetic', type=int, metavar='N', help="Generate N synthetic products")
+    parser.add_argument('--start-id', type=int, default=100000, help="First id for synthetic products")
+    parser.add_argument('--batch-size', type=int, default=CATALOG_LOAD_BATCH_SIZE)
+    parser.add_argument('--upsert', action='store_true', help="Update products whose id already exists")
+    parser.add_argument('--method', choices=['auto', 'load_data'], default='auto')
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, 'r') as f:
+            products = json.load(f)
+    else:
+        products = synthetic_products(args.synthetic, args.start_id)
+
+    report = load_catalog(products, batch_size=args.batch_size, upsert=args.upsert, method=args.method)
+    if not report:
+        print("❌ Catalog load failed")
+        sys.exit(1)
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
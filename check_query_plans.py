@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Check that the hot queries use indexes instead of full table scans
+
+Runs EXPLAIN (MySQL) or EXPLAIN QUERY PLAN (SQLite) on the query shapes
+issued by get_products_from_db, get_products_keyset_from_db,
+get_user_orders, create_order, get_user_cart and the reservation sweep,
+and exits non-zero if any of them scans a whole table. The SQL comes from
+SQL_STATEMENTS and the app's query builders, so it can't drift from what
+the app runs. Free-text LIKE search is left out on purpose: it's served by
+the in-memory search index.
+
+MySQL picks plans from table statistics and will happily scan a table with
+a few dozen rows, so check MySQL against a realistically sized catalog
+(see bulk_load_products.py --synthetic).
+
+Example:
+    python check_query_plans.py
+    python check_query_plans.py --verbose
+"""
+
+import argparse
+import os
+import sys
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), 'backend')))
+
+from app import (get_db_connection, get_dialect, is_sqlite_connection, order_items_for_orders_sql,
+                 product_count_sql, product_keyset_sql, product_page_sql, product_stock_sql, products_by_ids_sql)
+
+def statement(name, *params):
+    """Builder for a SQL_STATEMENTS entry"""
+    return lambda dialect: (dialect.statement(name), list(params))
+
+def listing_page(sort_by, **filters):
+    """Builder for the first OFFSET page of a listing"""
+    def build(dialect):
+        sql, params = product_page_sql(dialect, sort_by=sort_by, **filters)
+        return sql, params + [6, 0]
+    return build
+
+def listing_count(**filters):
+    return lambda dialect: product_count_sql(dialect, **filters)
+
+def keyset_page(cursor, **filters):
+    def build(dialect):
+        sql, params = product_keyset_sql(dialect, sort_by='name', cursor=cursor, **filters)
+        return sql, params + [7]
+    return build
+
+# (name, build(dialect) -> (SQL, parameters)), rendered by the same code the app runs
+HOT_QUERIES = [
+    ('products: name sort', listing_page('name')),
+    ('products: price sort', listing_page('price_high')),
+    ('products: category, name sort', listing_page('name', category='Sensors')),
+    ('products: category, price sort', listing_page('price_low', category='Sensors')),
+    ('products: featured, name sort', listing_page('name', featured=True)),
+    ('products: category count', listing_count(category='Sensors')),
+    ('products: featured count', listing_count(featured=True)),
+    ('products: keyset after cursor',
+     keyset_page({'value': 'm', 'id': 0, 'direction': 'next'}, category='Sensors')),
+    ('products: by ids', lambda dialect: (products_by_ids_sql(dialect, 3), [11, 12, 13])),
+    ('products: stock by ids', lambda dialect: (product_stock_sql(dialect, 3), [11, 12, 13])),
+    ('cart: lines for user', statement('cart.lines', 'user')),
+    ('cart: joined items for user', statement('cart.items', 'user')),
+    ('cart: lines locked for checkout', statement('cart.lines_for_update', 'user')),
+    ('cart: version row', statement('cart.version', 'user')),
+    ('orders: counter row', statement('orders.counter', 'user')),
+    ('orders: history first page', statement('orders.history', 'user', 11)),
+    ('orders: history after cursor',
+     statement('orders.history_after', 'user', '2026-01-01 00:00:00', '2026-01-01 00:00:00', 100, 11)),
+    ('orders: items for page', lambda dialect: (order_items_for_orders_sql(dialect, 3), [1, 2, 3])),
+    ('orders: expired reservations', statement('orders.expired_reservations', '2026-01-01 00:00:00', 100)),
+]
+
+def sqlite_full_scans(cursor, sql, params):
+    """Plan lines that walk a whole table without an index"""
+    cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+    plan = [row[-1] for row in cursor.fetchall()]
+    scans = [line for line in plan
+             if line.startswith('SCAN') and 'INDEX' not in line and 'PRIMARY KEY' not in line]
+    return plan, scans
+
+def mysql_full_scans(cursor, sql, params):
+    """EXPLAIN rows with access type ALL"""
+    cursor.execute("EXPLAIN " + sql, params)
+    columns = [column[0] for column in cursor.description]
+    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    plan = [f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']}" for row in rows]
+    scans = [line for line, row in zip(plan, rows) if row['type'] == 'ALL']
+    return plan, scans
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if a hot query falls back to a full table scan")
+    parser.add_argument('--verbose', action='store_true', help="Print the full plan for every query")
+    args = parser.parse_args()
+
+    connection = get_db_connection()
+    if not connection:
+        print("❌ Could not connect to a database")
+        sys.exit(2)
+
+    is_sqlite = is_sqlite_connection(connection)
+    dialect = get_dialect(connection)
+    explain = sqlite_full_scans if is_sqlite else mysql_full_scans
+    print(f"🔎 Checking {len(HOT_QUERIES)} query plans on {'SQLite' if is_sqlite else 'MySQL'}")
+
+    failures = 0
+    cursor = connection.cursor()
+    try:
+        for name, build in HOT_QUERIES:
+            sql, params = build(dialect)
+            plan, scans = explain(cursor, sql, params)
+            if scans:
+                failures += 1
+                print(f"❌ {name}: full scan")
+                for line in scans:
+                    print(f"     {line}")
+            else:
+                print(f"✅ {name}")
+            if args.verbose:
+                for line in plan:
+                    print(f"     {line}")
+    finally:
+        cursor.close()
+        connection.close()
+
+    if failures:
+        print(f"\n❌ {failures} of {len(HOT_QUERIES)} hot queries scan a whole table")
+        sys.exit(1)
+    print(f"\n✅ All {len(HOT_QUERIES)} hot queries use an index")
+
+if __name__ == "__main__":
+    main()
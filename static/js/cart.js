@@ -100,6 +100,8 @@ function displayCartItems(cartItems) {
     }
 
     cartContainer.innerHTML = '';
+    renderedQuantities.clear();
+    cartItems.forEach(item => renderedQuantities.set(item.product_id, item.quantity));
 
     cartItems.forEach(item => {
         const cartItem = createCartItem(item);
@@ -144,11 +146,11 @@ function createCartItem(item) {
                 </div>
             </div>
             <div class="cart-item-quantity">
-                <button class="quantity-btn" onclick="updateQuantity(${item.product_id}, ${item.quantity - 1})">
+                <button class="quantity-btn" onclick="changeQuantity(${item.product_id}, -1)">
                     <i class="fas fa-minus"></i>
                 </button>
-                <span class="quantity-value">${item.quantity}</span>
-                <button class="quantity-btn" onclick="updateQuantity(${item.product_id}, ${item.quantity + 1})">
+                <span class="quantity-value" data-product-id="${item.product_id}">${item.quantity}</span>
+                <button class="quantity-btn" onclick="changeQuantity(${item.product_id}, 1)">
                     <i class="fas fa-plus"></i>
                 </button>
             </div>
@@ -166,82 +168,93 @@ function createCartItem(item) {
     return itemDiv;
 }
 
-function updateQuantity(productId, newQuantity) {
-    if (newQuantity < 1) {
-        removeFromCart(productId);
-        return;
-    }
+// Quantity changes made in quick succession are sent as one batch request
+const pendingQuantityChanges = new Map();
+const renderedQuantities = new Map();
+let quantityFlushTimer = null;
+
+function currentQuantity(productId) {
+    return pendingQuantityChanges.has(productId)
+        ? pendingQuantityChanges.get(productId)
+        : (renderedQuantities.get(productId) || 0);
+}
+
+function changeQuantity(productId, delta) {
+    // Relative to the latest queued value, so quick repeated clicks all count
+    updateQuantity(productId, currentQuantity(productId) + delta);
+}
 
-    // Use backend API to update cart
+function updateQuantity(productId, newQuantity, flushNow = false) {
     const userId = sessionStorage.getItem('user_id') || localStorage.getItem('user_id');
-    console.log('Updating quantity via backend API for user:', userId, 'product:', productId, 'quantity:', newQuantity);
-
-    if (userId) {
-        fetch('http://127.0.0.1:8888/api/cart/update', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                user_id: userId,
-                product_id: productId,
-                quantity: newQuantity
-            })
-        })
-        .then(response => response.json())
-        .then(data => {
-            if (data.success) {
-                showNotification('Quantity updated!', 'success');
-                loadCartItems(); // Reload cart from backend
-                updateCartCount(); // Update cart count in header
-            } else {
-                showNotification('Failed to update quantity', 'error');
-            }
-        })
-        .catch(error => {
-            console.error('Error updating quantity:', error);
-            showNotification('Network error - please try again', 'error');
-        });
-    } else {
+    if (!userId) {
         console.error('No user ID found for quantity update');
         showNotification('Please login to update cart', 'error');
+        return;
+    }
+
+    // Quantity 0 removes the line in the same batch as any other pending changes
+    newQuantity = Math.max(0, newQuantity);
+    pendingQuantityChanges.set(productId, newQuantity);
+
+    const quantityLabel = document.querySelector(`.quantity-value[data-product-id="${productId}"]`);
+    if (quantityLabel) {
+        quantityLabel.textContent = newQuantity;
+    }
+
+    clearTimeout(quantityFlushTimer);
+    if (flushNow) {
+        flushQuantityChanges(userId);
+    } else {
+        quantityFlushTimer = setTimeout(() => flushQuantityChanges(userId), 300);
     }
 }
 
-function removeFromCart(productId) {
-    // Use backend API to remove item from cart
-    const userId = sessionStorage.getItem('user_id') || localStorage.getItem('user_id');
-    console.log('Removing item from cart via backend API for user:', userId, 'product:', productId);
-
-    if (userId) {
-        fetch('http://127.0.0.1:8888/api/cart/remove', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                user_id: userId,
-                product_id: productId
-            })
+function flushQuantityChanges(userId) {
+    const items = Array.from(pendingQuantityChanges, ([product_id, quantity]) => ({ product_id, quantity }));
+    pendingQuantityChanges.clear();
+    if (items.length === 0) {
+        return;
+    }
+
+    fetch('http://127.0.0.1:8888/api/cart/batch', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            user_id: userId,
+            items: items
         })
-        .then(response => response.json())
-        .then(data => {
-            if (data.success) {
-                showNotification('Item removed from cart!', 'success');
-                loadCartItems(); // Reload cart from backend
-                updateCartCount(); // Update cart count in header
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success && data.cart) {
+            const removed = items.some(item => item.quantity === 0);
+            showNotification(removed ? 'Cart updated!' : 'Quantity updated!', 'success');
+            // The response carries the updated cart, so no refetch is needed
+            if (data.cart.length > 0) {
+                displayCartItems(data.cart);
+                updateCartSummary(data.cart);
+                showCartContent();
             } else {
-                showNotification('Failed to remove item', 'error');
+                showEmptyCart();
             }
-        })
-        .catch(error => {
-            console.error('Error removing item:', error);
-            showNotification('Network error - please try again', 'error');
-        });
-    } else {
-        console.error('No user ID found for cart removal');
-        showNotification('Please login to modify cart', 'error');
-    }
+            updateCartCountDisplay(data.cart.reduce((total, item) => total + item.quantity, 0));
+        } else {
+            showNotification('Failed to update cart', 'error');
+            loadCartItems();
+        }
+    })
+    .catch(error => {
+        console.error('Error updating quantity:', error);
+        showNotification('Network error - please try again', 'error');
+        loadCartItems();
+    });
+}
+
+function removeFromCart(productId) {
+    // Sent with any queued quantity changes so a pending batch can't re-add the item
+    updateQuantity(productId, 0, true);
 }
 
 function updateCartSummary(cartItems) {
@@ -288,10 +301,10 @@ async function proceedToCheckout() {
 
     // Check if cart has items from the backend API
     try {
-        const response = await fetch(`http://127.0.0.1:8888/api/cart?user_id=${userId}`);
+        const response = await fetch(`http://127.0.0.1:8888/api/cart/summary?user_id=${userId}`);
         const data = await response.json();
         
-        if (!data.success || !data.cart || data.cart.length === 0) {
+        if (!data.success || !data.summary || data.summary.line_count === 0) {
             showNotification('Your cart is empty. Add some items first.', 'warning');
             return;
         }
@@ -7,6 +7,29 @@ let currentUser = null;
 // Initialize currentUser from storage on script load
 initializeUserFromStorage();
 
+// Send the session token from /api/login with every API request so the
+// backend identifies the user from the signed token instead of user_id
+(function installSessionTokenFetch() {
+    const originalFetch = window.fetch.bind(window);
+    window.fetch = function(resource, options = {}) {
+        // Strings, URL objects and Requests all resolve against the page
+        const url = new URL(resource instanceof Request ? resource.url : String(resource), location.href);
+        const token = sessionStorage.getItem('session_token') || localStorage.getItem('session_token');
+        const tokenUserId = sessionStorage.getItem('session_user_id') || localStorage.getItem('session_user_id');
+        const userId = sessionStorage.getItem('user_id') || localStorage.getItem('user_id');
+        // Demo logins that never reached the backend replace user_id without a token;
+        // the token only ever goes to this site's own API
+        if (token && tokenUserId === userId && url.origin === location.origin && url.pathname.startsWith('/api/')) {
+            const headers = new Headers(options.headers || (resource instanceof Request ? resource.headers : {}));
+            if (!headers.has('Authorization')) {
+                headers.set('Authorization', `Bearer ${token}`);
+            }
+            options = { ...options, headers };
+        }
+        return originalFetch(resource, options);
+    };
+})();
+
 function initializeUserFromStorage() {
     console.log('initializeUserFromStorage called');
 
@@ -983,12 +1006,11 @@ function viewProduct(productId) {
 function updateCartCount() {
     if (currentUser) {
         // User is logged in - get cart count from backend API
-        fetch(`http://127.0.0.1:8888/api/cart?user_id=${currentUser.user_id}`)
+        fetch(`http://127.0.0.1:8888/api/cart/summary?user_id=${currentUser.user_id}`)
             .then(response => response.json())
             .then(data => {
-                if (data.success && data.cart) {
-                    const count = data.cart.reduce((total, item) => total + item.quantity, 0);
-                    updateCartCountDisplay(count);
+                if (data.success && data.summary) {
+                    updateCartCountDisplay(data.summary.item_count);
                 } else {
                     updateCartCountDisplay(0);
                 }
@@ -1588,6 +1610,13 @@ function verifyLoginOTP() {
             localStorage.setItem('phone', userData.phone);
             localStorage.setItem('logged_in', userData.logged_in);
 
+            if (data.session_token) {
+                sessionStorage.setItem('session_token', data.session_token);
+                sessionStorage.setItem('session_user_id', userData.user_id);
+                localStorage.setItem('session_token', data.session_token);
+                localStorage.setItem('session_user_id', userData.user_id);
+            }
+
             console.log('Stored user data in both storages:', userData);
 
             // Update current user
@@ -2127,6 +2156,11 @@ window.logout = function() {
     localStorage.removeItem('phone');
     localStorage.removeItem('logged_in');
 
+    sessionStorage.removeItem('session_token');
+    sessionStorage.removeItem('session_user_id');
+    localStorage.removeItem('session_token');
+    localStorage.removeItem('session_user_id');
+
     // Clear demo cart
     if (currentUser) {
         localStorage.removeItem('demo_cart_' + currentUser.user_id);
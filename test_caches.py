@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test the in-process catalog, cart and user caches
+"""
+
+import sys
+import time
+import uuid
+sys.path.insert(0, 'backend')
+from app import (CART_CACHE, DEMO_PRODUCTS, CartCache, CatalogVersionedCache, ProductCountCache, UserIdentityCache,
+                 _get_cart_lines, bump_cart_version, execute_statement, get_db_connection, mutate_cart)
+
+def test_catalog_version_change_drops_every_entry():
+    cache = CatalogVersionedCache(max_entries=8)
+    cache.put(1, 'a', 'A')
+    cache.put(1, 'b', 'B')
+    assert cache.get(1, 'a') == 'A'
+    assert cache.get(2, 'b') is None
+    assert cache.get(1, 'a') is None
+    assert cache.stats()['invalidations'] == 1
+
+def test_catalog_cache_evicts_least_recently_used():
+    cache = CatalogVersionedCache(max_entries=2)
+    cache.put(1, 'a', 'A')
+    cache.put(1, 'b', 'B')
+    cache.get(1, 'a')
+    cache.put(1, 'c', 'C')
+    assert cache.get(1, 'b') is None
+    assert cache.get(1, 'a') == 'A'
+    assert cache.stats()['evictions'] == 1
+
+def test_count_key_keeps_featured_states_and_backend_apart():
+    key = ProductCountCache.key
+    assert len({key('sqlite', featured=None), key('sqlite', featured=False), key('sqlite', featured=True)}) == 3
+    assert key('sqlite', 'all') == key('sqlite', None) == key('sqlite', '')
+    assert key('sqlite', 'Sensors') != key('mysql', 'Sensors')
+
+def test_cart_cache_serves_only_the_version_it_was_read_at():
+    cache = CartCache(max_entries=8, ttl=60)
+    cache.put('u1', 3, [(1, 2)])
+    assert cache.get('u1', 3) == ((1, 2),)
+    assert cache.get('u1', 4) is None
+    assert cache.get('u1', 3) is None
+    assert cache.stats()['stale'] == 1
+
+def test_cart_cache_expires_entries():
+    cache = CartCache(max_entries=8, ttl=0.01)
+    cache.put('u1', 1, [(1, 2)])
+    time.sleep(0.02)
+    assert cache.get('u1', 1) is None
+    assert cache.stats()['expirations'] == 1
+
+def test_cart_write_from_another_worker_invalidates_cached_cart():
+    user_id = 'cc' + uuid.uuid4().hex[:8]
+    product_id = DEMO_PRODUCTS[0]['id']
+    assert mutate_cart(user_id, product_id, 2, phone='9' + uuid.uuid4().hex[:9]) is None
+    assert list(_get_cart_lines(user_id)) == [(product_id, 2)]
+    hits = CART_CACHE.stats()['hits']
+    assert list(_get_cart_lines(user_id)) == [(product_id, 2)]
+    assert CART_CACHE.stats()['hits'] == hits + 1
+
+    # Another worker writes the cart; this worker's CART_CACHE never hears about it
+    connection = get_db_connection()
+    try:
+        execute_statement(connection, 'cart.set', (user_id, product_id, 7))
+        bump_cart_version(connection, user_id)
+        connection.commit()
+    finally:
+        connection.close()
+    assert list(_get_cart_lines(user_id)) == [(product_id, 7)]
+
+def test_user_cache_looks_up_both_ways_and_evicts_both_indexes():
+    cache = UserIdentityCache(max_entries=2)
+    cache.put('a', '5550001')
+    cache.put('b', '5550002')
+    assert cache.user_id_for('5550001') == 'a'
+    cache.put('c', '5550003')
+    assert cache.phone_for('b') is None
+    assert cache.user_id_for('5550002') is None
+    assert cache.phone_for('a') == '5550001'
+    assert cache.user_id_for('5550003') == 'c'
+    assert cache.stats()['evictions'] == 1
+
+if __name__ == "__main__":
+    print("🧪 TESTING CACHES...")
+    for test in (test_catalog_version_change_drops_every_entry, test_catalog_cache_evicts_least_recently_used,
+                 test_count_key_keeps_featured_states_and_backend_apart,
+                 test_cart_cache_serves_only_the_version_it_was_read_at, test_cart_cache_expires_entries,
+                 test_cart_write_from_another_worker_invalidates_cached_cart,
+                 test_user_cache_looks_up_both_ways_and_evicts_both_indexes):
+        test()
+        print(f"✅ {test.__name__}")
+    print("\n🎉 ALL CACHE TESTS PASSED!")
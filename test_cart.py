@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test single and batched cart mutations
+"""
+
+import sys
+import uuid
+sys.path.insert(0, 'backend')
+from app import (DEMO_PRODUCTS, _get_cart_lines, app, get_db_connection, mutate_cart, mutate_cart_batch,
+                 query_one)
+
+FIRST, SECOND = DEMO_PRODUCTS[0]['id'], DEMO_PRODUCTS[1]['id']
+MISSING = 987654321
+
+def new_user():
+    """New user with an empty cart -> (user_id, phone)"""
+    return 'ct' + uuid.uuid4().hex[:8], '9' + uuid.uuid4().hex[:9]
+
+def cart_version(user_id):
+    connection = get_db_connection()
+    try:
+        row = query_one(connection, 'cart.version', (user_id,))
+        return row[0] if row else 0
+    finally:
+        connection.close()
+
+def test_set_update_and_delete_on_zero():
+    user_id, phone = new_user()
+    assert mutate_cart(user_id, FIRST, 2, phone=phone) is None
+    assert mutate_cart(user_id, SECOND, 1) is None
+    assert list(_get_cart_lines(user_id)) == sorted([(FIRST, 2), (SECOND, 1)])
+    assert mutate_cart(user_id, FIRST, 5) is None
+    assert dict(_get_cart_lines(user_id))[FIRST] == 5
+    assert mutate_cart(user_id, FIRST, 0) is None
+    assert mutate_cart(user_id, SECOND, -1) is None
+    assert list(_get_cart_lines(user_id)) == []
+
+def test_every_write_bumps_cart_version():
+    user_id, phone = new_user()
+    assert cart_version(user_id) == 0
+    assert mutate_cart(user_id, FIRST, 1, phone=phone) is None
+    assert mutate_cart(user_id, FIRST, 3) is None
+    assert mutate_cart(user_id, FIRST, 0) is None
+    assert cart_version(user_id) == 3
+
+def test_rejected_writes_leave_cart_and_version_alone():
+    user_id, phone = new_user()
+    assert mutate_cart(user_id, FIRST, 1, phone=phone) is None
+    assert mutate_cart(user_id, MISSING, 1) == 'product'
+    assert mutate_cart(user_id, 0, 1) == 'invalid'
+    assert mutate_cart('guest', FIRST, 1) == 'invalid'
+    assert mutate_cart(new_user()[0], FIRST, 1) == 'user'
+    assert list(_get_cart_lines(user_id)) == [(FIRST, 1)]
+    assert cart_version(user_id) == 1
+
+def test_update_endpoint_reports_missing_product():
+    user_id, phone = new_user()
+    client = app.test_client()
+    response = client.post('/api/cart/update', json={'user_id': user_id, 'phone': phone,
+                                                     'product_id': MISSING, 'quantity': 1})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Product not found'
+    response = client.post('/api/cart/update', json={'user_id': user_id, 'product_id': 'x', 'quantity': 1})
+    assert response.status_code == 400
+    response = client.post('/api/cart/update', json={'user_id': user_id, 'phone': phone,
+                                                     'product_id': FIRST, 'quantity': 2})
+    assert response.status_code == 200
+    assert list(_get_cart_lines(user_id)) == [(FIRST, 2)]
+
+def test_batch_applies_every_change_with_one_version_bump():
+    user_id, phone = new_user()
+    assert mutate_cart(user_id, FIRST, 1, phone=phone) is None
+    # The last change to a product wins; zero deletes
+    cart_items, error, missing_ids = mutate_cart_batch(user_id, [(SECOND, 1), (SECOND, 4), (FIRST, 0)])
+    assert (error, missing_ids) == (None, None)
+    assert [(item['product_id'], item['quantity']) for item in cart_items] == [(SECOND, 4)]
+    assert list(_get_cart_lines(user_id)) == [(SECOND, 4)]
+    assert cart_version(user_id) == 2
+
+def test_batch_with_a_missing_product_changes_nothing():
+    user_id, phone = new_user()
+    assert mutate_cart(user_id, FIRST, 1, phone=phone) is None
+    cart_items, error, missing_ids = mutate_cart_batch(user_id, [(FIRST, 3), (MISSING, 1), (SECOND, 2)])
+    assert (cart_items, error, missing_ids) == (None, 'product', [MISSING])
+    assert list(_get_cart_lines(user_id)) == [(FIRST, 1)]
+    assert cart_version(user_id) == 1
+    assert mutate_cart_batch(user_id, [(FIRST, 'x')])[1] == 'invalid'
+    assert mutate_cart_batch(new_user()[0], [(FIRST, 1)])[1] == 'user'
+
+def test_batch_endpoint_reports_partial_failure():
+    user_id, phone = new_user()
+    client = app.test_client()
+    response = client.post('/api/cart/batch', json={'user_id': user_id, 'phone': phone, 'items': [
+        {'product_id': FIRST, 'quantity': 2}, {'product_id': MISSING, 'quantity': 1}]})
+    assert response.status_code == 400
+    assert response.get_json()['missing_ids'] == [MISSING]
+    assert list(_get_cart_lines(user_id)) == []
+    response = client.post('/api/cart/batch', json={'user_id': user_id, 'items': [{'quantity': 1}]})
+    assert response.status_code == 400
+    response = client.post('/api/cart/batch', json={'user_id': user_id, 'phone': phone, 'items': [
+        {'product_id': FIRST, 'quantity': 2}, {'product_id': SECOND}]})
+    assert response.status_code == 200
+    assert [(item['product_id'], item['quantity']) for item in response.get_json()['cart']] == \
+        [(FIRST, 2), (SECOND, 1)]
+
+if __name__ == "__main__":
+    print("🧪 TESTING CART MUTATIONS...")
+    for test in (test_set_update_and_delete_on_zero, test_every_write_bumps_cart_version,
+                 test_rejected_writes_leave_cart_and_version_alone, test_update_endpoint_reports_missing_product,
+                 test_batch_applies_every_change_with_one_version_bump,
+                 test_batch_with_a_missing_product_changes_nothing, test_batch_endpoint_reports_partial_failure):
+        test()
+        print(f"✅ {test.__name__}")
+    print("\n🎉 ALL CART TESTS PASSED!")
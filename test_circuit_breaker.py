@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Test the closed/open/half-open transitions of the MySQL circuit breaker
+"""
+
+import sys
+import time
+sys.path.insert(0, 'backend')
+from app import BackendCircuitBreaker
+
+def wait_for_state(breaker, state, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while breaker.state != state and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return breaker.state
+
+def test_opens_after_consecutive_failures():
+    opened = []
+    breaker = BackendCircuitBreaker('test', lambda: False, failure_threshold=3, probe_interval=60,
+                                    on_open=lambda: opened.append(True))
+    for _ in range(2):
+        assert breaker.allow_request()
+        breaker.record_failure(Exception('down'))
+    assert breaker.state == BackendCircuitBreaker.CLOSED
+    breaker.record_failure(Exception('down'))
+    assert breaker.state == BackendCircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert opened == [True]
+    assert breaker.snapshot()['short_circuited'] == 1
+
+def test_success_resets_failure_count():
+    breaker = BackendCircuitBreaker('test', lambda: False, failure_threshold=2, probe_interval=60)
+    breaker.record_failure(Exception('down'))
+    breaker.record_success()
+    breaker.record_failure(Exception('down'))
+    assert breaker.state == BackendCircuitBreaker.CLOSED
+
+def test_probe_half_opens_and_one_trial_closes():
+    breaker = BackendCircuitBreaker('test', lambda: True, failure_threshold=1, probe_interval=0.01)
+    breaker.record_failure(Exception('down'))
+    assert wait_for_state(breaker, BackendCircuitBreaker.HALF_OPEN) == BackendCircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == BackendCircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+def test_failed_trial_reopens():
+    breaker = BackendCircuitBreaker('test', lambda: True, failure_threshold=5, probe_interval=0.01)
+    for _ in range(5):
+        breaker.record_failure(Exception('down'))
+    assert wait_for_state(breaker, BackendCircuitBreaker.HALF_OPEN) == BackendCircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    breaker.record_failure(Exception('still down'))
+    assert breaker.state == BackendCircuitBreaker.OPEN
+    assert breaker.snapshot()['opened_count'] == 2
+
+if __name__ == "__main__":
+    print("🧪 TESTING CIRCUIT BREAKER...")
+    for test in (test_opens_after_consecutive_failures, test_success_resets_failure_count,
+                 test_probe_half_opens_and_one_trial_closes, test_failed_trial_reopens):
+        test()
+        print(f"✅ {test.__name__}")
+    print("\n🎉 ALL CIRCUIT BREAKER TESTS PASSED!")
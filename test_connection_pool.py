@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test checkout, reuse, timeouts and recycling in the database connection pool
+"""
+
+import sqlite3
+import sys
+sys.path.insert(0, 'backend')
+from app import ConnectionPool, PoolTimeoutError
+
+def make_pool(**options):
+    return ConnectionPool('test', lambda: sqlite3.connect(':memory:', check_same_thread=False),
+                          lambda connection: connection.execute('SELECT 1').fetchone(), **options)
+
+def test_released_connection_is_reused():
+    pool = make_pool(min_size=0, max_size=2)
+    first = pool.acquire()
+    raw = first.raw
+    first.close()
+    second = pool.acquire()
+    assert second.raw is raw
+    second.close()
+    assert pool.stats()['created'] == 1
+
+def test_checkout_times_out_when_pool_is_exhausted():
+    pool = make_pool(min_size=0, max_size=1, checkout_timeout=0.05)
+    held = pool.acquire()
+    try:
+        pool.acquire()
+        assert False, "expected PoolTimeoutError"
+    except PoolTimeoutError:
+        pass
+    held.close()
+    assert pool.stats()['timeouts'] == 1
+
+def test_connection_recycled_after_max_uses():
+    pool = make_pool(min_size=0, max_size=1, max_uses=2)
+    for _ in range(3):
+        pool.acquire().close()
+    stats = pool.stats()
+    assert stats['created'] == 2
+    assert stats['recycled'] == 1
+
+def test_idle_connection_failing_validation_is_replaced():
+    healthy = {'value': True}
+    pool = ConnectionPool('test', lambda: sqlite3.connect(':memory:', check_same_thread=False),
+                          lambda connection: healthy['value'], min_size=0, max_size=1, validate_after=0)
+    pool.acquire().close()
+    healthy['value'] = False
+    pool.acquire().close()
+    assert pool.stats()['validation_failures'] == 1
+
+def test_release_rolls_back_open_transaction():
+    pool = make_pool(min_size=0, max_size=1)
+    connection = pool.acquire()
+    connection.execute('CREATE TABLE t (x INTEGER)')
+    connection.commit()
+    connection.execute('INSERT INTO t VALUES (1)')
+    connection.close()
+    connection = pool.acquire()
+    assert connection.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+    connection.close()
+
+def test_close_is_idempotent():
+    pool = make_pool(min_size=0, max_size=1)
+    connection = pool.acquire()
+    connection.close()
+    connection.close()
+    assert pool.stats()['in_use'] == 0
+
+if __name__ == "__main__":
+    print("🧪 TESTING CONNECTION POOL...")
+    for test in (test_released_connection_is_reused, test_checkout_times_out_when_pool_is_exhausted,
+                 test_connection_recycled_after_max_uses, test_idle_connection_failing_validation_is_replaced,
+                 test_release_rolls_back_open_transaction, test_close_is_idempotent):
+        test()
+        print(f"✅ {test.__name__}")
+    print("\n🎉 ALL CONNECTION POOL TESTS PASSED!")
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test the schema migration runner on fresh and partially migrated SQLite databases
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+sys.path.insert(0, 'backend')
+from app import SCHEMA_MIGRATIONS, migrate_schema
+
+LATEST_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+# The indexes migration 006 created before migration 008 replaced the name ones
+VERSION_6_INDEXES = [
+    ('idx_products_name', 'products', 'name'),
+    ('idx_products_price', 'products', 'price'),
+    ('idx_products_category_name', 'products', 'category, name'),
+    ('idx_products_category_price', 'products', 'category, price'),
+    ('idx_products_featured_name', 'products', 'is_featured, name'),
+    ('idx_products_featured_price', 'products', 'is_featured, price'),
+    ('idx_orders_user_created', 'orders', 'user_id, created_at, id'),
+    ('idx_order_items_order', 'order_items', 'order_id'),
+]
+
+def new_database():
+    path = os.path.join(tempfile.mkdtemp(), 'store.db')
+    return sqlite3.connect(path, check_same_thread=False)
+
+def schema_versions(connection):
+    return [row[0] for row in connection.execute("SELECT version FROM schema_version ORDER BY version")]
+
+def index_names(connection):
+    rows = connection.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")
+    return {row[0] for row in rows}
+
+def test_empty_database_migrates_to_latest_and_rerun_is_a_no_op():
+    connection = new_database()
+    try:
+        assert migrate_schema(connection) == LATEST_VERSION
+        assert schema_versions(connection) == list(range(1, LATEST_VERSION + 1))
+        indexes = index_names(connection)
+        assert {'idx_products_lower_name', 'idx_orders_user_created'} <= indexes
+        assert connection.execute("SELECT COUNT(*) FROM products").fetchone()[0] > 0
+
+        assert migrate_schema(connection) == LATEST_VERSION
+        assert schema_versions(connection) == list(range(1, LATEST_VERSION + 1))
+        assert index_names(connection) == indexes
+    finally:
+        connection.close()
+
+def test_version_6_database_swaps_name_indexes_for_lower_name():
+    connection = new_database()
+    try:
+        cursor = connection.cursor()
+        for _, _, migrate in SCHEMA_MIGRATIONS[:5]:
+            migrate(cursor, True)
+        for index_name, table, columns in VERSION_6_INDEXES:
+            cursor.execute(f"CREATE INDEX {index_name} ON {table} ({columns})")
+        cursor.execute("CREATE TABLE schema_version (version INTEGER PRIMARY KEY, description TEXT NOT NULL)")
+        cursor.executemany("INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                           [(version, description) for version, description, _ in SCHEMA_MIGRATIONS[:6]])
+        connection.commit()
+        cursor.close()
+
+        assert migrate_schema(connection) == LATEST_VERSION
+        assert schema_versions(connection) == list(range(1, LATEST_VERSION + 1))
+        indexes = index_names(connection)
+        assert not indexes & {'idx_products_name', 'idx_products_category_name', 'idx_products_featured_name'}
+        assert {'idx_products_lower_name', 'idx_products_category_lower_name',
+                'idx_products_featured_lower_name', 'idx_products_price', 'idx_order_items_order'} <= indexes
+        # Migration 007 ran too
+        assert connection.execute("SELECT COUNT(*) FROM cart_versions").fetchone()[0] == 0
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    print("🧪 TESTING SCHEMA MIGRATIONS...")
+    for test in (test_empty_database_migrates_to_latest_and_rerun_is_a_no_op,
+                 test_version_6_database_swaps_name_indexes_for_lower_name):
+        test()
+        print(f"✅ {test.__name__}")
+    print("\n🎉 ALL SCHEMA MIGRATION TESTS PASSED!")
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Test checkout: stock reservations, shortages, reservation expiry and per-user order numbers
+"""
+
+import sys
+import threading
+import uuid
+sys.path.insert(0, 'backend')
+from app import (DEMO_PRODUCTS, _get_cart_lines, app, create_order, get_db_connection, get_dialect,
+                 get_stock_levels, get_user_orders, issue_session_token, mutate_cart,
+                 release_expired_reservations)
+
+def run_sql(sql, params=()):
+    """Run a statement written with {p} placeholders -> first row (None for writes), committed"""
+    connection = get_db_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(get_dialect(connection).sql(sql), params)
+        row = cursor.fetchone() if cursor.description else None
+        cursor.close()
+        connection.commit()
+        return row
+    finally:
+        connection.close()
+
+def set_stock(product_id, quantity):
+    run_sql("UPDATE products SET stock_quantity = {p} WHERE id = {p}", (quantity, product_id))
+
+def stock_of(product_id):
+    return get_stock_levels([product_id])[product_id]
+
+def make_user_with_cart(quantities):
+    """New user whose cart holds product_id -> quantity"""
+    user_id = 'ord' + uuid.uuid4().hex[:8]
+    phone = '9' + uuid.uuid4().hex[:9]
+    for product_id, quantity in quantities.items():
+        assert mutate_cart(user_id, product_id, quantity, phone=phone) is None
+    return user_id
+
+def auth_headers(user_id):
+    return {'Authorization': f'Bearer {issue_session_token(user_id)[0]}'}
+
+def with_stock(*stock_levels):
+    """Run a test on the last demo products with their stock set, restoring it afterwards"""
+    def decorate(test):
+        def run():
+            product_ids = [p['id'] for p in DEMO_PRODUCTS[-len(stock_levels):]]
+            original = get_stock_levels(product_ids)
+            for product_id, quantity in zip(product_ids, stock_levels):
+                set_stock(product_id, quantity)
+            try:
+                test(*product_ids)
+            finally:
+                for product_id in product_ids:
+                    set_stock(product_id, original[product_id])
+        run.__name__ = test.__name__
+        return run
+    return decorate
+
+@with_stock(1)
+def test_concurrent_checkout_sells_the_last_unit_once(product_id):
+    users = [make_user_with_cart({product_id: 1}) for _ in range(2)]
+    barrier = threading.Barrier(len(users))
+    results = {}
+
+    def checkout(user_id):
+        barrier.wait()
+        results[user_id] = create_order(user_id, {}, 'cod')
+
+    threads = [threading.Thread(target=checkout, args=(user_id,)) for user_id in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(error or 'ordered' for _, error, _ in results.values()) == ['ordered', 'stock']
+    loser = next(user_id for user_id, result in results.items() if result[1] == 'stock')
+    assert results[loser][2] == [{'product_id': product_id, 'requested': 1, 'available': 0}]
+    assert stock_of(product_id) == 0
+    # The losing cart is left as it was
+    assert list(_get_cart_lines(loser)) == [(product_id, 1)]
+
+@with_stock(10, 2)
+def test_shortage_leaves_cart_stock_and_order_number_unchanged(plenty, scarce):
+    user_id = make_user_with_cart({plenty: 1, scarce: 3})
+    order_id, error, shortages = create_order(user_id, {}, 'cod')
+    assert (order_id, error) == (None, 'stock')
+    assert shortages == [{'product_id': scarce, 'requested': 3, 'available': 2}]
+    assert stock_of(plenty) == 10 and stock_of(scarce) == 2
+    assert sorted(_get_cart_lines(user_id)) == sorted([(plenty, 1), (scarce, 3)])
+    assert get_user_orders(user_id)['orders'] == []
+
+    # The rolled-back attempt didn't use up an order number
+    assert mutate_cart(user_id, scarce, 2) is None
+    order_id, error, _ = create_order(user_id, {}, 'cod')
+    assert order_id and error is None
+    assert [order['user_order_number'] for order in get_user_orders(user_id)['orders']] == [1]
+    assert stock_of(plenty) == 9 and stock_of(scarce) == 0
+
+@with_stock(1)
+def test_checkout_endpoint_reports_shortages(product_id):
+    user_id = make_user_with_cart({product_id: 2})
+    response = app.test_client().post('/api/orders', json={'payment_method': 'cod'}, headers=auth_headers(user_id))
+    assert response.status_code == 409
+    assert response.get_json()['shortages'] == [{'product_id': product_id, 'requested': 2, 'available': 1}]
+
+@with_stock(10)
+def test_order_numbers_count_per_user(product_id):
+    first, second = make_user_with_cart({product_id: 1}), make_user_with_cart({product_id: 1})
+    assert create_order(first, {}, 'cod')[0]
+    assert mutate_cart(first, product_id, 1) is None
+    assert create_order(first, {}, 'cod')[0]
+    assert create_order(second, {}, 'cod')[0]
+    assert [order['user_order_number'] for order in get_user_orders(first)['orders']] == [2, 1]
+    assert [order['user_order_number'] for order in get_user_orders(second)['orders']] == [1]
+    assert stock_of(product_id) == 7
+
+def place_expired_order(product_id, quantity):
+    user_id = make_user_with_cart({product_id: quantity})
+    order_id, error, _ = create_order(user_id, {}, 'cod')
+    assert error is None
+    run_sql("UPDATE orders SET reservation_expires_at = {p} WHERE id = {p}", ('2000-01-01 00:00:00', order_id))
+    return user_id, order_id
+
+@with_stock(5)
+def test_expiry_sweep_restocks_exactly_once(product_id):
+    _, order_id = place_expired_order(product_id, 3)
+    assert stock_of(product_id) == 2
+
+    # Two workers sweeping at once must not both give the stock back
+    barrier = threading.Barrier(2)
+    def sweep():
+        barrier.wait()
+        release_expired_reservations()
+    threads = [threading.Thread(target=sweep) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    release_expired_reservations()
+
+    assert stock_of(product_id) == 5
+    assert run_sql("SELECT status FROM orders WHERE id = {p}", (order_id,))[0] == 'expired'
+
+@with_stock(5)
+def test_completing_an_expired_order_is_refused(product_id):
+    user_id, order_id = place_expired_order(product_id, 1)
+    release_expired_reservations()
+    client = app.test_client()
+    response = client.post(f'/api/orders/{order_id}/complete', headers=auth_headers(user_id))
+    assert response.status_code == 409
+    assert stock_of(product_id) == 5
+
+    # A live reservation completes, and completing it again is harmless
+    user_id = make_user_with_cart({product_id: 2})
+    order_id = create_order(user_id, {}, 'cod')[0]
+    for _ in range(2):
+        response = client.post(f'/api/orders/{order_id}/complete', headers=auth_headers(user_id))
+        assert response.status_code == 200
+    release_expired_reservations()
+    assert stock_of(product_id) == 3
+
+@with_stock(5)
+def test_only_the_owner_can_complete_an_order(product_id):
+    owner = make_user_with_cart({product_id: 1})
+    order_id = create_order(owner, {}, 'cod')[0]
+    client = app.test_client()
+    response = client.post(f'/api/orders/{order_id}/complete', headers=auth_headers('someone'))
+    assert response.status_code == 404
+    response = client.post(f'/api/orders/{order_id}/complete', json={'user_id': 'someone'})
+    assert response.status_code == 404
+    assert client.post(f'/api/orders/{order_id}/complete').status_code == 400
+    assert run_sql("SELECT status FROM orders WHERE id = {p}", (order_id,))[0] == 'pending'
+    response = client.post(f'/api/orders/{order_id}/complete', json={'user_id': owner})
+    assert response.status_code == 200
+
+if __name__ == "__main__":
+    print("🧪 TESTING ORDERS...")
+    for test in (test_concurrent_checkout_sells_the_last_unit_once,
+                 test_shortage_leaves_cart_stock_and_order_number_unchanged,
+                 test_checkout_endpoint_reports_shortages, test_order_numbers_count_per_user,
+                 test_expiry_sweep_restocks_exactly_once, test_completing_an_expired_order_is_refused,
+                 test_only_the_owner_can_complete_an_order):
+        test()
+        print(f"✅ {test.__name__}")
+    print("\n🎉 ALL ORDER TESTS PASSED!")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test the in-memory and SQLite OTP stores
+"""
+
+import os
+import sys
+import tempfile
+import time
+sys.path.insert(0, 'backend')
+from app import MemoryOtpStore, SqliteOtpStore
+
+def make_sqlite_store(**options):
+    return SqliteOtpStore(os.path.join(tempfile.mkdtemp(), 'otp.db'), **options)
+
+def check_single_use(store):
+    store.issue('5550001', '123456')
+    assert not store.verify('5550001', '654321')
+    assert not store.verify('5550002', '123456')
+    assert store.verify('5550001', '123456')
+    assert not store.verify('5550001', '123456')
+
+def check_expiry(store):
+    store.issue('5550001', '123456')
+    time.sleep(0.03)
+    assert not store.verify('5550001', '123456')
+
+def test_memory_store_codes_are_single_use():
+    check_single_use(MemoryOtpStore())
+
+def test_sqlite_store_codes_are_single_use():
+    check_single_use(make_sqlite_store())
+
+def test_memory_store_codes_expire():
+    check_expiry(MemoryOtpStore(ttl=0.01))
+
+def test_sqlite_store_codes_expire():
+    check_expiry(make_sqlite_store(ttl=0.01))
+
+def test_reissue_replaces_previous_code():
+    for store in (MemoryOtpStore(), make_sqlite_store()):
+        store.issue('5550001', '111111')
+        store.issue('5550001', '222222')
+        assert not store.verify('5550001', '111111')
+        assert store.verify('5550001', '222222')
+
+def test_memory_store_evicts_code_closest_to_expiry():
+    store = MemoryOtpStore(max_entries=2)
+    for i in range(3):
+        store.issue(f'555000{i}', '123456')
+    assert not store.verify('5550000', '123456')
+    assert store.verify('5550002', '123456')
+    assert store.stats()['evictions'] == 1
+
+def test_memory_store_rejects_non_ascii_code_without_error():
+    store = MemoryOtpStore()
+    store.issue('5550001', '123456')
+    assert not store.verify('5550001', '١٢٣٤٥٦')
+
+def test_sqlite_store_is_shared_between_workers():
+    issuing = make_sqlite_store()
+    verifying = SqliteOtpStore(issuing.path)
+    issuing.issue('5550001', '123456')
+    assert verifying.verify('5550001', '123456')
+    assert not issuing.verify('5550001', '123456')
+
+def test_sqlite_store_file_is_private():
+    store = SqliteOtpStore(os.path.join(tempfile.mkdtemp(), 'state', 'otp.db'))
+    store.issue('5550001', '123456')
+    assert os.stat(store.path).st_mode & 0o077 == 0
+    assert os.stat(os.path.dirname(store.path)).st_mode & 0o077 == 0
+
+if __name__ == "__main__":
+    print("🧪 TESTING OTP STORES...")
+    for test in (test_memory_store_codes_are_single_use, test_sqlite_store_codes_are_single_use,
+                 test_memory_store_codes_expire, test_sqlite_store_codes_expire, test_reissue_replaces_previous_code,
+                 test_memory_store_evicts_code_closest_to_expiry, test_memory_store_rejects_non_ascii_code_without_error,
+                 test_sqlite_store_is_shared_between_workers, test_sqlite_store_file_is_private):
+        test()
+        print(f"✅ {test.__name__}")
+    print("\n🎉 ALL OTP STORE TESTS PASSED!")
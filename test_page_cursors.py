@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test keyset page cursors for product listings and order history
+"""
+
+import sys
+import uuid
+from datetime import datetime
+sys.path.insert(0, 'backend')
+from app import (DEMO_PRODUCTS, CatalogIndex, InvalidCursorError, _encode_cursor, decode_order_cursor,
+                 decode_page_cursor, encode_order_cursor, encode_page_cursor, execute_statement,
+                 get_catalog_index, get_db_connection, get_products_keyset_from_db, get_user_orders)
+
+def make_index():
+    products = [dict(p) for p in DEMO_PRODUCTS]
+    # Lowercase names must sort among the others, not after them
+    products[0]['name'] = 'arduino starter kit'
+    return CatalogIndex('sqlite', 1, products)
+
+def assert_invalid(cursor, sort_by):
+    try:
+        decode_page_cursor(cursor, sort_by)
+        assert False, f"expected InvalidCursorError for {cursor!r}"
+    except InvalidCursorError:
+        pass
+
+def walk(query_keyset, sort_by, limit=7, **filters):
+    """Product ids of every page reached by following next_cursor"""
+    ids, cursor = [], None
+    while True:
+        page = query_keyset(sort_by=sort_by, cursor=decode_page_cursor(cursor, sort_by), limit=limit, **filters)
+        ids += [p['id'] for p in page['products']]
+        cursor = page['next_cursor']
+        if not cursor:
+            return ids
+
+def test_cursor_round_trip():
+    product = {'id': 7, 'name': 'Servo Motor', 'price': 120.0}
+    assert decode_page_cursor(encode_page_cursor('name', product, 'next'), 'name') == \
+        {'value': 'servo motor', 'id': 7, 'direction': 'next'}
+    assert decode_page_cursor(encode_page_cursor('price_low', product, 'prev'), 'price_low') == \
+        {'value': 120.0, 'id': 7, 'direction': 'prev'}
+    assert decode_page_cursor('', 'name') is None
+
+def test_invalid_cursors_are_rejected():
+    product = {'id': 7, 'name': 'Servo Motor', 'price': 120.0}
+    assert_invalid(encode_page_cursor('name', product, 'next'), 'price_low')
+    assert_invalid('not a cursor', 'name')
+    assert_invalid(_encode_cursor(['name', 5, 7, 'next']), 'name')
+    assert_invalid(_encode_cursor(['price_low', 'cheap', 7, 'next']), 'price_low')
+    assert_invalid(_encode_cursor(['name', 'a', True, 'next']), 'name')
+    assert_invalid(_encode_cursor(['name', 'a', 7, 'sideways']), 'name')
+    assert_invalid(_encode_cursor(['name', 'a', 7]), 'name')
+
+def test_index_pages_cover_listing_in_order():
+    index = make_index()
+    for sort_by in ('name', 'price_low', 'price_high', 'newest'):
+        expected = [p['id'] for p in index.query(sort_by=sort_by, limit=len(DEMO_PRODUCTS))['products']]
+        assert walk(index.query_keyset, sort_by) == expected, sort_by
+    expected = [p['id'] for p in index.query(category='Sensors', limit=100)['products']]
+    assert walk(index.query_keyset, 'name', category='Sensors') == expected
+
+def test_prev_cursor_returns_previous_page():
+    index = make_index()
+    first = index.query_keyset(sort_by='price_low', limit=5)
+    second = index.query_keyset(sort_by='price_low', cursor=decode_page_cursor(first['next_cursor'], 'price_low'),
+                                limit=5)
+    back = index.query_keyset(sort_by='price_low', cursor=decode_page_cursor(second['prev_cursor'], 'price_low'),
+                              limit=5)
+    assert [p['id'] for p in back['products']] == [p['id'] for p in first['products']]
+    assert back['prev_cursor'] is None
+
+def test_database_pages_match_catalog_index():
+    index = get_catalog_index()
+    assert index is not None
+    for sort_by in ('name', 'price_high'):
+        assert walk(get_products_keyset_from_db, sort_by) == walk(index.query_keyset, sort_by), sort_by
+
+def test_order_cursor_round_trip():
+    order = {'id': 12, 'created_at': datetime(2026, 3, 1, 9, 30, 5)}
+    assert decode_order_cursor(encode_order_cursor(order)) == ('2026-03-01 09:30:05', 12)
+    order = {'id': 12, 'created_at': '2026-03-01 09:30:05.123'}
+    assert decode_order_cursor(encode_order_cursor(order)) == ('2026-03-01 09:30:05', 12)
+    assert decode_order_cursor(None) is None
+    for cursor in ('garbage', encode_page_cursor('name', {'id': 1, 'name': 'x', 'price': 1.0}, 'next'),
+                   _encode_cursor(['orders', 5, 12])):
+        try:
+            decode_order_cursor(cursor)
+            assert False, f"expected InvalidCursorError for {cursor!r}"
+        except InvalidCursorError:
+            pass
+
+def test_order_history_pages_newest_first():
+    user_id = 'cur' + uuid.uuid4().hex[:8]
+    connection = get_db_connection()
+    try:
+        for number in range(1, 6):
+            execute_statement(connection, 'orders.insert', (
+                user_id, 10.0 * number, 'completed', 'cash', '', '', '', '', '', '', number, None))
+        connection.commit()
+    finally:
+        connection.close()
+
+    numbers, cursor = [], None
+    while True:
+        page = get_user_orders(user_id, cursor, limit=2)
+        assert len(page['orders']) <= 2
+        numbers += [order['user_order_number'] for order in page['orders']]
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    assert numbers == [5, 4, 3, 2, 1]
+
+if __name__ == "__main__":
+    print("🧪 TESTING PAGE CURSORS...")
+    for test in (test_cursor_round_trip, test_invalid_cursors_are_rejected, test_index_pages_cover_listing_in_order,
+                 test_prev_cursor_returns_previous_page, test_database_pages_match_catalog_index,
+                 test_order_cursor_round_trip, test_order_history_pages_newest_first):
+        test()
+        print(f"✅ {test.__name__}")
+    print("\n🎉 ALL PAGE CURSOR TESTS PASSED!")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test conditional requests and response caching for the product listing endpoint
+"""
+
+import sys
+sys.path.insert(0, 'backend')
+from app import DEMO_PRODUCTS, PRODUCT_RESPONSE_CACHE, app, load_catalog
+
+LISTING = '/api/products?category=Sensors&limit=4'
+
+def bump_catalog():
+    """Rewrite one unchanged product so the catalog version moves on"""
+    assert load_catalog([dict(DEMO_PRODUCTS[0])], upsert=True)
+
+def test_listing_carries_validators():
+    response = app.test_client().get(LISTING)
+    assert response.status_code == 200
+    assert response.headers['ETag'] and response.headers['Last-Modified']
+    assert 'no-cache' in response.headers['Cache-Control']
+
+def test_matching_validators_get_not_modified():
+    client = app.test_client()
+    first = client.get(LISTING)
+    response = client.get(LISTING, headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 304 and response.get_data() == b''
+    assert response.headers['ETag'] == first.headers['ETag']
+    response = client.get(LISTING, headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert response.status_code == 304
+    # Another query has its own ETag
+    response = client.get(LISTING + '&page=2', headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 200
+
+def test_catalog_change_serves_a_new_etag():
+    client = app.test_client()
+    first = client.get(LISTING)
+    bump_catalog()
+    response = client.get(LISTING, headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != first.headers['ETag']
+    assert response.get_json()['products'] == first.get_json()['products']
+
+def test_response_cache_serves_repeats_until_the_catalog_changes():
+    client = app.test_client()
+    query = LISTING + '&sort=price_low'
+    first = client.get(query)
+    hits = PRODUCT_RESPONSE_CACHE.stats()['hits']
+    assert client.get(query).get_data() == first.get_data()
+    assert PRODUCT_RESPONSE_CACHE.stats()['hits'] == hits + 1
+
+    bump_catalog()
+    assert PRODUCT_RESPONSE_CACHE.stats()['entries'] == 0
+    response = client.get(query)
+    assert PRODUCT_RESPONSE_CACHE.stats()['hits'] == hits + 1
+    assert response.headers['ETag'] != first.headers['ETag']
+    assert client.get(query).get_data() == response.get_data()
+    assert PRODUCT_RESPONSE_CACHE.stats()['hits'] == hits + 2
+
+if __name__ == "__main__":
+    print("🧪 TESTING PRODUCT LISTING...")
+    for test in (test_listing_carries_validators, test_matching_validators_get_not_modified,
+                 test_catalog_change_serves_a_new_etag, test_response_cache_serves_repeats_until_the_catalog_changes):
+        test()
+        print(f"✅ {test.__name__}")
+    print("\n🎉 ALL PRODUCT LISTING TESTS PASSED!")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test the in-memory and SQLite token bucket rate limiters
+"""
+
+import os
+import sys
+import tempfile
+import time
+sys.path.insert(0, 'backend')
+from app import MemoryRateLimiter, SqliteRateLimiter, parse_rate_limit
+
+def make_sqlite_limiter(**options):
+    return SqliteRateLimiter(os.path.join(tempfile.mkdtemp(), 'rate_limits.db'), **options)
+
+def check_bucket(limiter):
+    assert [limiter.hit('login:ip:1.2.3.4', 3, 60)[0] for _ in range(4)] == [True, True, True, False]
+    allowed, retry_after = limiter.hit('login:ip:1.2.3.4', 3, 60)
+    assert not allowed and 0 < retry_after <= 20
+    # Other keys have their own buckets
+    assert limiter.hit('login:ip:5.6.7.8', 3, 60)[0]
+
+def check_refill(limiter):
+    assert limiter.hit('k', 1, 0.05)[0]
+    assert not limiter.hit('k', 1, 0.05)[0]
+    time.sleep(0.06)
+    assert limiter.hit('k', 1, 0.05)[0]
+
+def test_memory_limiter_refuses_when_bucket_is_empty():
+    check_bucket(MemoryRateLimiter())
+
+def test_sqlite_limiter_refuses_when_bucket_is_empty():
+    check_bucket(make_sqlite_limiter())
+
+def test_memory_limiter_refills():
+    check_refill(MemoryRateLimiter())
+
+def test_sqlite_limiter_refills():
+    check_refill(make_sqlite_limiter())
+
+def test_sqlite_limiter_is_shared_between_workers():
+    first = make_sqlite_limiter()
+    second = SqliteRateLimiter(first.path)
+    assert first.hit('send_otp:phone:5550001', 1, 60)[0]
+    assert not second.hit('send_otp:phone:5550001', 1, 60)[0]
+
+def test_sqlite_limiter_file_is_private():
+    limiter = SqliteRateLimiter(os.path.join(tempfile.mkdtemp(), 'state', 'rate_limits.db'))
+    limiter.hit('k', 1, 60)
+    assert os.stat(limiter.path).st_mode & 0o077 == 0
+
+def test_memory_limiter_eviction_only_resets_buckets():
+    limiter = MemoryRateLimiter(max_keys=1)
+    assert limiter.hit('a', 1, 60)[0]
+    assert limiter.hit('b', 1, 60)[0]
+    assert limiter.hit('a', 1, 60)[0]
+
+def test_parse_rate_limit():
+    assert parse_rate_limit('5/60') == (5, 60.0)
+    assert parse_rate_limit('10') == (10, 60.0)
+    assert parse_rate_limit('0') is None
+
+if __name__ == "__main__":
+    print("🧪 TESTING RATE LIMITERS...")
+    for test in (test_memory_limiter_refuses_when_bucket_is_empty, test_sqlite_limiter_refuses_when_bucket_is_empty,
+                 test_memory_limiter_refills, test_sqlite_limiter_refills, test_sqlite_limiter_is_shared_between_workers,
+                 test_sqlite_limiter_file_is_private, test_memory_limiter_eviction_only_resets_buckets,
+                 test_parse_rate_limit):
+        test()
+        print(f"✅ {test.__name__}")
+    print("\n🎉 ALL RATE LIMITER TESTS PASSED!")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test the product search index: exact/prefix/infix matching, incremental updates and parity with the database
+"""
+
+import sys
+sys.path.insert(0, 'backend')
+from app import DEMO_PRODUCTS, ProductSearchIndex, get_products_from_db
+
+def product(product_id, name, description=None):
+    return {'id': product_id, 'name': name, 'description': description}
+
+def test_word_inside_a_longer_word_matches():
+    index = ProductSearchIndex(DEMO_PRODUCTS)
+    arduino_ids = {p['id'] for p in DEMO_PRODUCTS if 'arduino' in f"{p['name']} {p['description']}".lower()}
+    assert arduino_ids and set(index.search('duino')) == arduino_ids
+    # Short fragments have no trigram and are matched by scanning the vocabulary
+    assert set(index.search('du')) >= arduino_ids
+    assert index.search('xyzzy') == {}
+
+def test_exact_and_prefix_matches_rank_above_infix():
+    index = ProductSearchIndex([product(1, 'Duino Shield'), product(2, 'Duinoboard'), product(3, 'Arduino Uno')])
+    scores = index.search('duino')
+    assert scores[1] > scores[2] > scores[3] > 0
+
+def test_every_query_word_must_match():
+    index = ProductSearchIndex([product(1, 'Arduino Uno'), product(2, 'Arduino Mega')])
+    assert set(index.search('duino ega')) == {2}
+    assert index.search('duino servo') == {}
+
+def test_updates_keep_infix_lookups_current():
+    index = ProductSearchIndex([product(1, 'Arduino Uno')])
+    clone = index.copy()
+    clone.update(product(1, 'Raspberry Pi'))
+    clone.update(product(2, 'Stepper Motor'))
+    assert clone.search('duino') == {} and set(clone.search('pberr')) == {1}
+    assert set(clone.search('tepp')) == {2}
+    clone.remove(2)
+    assert clone.search('tepp') == {}
+    # The original is untouched by changes to its copy
+    assert set(index.search('duino')) == {1} and index.search('pberr') == {}
+
+    assert index.sync([product(1, 'Arduino Uno'), product(3, 'Ultrasonic Sensor')]) == (1, 0)
+    assert set(index.search('sonic')) == {3}
+    assert index.sync([product(3, 'Ultrasonic Sensor')]) == (0, 1)
+    assert index.search('duino') == {}
+
+def test_index_finds_everything_the_database_finds():
+    products = get_products_from_db(limit=100000)['products']
+    index = ProductSearchIndex(products)
+    for query in ('duino', 'sensor', 'otor', 'led', 'uno', 'board', 'sr04', '5v', 'v', 'servo motor'):
+        database_ids = {p['id'] for p in get_products_from_db(search=query, limit=100000)['products']}
+        assert database_ids == set(index.search(query)), query
+
+if __name__ == "__main__":
+    print("🧪 TESTING SEARCH INDEX...")
+    for test in (test_word_inside_a_longer_word_matches, test_exact_and_prefix_matches_rank_above_infix,
+                 test_every_query_word_must_match, test_updates_keep_infix_lookups_current,
+                 test_index_finds_everything_the_database_finds):
+        test()
+        print(f"✅ {test.__name__}")
+    print("\n🎉 ALL SEARCH INDEX TESTS PASSED!")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test signed session tokens and how API requests are authenticated with them
+"""
+
+import os
+import sys
+import tempfile
+sys.path.insert(0, 'backend')
+import app as backend_app
+from app import (InvalidSessionError, SESSION_SIGNING_KEY, _load_generated_session_secret, app,
+                 issue_session_token, load_session_signing_key, verify_session_token)
+
+def assert_rejected(token, message="Invalid session token"):
+    try:
+        verify_session_token(token)
+        assert False, f"expected InvalidSessionError for {token!r}"
+    except InvalidSessionError as e:
+        assert str(e) == message
+
+def test_token_round_trip():
+    token, _ = issue_session_token('ab12cd34')
+    assert verify_session_token(token) == 'ab12cd34'
+
+def test_forged_and_malformed_tokens_are_rejected():
+    token, _ = issue_session_token('ab12cd34')
+    payload, _, signature = token.partition('.')
+    other_payload = issue_session_token('ef56ab78')[0].partition('.')[0]
+    assert_rejected(f"{other_payload}.{signature}")
+    assert_rejected(f"{payload}.{signature[:-2]}")
+    assert_rejected(payload)
+    assert_rejected('')
+    assert_rejected(f"{payload}.é")
+
+def test_expired_token_is_rejected():
+    token, _ = issue_session_token('ab12cd34', ttl=-1)
+    assert_rejected(token, "Session expired")
+
+def test_never_signs_with_the_public_secret_key():
+    assert SESSION_SIGNING_KEY != app.secret_key.encode()
+    assert SESSION_SIGNING_KEY not in (b'your-secret-key-here', b'change-me')
+
+def test_generated_secret_is_shared_and_private():
+    path = os.path.join(tempfile.mkdtemp(), 'session_secret')
+    first = _load_generated_session_secret(path)
+    assert _load_generated_session_secret(path) == first
+    assert len(first) == 64
+    assert os.stat(path).st_mode & 0o077 == 0
+
+def test_generated_secret_is_made_in_a_private_directory():
+    path = os.path.join(tempfile.mkdtemp(), 'state', 'session_secret')
+    _load_generated_session_secret(path)
+    assert os.stat(os.path.dirname(path)).st_mode & 0o077 == 0
+
+def test_readable_secret_file_is_not_trusted():
+    path = os.path.join(tempfile.mkdtemp(), 'session_secret')
+    with open(path, 'w') as f:
+        f.write('planted')
+    os.chmod(path, 0o644)
+    try:
+        _load_generated_session_secret(path)
+        assert False, "expected RuntimeError for a world-readable secret"
+    except RuntimeError:
+        pass
+
+def test_production_requires_a_session_secret():
+    saved = backend_app.ENVIRONMENT, backend_app.SESSION_SECRET
+    backend_app.ENVIRONMENT, backend_app.SESSION_SECRET = 'production', 'your-secret-key-here'
+    try:
+        load_session_signing_key()
+        assert False, "expected RuntimeError without SESSION_SECRET in production"
+    except RuntimeError:
+        pass
+    finally:
+        backend_app.ENVIRONMENT, backend_app.SESSION_SECRET = saved
+
+def test_bearer_token_identifies_the_user():
+    client = app.test_client()
+    token, _ = issue_session_token('ab12cd34')
+    response = client.get('/api/cart?user_id=ef56ab78', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 403
+    response = client.get('/api/cart', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+
+def test_unverifiable_token_counts_as_no_token_unless_required():
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer not-a-token'}
+    response = client.get('/api/cart?user_id=ab12cd34', headers=headers)
+    assert response.status_code == 200
+    backend_app.SESSION_TOKENS_REQUIRED = True
+    try:
+        assert client.get('/api/cart', headers=headers).status_code == 401
+    finally:
+        backend_app.SESSION_TOKENS_REQUIRED = False
+
+if __name__ == "__main__":
+    print("🧪 TESTING SESSION TOKENS...")
+    for test in (test_token_round_trip, test_forged_and_malformed_tokens_are_rejected, test_expired_token_is_rejected,
+                 test_never_signs_with_the_public_secret_key, test_generated_secret_is_shared_and_private,
+                 test_generated_secret_is_made_in_a_private_directory, test_readable_secret_file_is_not_trusted,
+                 test_production_requires_a_session_secret, test_bearer_token_identifies_the_user,
+                 test_unverifiable_token_counts_as_no_token_unless_required):
+        test()
+        print(f"✅ {test.__name__}")
+    print("\n🎉 ALL SESSION TOKEN TESTS PASSED!")